@@ -0,0 +1,398 @@
+# alerts.py
+#
+# Threshold alerts: "notify me when ZIP X exceeds AQI Y". Subscriptions are
+# kept sorted by (ZIP, threshold) in flat arrays, so for each ZIP in a batch
+# the triggered subscriptions are a prefix found by binary search, and state
+# updates are slice operations rather than a scan of every subscription.
+#
+# An alert fires when the AQI rises above the threshold. It re-arms only after
+# the AQI falls back below threshold - HYSTERESIS, and a subscription never
+# fires twice within DEDUP_SECONDS. Alerts go to a sink: any callable taking
+# a list of alert dicts (see print_sink and JsonlSink).
+#
+# Subscriptions live in SQLite at ALERTS_PATH. Each process has one
+# AlertWatcher (alert_watcher()) that reloads them when they change and keeps
+# last_sent there, so a restart doesn't repeat alerts. It is fed by every live
+# ZIP fetch (data_loader.fetch_live_observations) and by each bulk file
+# ingested (ingest.py), where a ZIP's AQI is the worst latest reading of the
+# stations near it.
+#
+#   python alerts.py subscribe 80202 150 --contact ops@example.org
+#   python alerts.py list
+#   python alerts.py unsubscribe 3
+#   python alerts.py bench --subscriptions 100000
+import json
+import os
+import queue
+import sqlite3
+import sys
+from bisect import bisect_left, bisect_right
+import threading
+import time
+
+from config import ALERT_LOG_PATH, ALERTS_PATH
+
+HYSTERESIS = 10
+DEDUP_SECONDS = 6 * 3600
+# Stations within this many degrees of a ZIP count towards its AQI, the same
+# box as store.nearby_observations and forecast.py
+NEARBY_DEGREES = 0.35
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    zip TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    contact TEXT,
+    created REAL,
+    last_sent REAL
+);
+-- Bumped by every subscribe and unsubscribe, so watchers reload only then
+CREATE TABLE IF NOT EXISTS subscription_version (version INTEGER NOT NULL);
+INSERT INTO subscription_version SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM subscription_version);
+"""
+
+def print_sink(alerts):
+    for alert in alerts:
+        print(f"[alert] ZIP {alert['zip']} AQI {alert['aqi']} exceeded {alert['threshold']} "
+              f"(subscription {alert['subscription']})")
+
+def _plain(value):
+    # numpy scalars (AQI from a frame, ids from an object array) -> int/float
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def default_sink():
+    return JsonlSink(ALERT_LOG_PATH) if ALERT_LOG_PATH else print_sink
+
+class JsonlSink:
+    # Appends one JSON object per alert, for a mailer or webhook to pick up
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def __call__(self, alerts):
+        if not alerts:
+            return
+        lines = "".join(json.dumps(alert, default=_plain) + "\n" for alert in alerts)
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+class AlertEngine:
+    def __init__(self, sink=print_sink, hysteresis=HYSTERESIS, dedup_seconds=DEDUP_SECONDS, clock=time.time):
+        self.sink = sink
+        self.hysteresis = hysteresis
+        self.dedup_seconds = dedup_seconds
+        self.clock = clock
+        self.lock = threading.Lock()
+        # subscription id -> (zip, threshold)
+        self.subscriptions = {}
+        # subscription id -> last_sent from the database, for load()
+        self.restored = {}
+        self.dirty = False
+        self._build()
+
+    def subscribe(self, subscription_id, zip_code, threshold):
+        with self.lock:
+            self.subscriptions[subscription_id] = (str(zip_code), float(threshold))
+            self.dirty = True
+
+    def unsubscribe(self, subscription_id):
+        with self.lock:
+            if self.subscriptions.pop(subscription_id, None) is not None:
+                self.dirty = True
+
+    def load(self, rows):
+        # Replaces every subscription with (id, zip, threshold, last_sent)
+        # rows. Ones already loaded keep their state; the others start armed,
+        # with last_sent from the row
+        with self.lock:
+            self.subscriptions = {}
+            self.restored = {}
+            for subscription_id, zip_code, threshold, last_sent in rows:
+                self.subscriptions[subscription_id] = (str(zip_code), float(threshold))
+                if last_sent is not None:
+                    self.restored[subscription_id] = last_sent
+            self.dirty = True
+
+    def zip_codes(self):
+        with self.lock:
+            if self.dirty:
+                self._build()
+            return list(self.ranges)
+
+    def _build(self):
+        # Re-sorts after subscription changes, carrying over armed/sent state
+        import numpy as np
+
+        previous = {}
+        if getattr(self, "ids", None) is not None:
+            previous = {sid: (armed, sent) for sid, armed, sent in zip(self.ids.tolist(), self.armed, self.last_sent)}
+
+        entries = sorted(self.subscriptions.items(), key=lambda item: item[1])
+        self.ids = np.array([sid for sid, _ in entries], dtype=object)
+        self.thresholds = np.array([threshold for _, (_, threshold) in entries], dtype=float)
+        # New subscriptions start armed and never sent
+        state = [previous.get(sid, (True, self.restored.get(sid, -np.inf))) for sid, _ in entries]
+        self.armed = np.array([armed for armed, _ in state], dtype=bool)
+        self.last_sent = np.array([sent for _, sent in state], dtype=float)
+
+        # ZIP -> (start, sorted thresholds) for the slice of the arrays; plain
+        # lists because bisect on a short list beats a numpy call per ZIP
+        self.ranges = {}
+        for i, (_, (zip_code, threshold)) in enumerate(entries):
+            self.ranges.setdefault(zip_code, (i, []))[1].append(threshold)
+        self.dirty = False
+
+    def evaluate(self, batch, observed_at=None):
+        # batch: iterable of (zip, aqi). Returns the alerts sent to the sink.
+        import numpy as np
+
+        now = self.clock()
+        alerts = []
+        with self.lock:
+            if self.dirty:
+                self._build()
+            for zip_code, aqi in batch:
+                bounds = self.ranges.get(str(zip_code))
+                if bounds is None or aqi is None:
+                    continue
+                aqi = int(aqi)
+                start, thresholds = bounds
+
+                # Subscriptions well above the current AQI re-arm
+                rearm_from = bisect_right(thresholds, aqi + self.hysteresis)
+                if rearm_from < len(thresholds):
+                    self.armed[start + rearm_from:start + len(thresholds)] = True
+
+                # Triggered: threshold < AQI, i.e. a prefix of the slice
+                triggered = bisect_left(thresholds, aqi)
+                if triggered == 0:
+                    continue
+                candidates = start + np.flatnonzero(self.armed[start:start + triggered])
+                if len(candidates) == 0:
+                    continue
+                due = candidates[now - self.last_sent[candidates] >= self.dedup_seconds]
+                # Deduplicated ones stay armed and fire once their window passes
+                self.armed[due] = False
+                self.last_sent[due] = now
+                for i in due.tolist():
+                    alerts.append({
+                        "subscription": self.ids[i],
+                        "zip": str(zip_code),
+                        "threshold": float(self.thresholds[i]),
+                        "aqi": aqi,
+                        "observed_at": observed_at,
+                        "sent_at": now,
+                    })
+        if alerts:
+            self.sink(alerts)
+        return alerts
+
+    def evaluate_map_data(self, map_data, observed_at=None):
+        # Convenience for get_map_data()-shaped records
+        return self.evaluate(((record["zip"], record["AQI"]) for record in map_data), observed_at)
+
+def connect(path=ALERTS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def add_subscription(zip_code, threshold, contact=None, path=ALERTS_PATH):
+    conn = connect(path)
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO subscriptions (zip, threshold, contact, created) VALUES (?, ?, ?, ?)",
+                (str(zip_code), float(threshold), contact, time.time()),
+            )
+            conn.execute("UPDATE subscription_version SET version = version + 1")
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def remove_subscription(subscription_id, path=ALERTS_PATH):
+    if not os.path.exists(path):
+        return False
+    conn = connect(path)
+    try:
+        with conn:
+            removed = conn.execute("DELETE FROM subscriptions WHERE id = ?", (subscription_id,)).rowcount
+            if removed:
+                conn.execute("UPDATE subscription_version SET version = version + 1")
+        return removed > 0
+    finally:
+        conn.close()
+
+def list_subscriptions(path=ALERTS_PATH):
+    # (id, zip, threshold, contact, last_sent) rows
+    if not os.path.exists(path):
+        return []
+    conn = connect(path)
+    try:
+        return conn.execute(
+            "SELECT id, zip, threshold, contact, last_sent FROM subscriptions ORDER BY id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+def station_batch(stations, zip_codes, degrees=NEARBY_DEGREES):
+    # stations: (lat, lon, aqi) latest readings. Returns (zip, AQI) for each
+    # ZIP with a station nearby, the worst of those stations' readings.
+    from geodata import lookup
+    from store import worst_nearby
+
+    locations = [location for location in map(lookup, zip_codes) if location is not None]
+    return [(location["zip"], int(aqi)) for location, aqi in worst_nearby(stations, locations, degrees)]
+
+class AlertWatcher:
+    # The process's AlertEngine, reloaded from the subscription table when it
+    # changes. Fetches hand readings to add(), evaluated on a thread of its
+    # own so a fetch never waits on SQLite; ingest.py calls evaluate().
+    def __init__(self, path=ALERTS_PATH, sink=None):
+        self.path = path
+        self.sink = sink or default_sink()
+        self.engine = AlertEngine(sink=self._deliver)
+        self.version = None
+        self.contacts = {}
+        self.db_lock = threading.Lock()
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, batch, observed_at=None):
+        # Until someone subscribes there is no database and nothing to do
+        if not os.path.exists(self.path):
+            return
+        self.queue.put((list(batch), observed_at))
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="alert-watcher", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            batch, observed_at = self.queue.get()
+            try:
+                self.evaluate(batch, observed_at)
+            except Exception as e:
+                print("Error evaluating alerts:", e)
+
+    def _sync(self, conn):
+        version = conn.execute("SELECT version FROM subscription_version").fetchone()[0]
+        if version != self.version:
+            rows = conn.execute("SELECT id, zip, threshold, last_sent, contact FROM subscriptions").fetchall()
+            self.engine.load(row[:4] for row in rows)
+            self.contacts = {row[0]: row[4] for row in rows}
+            self.version = version
+
+    def _deliver(self, alerts):
+        for alert in alerts:
+            alert["contact"] = self.contacts.get(alert["subscription"])
+        self.sink(alerts)
+
+    def evaluate(self, batch, observed_at=None):
+        if not os.path.exists(self.path):
+            return []
+        with self.db_lock:
+            conn = connect(self.path)
+            try:
+                self._sync(conn)
+                alerts = self.engine.evaluate(batch, observed_at)
+                if alerts:
+                    with conn:
+                        conn.executemany(
+                            "UPDATE subscriptions SET last_sent = ? WHERE id = ?",
+                            [(alert["sent_at"], alert["subscription"]) for alert in alerts],
+                        )
+            finally:
+                conn.close()
+        return alerts
+
+    def evaluate_stations(self, stations, observed_at=None):
+        # For ingest.py: subscribed ZIPs judged by their nearby stations
+        if not os.path.exists(self.path):
+            return []
+        with self.db_lock:
+            conn = connect(self.path)
+            try:
+                self._sync(conn)
+            finally:
+                conn.close()
+        return self.evaluate(station_batch(stations, self.engine.zip_codes()), observed_at)
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def alert_watcher():
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = AlertWatcher()
+        return _watcher
+
+def bench(subscriptions, zips=1000, batches=24, seed=0):
+    import random
+
+    rng = random.Random(seed)
+    sent = []
+    clock = [0.0]
+    engine = AlertEngine(sink=sent.extend, clock=lambda: clock[0])
+    zip_list = [f"{80000 + i:05d}" for i in range(zips)]
+    for i in range(subscriptions):
+        engine.subscribe(i, rng.choice(zip_list), rng.choice(range(50, 301, 10)))
+
+    started = time.perf_counter()
+    engine.evaluate([])  # builds the index
+    build_seconds = time.perf_counter() - started
+
+    # Each ZIP's AQI drifts hour to hour, like real observations
+    levels = {zip_code: rng.randint(20, 200) for zip_code in zip_list}
+    timings = []
+    for hour in range(batches):
+        clock[0] = hour * 3600.0
+        for zip_code in zip_list:
+            levels[zip_code] = min(500, max(0, levels[zip_code] + rng.randint(-25, 25)))
+        batch = list(levels.items())
+        started = time.perf_counter()
+        engine.evaluate(batch)
+        timings.append(time.perf_counter() - started)
+    return build_seconds, sorted(timings), len(sent)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage alert subscriptions, or time alert evaluation")
+    parser.add_argument("command", choices=["subscribe", "unsubscribe", "list", "bench"])
+    parser.add_argument("args", nargs="*", help="subscribe: ZIP AQI; unsubscribe: ID")
+    parser.add_argument("--contact", help="who the sink should notify")
+    parser.add_argument("--subscriptions", type=int, default=100_000)
+    parser.add_argument("--zips", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "subscribe":
+        from geodata import lookup
+
+        if len(args.args) != 2 or lookup(args.args[0]) is None:
+            parser.error("subscribe takes a Colorado ZIP and an AQI threshold")
+        subscription_id = add_subscription(lookup(args.args[0])["zip"], float(args.args[1]), args.contact)
+        print(f"Subscription {subscription_id}: ZIP {args.args[0]} above AQI {args.args[1]}")
+    elif args.command == "unsubscribe":
+        if len(args.args) != 1 or not args.args[0].isdigit():
+            parser.error("unsubscribe takes a subscription id")
+        print("Removed" if remove_subscription(int(args.args[0])) else f"No subscription {args.args[0]}")
+    elif args.command == "list":
+        for subscription_id, zip_code, threshold, contact, last_sent in list_subscriptions():
+            sent = time.strftime("%Y-%m-%d %H:%M", time.localtime(last_sent)) if last_sent else "never"
+            print(f"{subscription_id:>6}  {zip_code}  > {threshold:g}  {contact or '-'}  last sent {sent}")
+    else:
+        build_seconds, timings, sent = bench(args.subscriptions, args.zips)
+        print(f"{args.subscriptions:,} subscriptions over {args.zips} ZIPs: index built in {build_seconds * 1000:.0f} ms")
+        print(f"per hourly batch: p50 {timings[len(timings) // 2] * 1000:.2f} ms, "
+              f"max {timings[-1] * 1000:.2f} ms; {sent:,} alerts in {len(timings)} batches")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+# anomalies.py
+#
+# Online anomaly and wildfire-smoke event detection over incoming
+# observations. Each ZIP keeps an exponentially weighted mean and variance of
+# its PM2.5 sub-index (three numbers, O(1) memory per ZIP), so a batch is
+# scored and folded in with a handful of vectorized operations. A reading is
+# anomalous when it is far above the ZIP's own recent level and unhealthy in
+# absolute terms. Anomalous stations near each other are grouped into regional
+# events, which keep their id from hour to hour while the plume persists or
+# drifts.
+#
+# ingest.py feeds each bulk file to one detector whose state is kept at
+# SMOKE_STATE_PATH, each ZIP reading the worst PM2.5 of the stations near it,
+# so every app process shows the same events however often pages are viewed.
+#
+#   python anomalies.py synth fixtures/smoke_replay.jsonl --zips 2000 --plumes 12
+#   python anomalies.py replay fixtures/smoke_replay.jsonl
+#   python anomalies.py replay --zips 5000 --hours 240 --plumes 40   # generated in memory
+import json
+import math
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+from config import SMOKE_STATE_PATH
+
+# EWMA weight of a new reading (about a 10-hour memory)
+ALPHA = 0.1
+# Anomalous readings barely move the baseline, so a long plume stays anomalous
+ANOMALY_ALPHA = 0.01
+Z_THRESHOLD = 3.0
+# Floor on the standard deviation (AQI points), so a very steady ZIP doesn't
+# flag ordinary hour-to-hour noise
+MIN_STD = 8.0
+# Start of "Unhealthy for Sensitive Groups"
+MIN_LEVEL = 101
+# Readings a ZIP needs before it can be flagged
+WARMUP = 6
+EVENT_RADIUS_KM = 60
+# A lone spiking station is an anomaly, not a regional event
+EVENT_MIN_STATIONS = 2
+# An event closes after this long without anomalous stations
+EVENT_GAP_SECONDS = 3 * 3600
+KEEP_CLOSED_EVENTS = 100
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    # Equirectangular approximation; plenty at these distances
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371.0 * math.hypot(x, y)
+
+def group_nearby(points, radius_km=EVENT_RADIUS_KM):
+    # points: list of (lat, lon). Returns groups of indices, where stations
+    # within radius_km of each other (transitively) share a group. Points are
+    # bucketed into grid cells whose diagonal is the radius, so everything in a
+    # cell is one group and only cells up to two apart need distance checks.
+    if not points:
+        return []
+    mean_lat = sum(lat for lat, _ in points) / len(points)
+    cell_lat = radius_km / 111.0 / math.sqrt(2)
+    cell_lon = radius_km / (111.0 * max(math.cos(math.radians(mean_lat)), 0.1)) / math.sqrt(2)
+    cells = {}
+    for i, (lat, lon) in enumerate(points):
+        cells.setdefault((math.floor(lat / cell_lat), math.floor(lon / cell_lon)), []).append(i)
+
+    parent = list(range(len(points)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for members in cells.values():
+        for i in members[1:]:
+            parent[find(i)] = find(members[0])
+    for (row, col), members in cells.items():
+        for d_row in range(-2, 3):
+            for d_col in range(-2, 3):
+                others = cells.get((row + d_row, col + d_col))
+                if not others or (d_row, d_col) <= (0, 0) or find(members[0]) == find(others[0]):
+                    continue
+                # Stop at the first pair in reach; the cells are then joined
+                if any(_distance_km(*points[i], *points[j]) <= radius_km for i in members for j in others):
+                    parent[find(members[0])] = find(others[0])
+
+    groups = {}
+    for i in range(len(points)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+class SmokeDetector:
+    def __init__(self, alpha=ALPHA, anomaly_alpha=ANOMALY_ALPHA, z_threshold=Z_THRESHOLD, min_std=MIN_STD,
+                 min_level=MIN_LEVEL, warmup=WARMUP, radius_km=EVENT_RADIUS_KM,
+                 min_stations=EVENT_MIN_STATIONS, gap_seconds=EVENT_GAP_SECONDS):
+        import numpy as np
+
+        self.alpha = alpha
+        self.anomaly_alpha = anomaly_alpha
+        self.z_threshold = z_threshold
+        self.min_std = min_std
+        self.min_level = min_level
+        self.warmup = warmup
+        self.radius_km = radius_km
+        self.min_stations = min_stations
+        self.gap_seconds = gap_seconds
+        self.lock = threading.Lock()
+        # ZIP -> row in the state arrays
+        self.rows = {}
+        self.mean = np.zeros(0)
+        self.var = np.zeros(0)
+        self.count = np.zeros(0, dtype=np.int32)
+        # Open events by id, and the most recently closed ones
+        self.events = {}
+        self.closed = deque(maxlen=KEEP_CLOSED_EVENTS)
+        self.next_event_id = 1
+        # Newest observed_at fed in, so a re-ingested hour isn't counted twice
+        self.last_observed = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _rows_for(self, zips):
+        import numpy as np
+
+        for zip_code in zips:
+            if zip_code not in self.rows:
+                self.rows[zip_code] = len(self.rows)
+        if len(self.rows) > len(self.mean):
+            # Grow by doubling so adding ZIPs one batch at a time stays cheap
+            size = max(len(self.rows), 2 * len(self.mean), 64)
+            extra = size - len(self.mean)
+            self.mean = np.concatenate([self.mean, np.zeros(extra)])
+            self.var = np.concatenate([self.var, np.zeros(extra)])
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int32)])
+        return np.fromiter((self.rows[zip_code] for zip_code in zips), dtype=np.int64, count=len(zips))
+
+    def update(self, batch, observed_at):
+        # batch: iterable of (zip, lat, lon, value); observed_at: epoch seconds
+        # or a datetime. Returns (anomalies, events seen in this batch).
+        import numpy as np
+
+        if hasattr(observed_at, "timestamp"):
+            observed_at = observed_at.timestamp()
+        # The last reading wins if a ZIP appears twice
+        readings = {}
+        for zip_code, lat, lon, value in batch:
+            if value is not None and value == value and lat is not None and lon is not None:
+                readings[str(zip_code)] = (lat, lon, float(value))
+
+        with self.lock:
+            self.last_observed = max(observed_at, self.last_observed or observed_at)
+            zips = list(readings)
+            rows = self._rows_for(zips)
+            values = np.fromiter((readings[zip_code][2] for zip_code in zips), dtype=float, count=len(zips))
+            mean, var, count = self.mean[rows], self.var[rows], self.count[rows]
+
+            z = (values - mean) / np.sqrt(np.maximum(var, self.min_std ** 2))
+            flagged = (count >= self.warmup) & (z >= self.z_threshold) & (values >= self.min_level)
+
+            # Incremental EWMA mean/variance; a ZIP's first reading sets its mean
+            alpha = np.where(count == 0, 1.0, np.where(flagged, self.anomaly_alpha, self.alpha))
+            diff = values - mean
+            increment = alpha * diff
+            self.mean[rows] = mean + increment
+            # Flagged readings leave the spread alone, or a long plume would
+            # widen it until the plume itself looked normal
+            self.var[rows] = np.where(flagged, var, (1 - alpha) * (var + diff * increment))
+            self.count[rows] = count + 1
+
+            anomalies = [
+                {"zip": zips[i], "lat": readings[zips[i]][0], "lon": readings[zips[i]][1],
+                 "value": values[i], "z": round(float(z[i]), 2)}
+                for i in np.flatnonzero(flagged).tolist()
+            ]
+            events = self._track_events(anomalies, observed_at)
+        return anomalies, events
+
+    def _track_events(self, anomalies, now):
+        seen = []
+        groups = group_nearby([(anomaly["lat"], anomaly["lon"]) for anomaly in anomalies], self.radius_km)
+        for group in groups:
+            if len(group) < self.min_stations:
+                continue
+            members = [anomalies[i] for i in group]
+            zips = {member["zip"] for member in members}
+            lat = sum(member["lat"] for member in members) / len(members)
+            lon = sum(member["lon"] for member in members) / len(members)
+            peak = max(members, key=lambda member: member["value"])
+
+            # Same event if it shares a station or its centre is within reach
+            # of where the event was last seen (plumes drift)
+            event = next((event for event in self.events.values()
+                          if event["last_seen"] != now and (zips & event["all_zips"]
+                              or _distance_km(lat, lon, event["lat"], event["lon"]) <= self.radius_km)), None)
+            if event is None:
+                event = {"id": self.next_event_id, "started": now, "peak": 0.0, "hours": 0, "all_zips": set()}
+                self.events[event["id"]] = event
+                self.next_event_id += 1
+            event.update(zips=sorted(zips), stations=len(zips), lat=lat, lon=lon, last_seen=now,
+                         current_peak=peak["value"], peak_zip=peak["zip"])
+            event["peak"] = max(event["peak"], peak["value"])
+            event["hours"] += 1
+            event["all_zips"] |= zips
+            seen.append(event)
+
+        for event_id in [event_id for event_id, event in self.events.items() if now - event["last_seen"] > self.gap_seconds]:
+            self.closed.append(self.events.pop(event_id))
+        return [self._public(event) for event in seen]
+
+    def _public(self, event):
+        return {key: value for key, value in event.items() if key != "all_zips"}
+
+    def active_events(self):
+        with self.lock:
+            return [self._public(event) for event in self.events.values()]
+
+    def update_map_data(self, map_data, observed_at, pollutant="PM2.5"):
+        # Convenience for get_map_data()-shaped records
+        return self.update(((record["zip"], record["lat"], record["lon"], record.get(pollutant))
+                            for record in map_data), observed_at)
+
+# --- State shared through SMOKE_STATE_PATH ---
+
+def load_detector(path=SMOKE_STATE_PATH):
+    if not os.path.exists(path):
+        return SmokeDetector()
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def save_detector(detector, path=SMOKE_STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(detector, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def smoke_state_mtime(path=SMOKE_STATE_PATH):
+    # Changes whenever ingest.py feeds the detector
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def update_from_stations(stations, observed_at, path=SMOKE_STATE_PATH):
+    # stations: (lat, lon, PM2.5 sub-index) of each station's newest reading,
+    # observed_at epoch seconds. Returns the events seen, or None when this
+    # hour was already fed.
+    from geodata import locations
+    from store import worst_nearby
+
+    detector = load_detector(path)
+    if detector.last_observed is not None and observed_at <= detector.last_observed:
+        return None
+    batch = [(location["zip"], location["lat"], location["lon"], value)
+             for location, value in worst_nearby(stations, locations())]
+    _, events = detector.update(batch, observed_at)
+    save_detector(detector, path)
+    return events
+
+def stored_events(path=SMOKE_STATE_PATH, now=None):
+    # Open events of the shared detector; one not seen for EVENT_GAP_SECONDS
+    # is over even if no ingest has run since to close it
+    now = time.time() if now is None else now
+    return [event for event in load_detector(path).active_events()
+            if now - event["last_seen"] <= EVENT_GAP_SECONDS]
+
+# --- Synthetic smoke plumes for replay ---
+
+# Plume contribution (AQI points) that counts as smoke in the ground truth
+SMOKE_TRUTH_LEVEL = 25
+
+def synthetic_replay(zips=2000, hours=240, plumes=12, seed=0):
+    # Yields (hour, batch, truth): batch rows are (zip, lat, lon, pm25 AQI) and
+    # truth maps each ZIP under smoke that hour to the plume's index.
+    # Plumes are Gaussian blobs drifting with a random wind.
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    zip_ids = [f"Z{i:05d}" for i in range(zips)]
+    lat = rng.uniform(37.0, 41.0, zips)
+    lon = rng.uniform(-109.0, -102.0, zips)
+    base = rng.uniform(15, 45, zips)
+    phase = rng.uniform(0, 2 * np.pi, zips)
+
+    plume_specs = []
+    for _ in range(plumes):
+        start = int(rng.integers(2 * WARMUP, max(2 * WARMUP + 1, hours - 12)))
+        plume_specs.append({
+            "start": start,
+            "end": start + int(rng.integers(6, 30)),
+            "lat": rng.uniform(37.5, 40.5), "lon": rng.uniform(-108.5, -102.5),
+            "d_lat": rng.normal(0, 0.05), "d_lon": rng.normal(0.08, 0.05),
+            "radius_km": rng.uniform(30, 80),
+            "peak": rng.uniform(120, 260),
+        })
+
+    km_lat = 111.0
+    km_lon = 111.0 * np.cos(np.radians(lat))
+    for hour in range(hours):
+        values = base + 8 * np.sin(2 * np.pi * hour / 24 + phase) + rng.normal(0, 4, zips)
+        truth = {}
+        for index, plume in enumerate(plume_specs):
+            if not plume["start"] <= hour < plume["end"]:
+                continue
+            age = hour - plume["start"]
+            center_lat = plume["lat"] + plume["d_lat"] * age
+            center_lon = plume["lon"] + plume["d_lon"] * age
+            distance = np.hypot((lat - center_lat) * km_lat, (lon - center_lon) * km_lon)
+            smoke = plume["peak"] * np.exp(-0.5 * (distance / plume["radius_km"]) ** 2)
+            values += smoke
+            # Ground truth: smoke well above the hour-to-hour noise
+            for i in np.flatnonzero(smoke >= SMOKE_TRUTH_LEVEL).tolist():
+                truth[zip_ids[i]] = index
+        values = np.clip(np.round(values), 0, 500)
+        batch = list(zip(zip_ids, lat.tolist(), lon.tolist(), values.tolist()))
+        yield hour, batch, truth
+
+def write_fixture(path, **options):
+    with open(path, "w", encoding="utf-8") as f:
+        for hour, batch, truth in synthetic_replay(**options):
+            f.write(json.dumps({"hour": hour, "batch": batch, "truth": truth}) + "\n")
+
+def read_fixture(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            yield record["hour"], record["batch"], record["truth"]
+
+def replay(batches, detector=None):
+    # Feeds hourly batches through a detector and scores it against the truth.
+    # Precision counts flags on any smoke; recall counts smoky readings that
+    # are also unhealthy, since nothing below MIN_LEVEL is ever flagged.
+    detector = detector or SmokeDetector()
+    flagged_true = flagged = caught = unhealthy = observations = 0
+    plumes, detected_plumes, event_ids = set(), set(), set()
+    timings = []
+    for hour, batch, truth in batches:
+        started = time.perf_counter()
+        anomalies, events = detector.update(batch, hour * 3600.0)
+        timings.append(time.perf_counter() - started)
+
+        observations += len(batch)
+        flagged += len(anomalies)
+        flagged_true += sum(anomaly["zip"] in truth for anomaly in anomalies)
+        flagged_zips = {anomaly["zip"] for anomaly in anomalies}
+        for zip_code, _, _, value in batch:
+            if zip_code in truth and value >= detector.min_level:
+                unhealthy += 1
+                caught += zip_code in flagged_zips
+        plumes.update(truth.values())
+        for event in events:
+            event_ids.add(event["id"])
+            detected_plumes.update(truth[zip_code] for zip_code in event["zips"] if zip_code in truth)
+    timings.sort()
+    return {
+        "observations": observations,
+        "seconds": sum(timings),
+        "p50_ms": timings[len(timings) // 2] * 1000 if timings else 0.0,
+        "max_ms": timings[-1] * 1000 if timings else 0.0,
+        "precision": flagged_true / flagged if flagged else 1.0,
+        "recall": caught / unhealthy if unhealthy else 1.0,
+        "plumes": len(plumes),
+        "detected_plumes": len(detected_plumes),
+        "events": len(event_ids),
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay synthetic smoke plumes through the detector")
+    parser.add_argument("command", choices=["synth", "replay"])
+    parser.add_argument("path", nargs="?", help="fixture file (JSON lines)")
+    parser.add_argument("--zips", type=int, default=2000)
+    parser.add_argument("--hours", type=int, default=240)
+    parser.add_argument("--plumes", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    options = dict(zips=args.zips, hours=args.hours, plumes=args.plumes, seed=args.seed)
+
+    if args.command == "synth":
+        if not args.path:
+            parser.error("synth needs an output path")
+        write_fixture(args.path, **options)
+        print(f"Wrote {args.hours} hourly batches for {args.zips} ZIPs with {args.plumes} plumes to {args.path}")
+        sys.exit(0)
+
+    batches = read_fixture(args.path) if args.path else synthetic_replay(**options)
+    stats = replay(batches)
+    print(f"{stats['observations']:,} observations in {stats['seconds']:.2f} s "
+          f"({stats['observations'] / max(stats['seconds'], 1e-9):,.0f}/s); per hourly batch "
+          f"p50 {stats['p50_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+    print(f"anomalies: precision {stats['precision']:.2f}, recall {stats['recall']:.2f}")
+    print(f"plumes detected {stats['detected_plumes']}/{stats['plumes']} as {stats['events']} events")
@@ -0,0 +1,402 @@
+# api.py
+#
+# Headless HTTP API over the data the dashboard shows, for services that would
+# otherwise scrape the Streamlit page. Data comes through data_loader, so the
+# shared cache, circuit breaker and quota all apply. Each data set is loaded
+# once per refresh period and every route and format reading it is encoded
+# from that copy, so /map, /map?format=arrow and /rankings agree. Encoded
+# responses are kept until the end of the period too, keyed only by the query
+# parameters the route reads, so a repeat request is a dict lookup;
+# If-None-Match turns it into a bodiless 304, and gzip is applied when the
+# client accepts it.
+#
+#   /aqi/{zip}                 latest observation for a ZIP
+#   /map                       every ZIP's AQI and pollutant sub-indices
+#   /rankings?n=10             most polluted and cleanest n ZIPs
+#   /trend/{zip}?from=&to=     hourly history from the local store, UTC dates
+#
+# JSON by default; an Arrow IPC stream with ?format=arrow or
+# Accept: application/vnd.apache.arrow.stream.
+#
+#   python api.py serve [--host 127.0.0.1] [--port 8503]
+#   python api.py bench --requests 20000 --clients 8     # local load test
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from config import API_HOST, API_PORT, DATA_REFRESH_SECONDS, POLLUTANTS, STORE_PATH
+
+JSON_TYPE = "application/json"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+RESPONSE_CACHE_ENTRIES = 4096
+DATA_CACHE_ENTRIES = 2048
+MAX_RANKINGS = 100
+MAX_TREND_DAYS = 31
+# Smaller bodies aren't worth compressing
+GZIP_MIN_BYTES = 512
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def refresh_period():
+    return int(time.time() // DATA_REFRESH_SECONDS)
+
+class PeriodCache:
+    # LRU of values for the current refresh period. One computation per key at
+    # a time; other callers for it wait for the result.
+    def __init__(self, entries):
+        self.entries = entries
+        self.values = OrderedDict()
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def _cached(self, key):
+        with self.lock:
+            value = self.values.get(key)
+            if value is not None:
+                self.values.move_to_end(key)
+            return value
+
+    def get(self, key, compute):
+        # compute() returns (value, cacheable); returns the same pair
+        value = self._cached(key)
+        if value is not None:
+            return value, True
+
+        with self.lock:
+            lock = self.key_locks.setdefault(key, threading.Lock())
+        with lock:
+            value = self._cached(key)
+            if value is not None:
+                return value, True
+            try:
+                value, cacheable = compute()
+                if cacheable:
+                    with self.lock:
+                        self.values[key] = value
+                        while len(self.values) > self.entries:
+                            self.values.popitem(last=False)
+            finally:
+                with self.lock:
+                    self.key_locks.pop(key, None)
+        return value, cacheable
+
+_data = PeriodCache(DATA_CACHE_ENTRIES)
+_responses = PeriodCache(RESPONSE_CACHE_ENTRIES)
+
+def period_data(key, load):
+    # load() returns (value, cacheable)
+    return _data.get((*key, refresh_period()), load)
+
+def _location(zip_code):
+    from geodata import lookup
+
+    location = lookup(zip_code)
+    if location is None:
+        raise ApiError(404, f"Unknown ZIP code {zip_code}")
+    return location
+
+# Loaders return (data, cacheable); endpoints return (JSON payload, rows for
+# Arrow, cacheable)
+
+def load_aqi(zip_code):
+    from data_loader import UpstreamUnavailable, get_live_observations, stale_observations
+
+    location = _location(zip_code)
+    try:
+        observations = get_live_observations(zip_code)
+    except UpstreamUnavailable as e:
+        print("Error fetching air quality data:", e)
+        observations = stale_observations(zip_code)
+    as_of = observations.attrs.get("as_of")
+    stale = bool(observations.attrs.get("stale"))
+    latest = observations.sort_values(["Date", "Hour"]).tail(1)
+    # to_json maps NaN/NA to null
+    reading = json.loads(latest.to_json(orient="records"))
+    row = {
+        "zip": zip_code,
+        "city": location["city"],
+        "as_of": as_of.isoformat() if as_of is not None else None,
+        "stale": stale,
+        **(reading[0] if reading else {}),
+    }
+    # A fallback is never kept, so the next request tries upstream again
+    return row, not stale
+
+def load_map():
+    from data_loader import get_map_data
+
+    return get_map_data(), True
+
+def aqi_endpoint(zip_code, query):
+    row, cacheable = period_data(("aqi", zip_code), lambda: load_aqi(zip_code))
+    return row, [row], cacheable
+
+def map_endpoint(query):
+    records, cacheable = period_data(("map",), load_map)
+    return records, records, cacheable
+
+def rankings_endpoint(query):
+    try:
+        n = int(query.get("n", "10"))
+    except ValueError:
+        raise ApiError(400, "n must be an integer")
+    if not 1 <= n <= MAX_RANKINGS:
+        raise ApiError(400, f"n must be between 1 and {MAX_RANKINGS}")
+    # Ranked from the same snapshot /map serves
+    records, cacheable = period_data(("map",), load_map)
+    ranked = sorted(records, key=lambda record: record["AQI"])
+    payload = {"most_polluted": ranked[::-1][:n], "cleanest": ranked[:n]}
+    rows = [
+        {"ranking": ranking, "rank": i + 1, **record}
+        for ranking, records in payload.items()
+        for i, record in enumerate(records)
+    ]
+    return payload, rows, cacheable
+
+def load_trend(location, start, end):
+    rows = []
+    if os.path.exists(STORE_PATH):
+        import store
+
+        conn = store.connect()
+        try:
+            history = store.nearby_observations_between(
+                conn, location["lat"], location["lon"], start.isoformat(), (end + timedelta(days=1)).isoformat()
+            )
+        finally:
+            conn.close()
+        rows = [
+            {"observed_at": observed_at.replace(" ", "T") + ":00Z", "AQI": aqi, **dict(zip(POLLUTANTS, values))}
+            for observed_at, aqi, *values in history
+        ]
+    return rows, True
+
+def trend_endpoint(zip_code, query):
+    location = _location(zip_code)
+    try:
+        end = date.fromisoformat(query["to"]) if "to" in query else date.today()
+        start = date.fromisoformat(query["from"]) if "from" in query else end - timedelta(days=6)
+    except ValueError:
+        raise ApiError(400, "from and to must be YYYY-MM-DD dates")
+    if start > end or (end - start).days >= MAX_TREND_DAYS:
+        raise ApiError(400, f"from must not be after to, and the range is at most {MAX_TREND_DAYS} days")
+
+    rows, cacheable = period_data(("trend", zip_code, start, end), lambda: load_trend(location, start, end))
+    return rows, rows, cacheable
+
+# Route -> (endpoint, takes a ZIP, query parameters it reads)
+ROUTES = {
+    "aqi": (aqi_endpoint, True, ()),
+    "map": (map_endpoint, False, ()),
+    "rankings": (rankings_endpoint, False, ("n",)),
+    "trend": (trend_endpoint, True, ("from", "to")),
+}
+
+def encode(payload, rows, fmt):
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        table = pa.Table.from_pylist(rows)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+class Response:
+    def __init__(self, body, content_type, expires):
+        self.body = body
+        self.content_type = content_type
+        self.expires = expires
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self._gzipped = None
+
+    def gzipped(self):
+        # Compressed on first use, then kept alongside the plain body
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+def get_response(route, args, query, fmt):
+    handler, _, params = ROUTES[route]
+    period = refresh_period()
+    # Other parameters can't change the answer, so they don't split the cache
+    key = (route, args, tuple(query.get(name) for name in params), fmt, period)
+
+    def compute():
+        payload, rows, cacheable = handler(*args, query)
+        content_type = ARROW_TYPE if fmt == "arrow" else JSON_TYPE
+        expires = (period + 1) * DATA_REFRESH_SECONDS if cacheable else 0
+        return Response(encode(payload, rows, fmt), content_type, expires), cacheable
+
+    return _responses.get(key, compute)[0]
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients polling the API reuse their connection
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, Nagle plus delayed
+    # ACKs hold every keep-alive response back ~40 ms
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        fmt = query.pop("format", None) or ("arrow" if ARROW_TYPE in self.headers.get("Accept", "") else "json")
+        try:
+            route = ROUTES.get(parts[0])
+            if route is None or len(parts) != (2 if route[1] else 1):
+                raise ApiError(404, "Not found")
+            if fmt not in ("json", "arrow"):
+                raise ApiError(400, "format must be json or arrow")
+            response = get_response(parts[0], tuple(parts[1:]), query, fmt)
+        except ApiError as e:
+            self.send_body(e.status, json.dumps({"error": str(e)}).encode("utf-8"), JSON_TYPE)
+            return
+        except Exception as e:
+            print(f"Error serving {self.path}:", e)
+            self.send_body(502, json.dumps({"error": "Upstream data unavailable"}).encode("utf-8"), JSON_TYPE)
+            return
+
+        headers = {"ETag": response.etag, "Vary": "Accept, Accept-Encoding"}
+        max_age = int(response.expires - time.time())
+        headers["Cache-Control"] = f"public, max-age={max_age}" if max_age > 0 else "no-store"
+        # The ETag names the uncompressed body, so it matches either encoding
+        if response.etag in self.headers.get("If-None-Match", ""):
+            self.send_body(304, b"", None, headers)
+            return
+        body = response.body
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = response.gzipped()
+            headers["Content-Encoding"] = "gzip"
+        self.send_body(200, body, response.content_type, headers)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def _bench_client(port, paths, count, headers):
+    # One keep-alive connection; returns per-request latencies and status counts
+    import http.client
+
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies, statuses = [], {}
+    for i in range(count):
+        path = paths[i % len(paths)]
+        started = time.perf_counter()
+        conn.request("GET", path, headers=headers.get(path, {}))
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+    conn.close()
+    return latencies, statuses
+
+def bench(requests, clients, revalidate=False):
+    # Serves the API from a subprocess against the mock AirNow server and
+    # drives it from `clients` processes once every response is cached
+    import http.client
+    import socket
+    import subprocess
+    from concurrent.futures import ProcessPoolExecutor
+
+    from geodata import zip_codes
+    from mock_airnow import start_mock_server
+
+    mock = start_mock_server()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, AIRNOW_BASE_URL=mock.base_url, AQ_AIRNOW_QUOTA="1000000000")
+    server = subprocess.Popen([sys.executable, __file__, "serve", "--port", str(port)], env=env)
+    try:
+        for _ in range(100):
+            try:
+                http.client.HTTPConnection("127.0.0.1", port, timeout=1).connect()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        paths = ["/map", "/rankings?n=10", *(f"/aqi/{zip_code}" for zip_code in zip_codes())]
+        # Warm-up fills the response cache; the timed run measures serving from it
+        _, statuses = _bench_client(port, paths, len(paths), {})
+        if set(statuses) != {200}:
+            print(f"warm-up answered {statuses}")
+        headers = {}
+        if revalidate:
+            for path in paths:
+                conn = http.client.HTTPConnection("127.0.0.1", port)
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                headers[path] = {"If-None-Match": response.getheader("ETag")}
+                conn.close()
+        for path in paths:
+            headers.setdefault(path, {})["Accept-Encoding"] = "gzip"
+
+        per_client = requests // clients
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(_bench_client, [port] * clients,
+                                    [paths[i:] + paths[:i] for i in range(clients)],
+                                    [per_client] * clients, [headers] * clients))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+        mock.shutdown()
+
+    latencies = sorted(latency for result, _ in results for latency in result)
+    statuses = {}
+    for _, counts in results:
+        for status, count in counts.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return len(latencies) / elapsed, latencies, statuses, mock.mock.stats.get("requests", 0)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Headless JSON/Arrow API for air quality data")
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("--host", default=API_HOST, help="0.0.0.0 to accept remote clients")
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--revalidate", action="store_true", help="send If-None-Match, so answers are 304s")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+        server.daemon_threads = True
+        print(f"API listening on http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        rate, latencies, statuses, upstream = bench(args.requests, args.clients, args.revalidate)
+        p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        print(f"{len(latencies):,} requests from {args.clients} clients: {rate:,.0f} req/s, "
+              f"p50 {p(0.5):.2f} ms, p99 {p(0.99):.2f} ms")
+        print(f"statuses {dict(sorted(statuses.items()))}; {upstream} upstream requests")
@@ -1,683 +1,359 @@
 import streamlit as st
 import base64
-from config import COLORADO_ZIPS, POLLUTANTS
-from data_loader import get_air_quality_data, get_asthma_data, get_map_data
+import datetime
+import io
+import os
+import time
+from anomalies import SmokeDetector, smoke_state_mtime, stored_events
+from config import POLLUTANTS, DATA_REFRESH_SECONDS, MAP_CENTER, MAP_TILES, STORE_PATH
+from compare import COMPARE_HOURS, MAX_ZIPS, comparison_frame
+from data_loader import (
+    get_asthma_data,
+    get_map_data,
+    get_live_observations,
+    select_map_pollutant,
+    select_pollutant,
+    stale_observations,
+    submit_call,
+    UpstreamUnavailable
+)
+from export import export
+from forecast import forecast_for, forecast_mtime, load_forecasts
+from geodata import lookup, zip_codes
+from layout import HEADER_HTML, HERO_HTML, PAGE_CSS, STATS_HTML
+from sensors import load_sensor_points, merge_map_data
+from spatial import SpatialIndex
+from store import POLLUTANT_COLUMNS
+from tiles import publish, tile_server_ready
+from metrics import (
+    mark_cache_miss,
+    render_prometheus,
+    section_timer,
+    start_metrics_server,
+    timing_summary,
+    track_cache
+)
 from visualizations import (
     create_aqi_map,
+    create_aqi_choropleth,
+    create_aqi_tile_map,
     show_aqi_rankings,
     plot_pollution_trend,
+    plot_comparison,
     plot_asthma_vs_pollution
 )
 
 # Page config
 st.set_page_config(page_title="Colorado Air & Asthma Tracker", page_icon="🫁", layout="wide")
 
-# Custom CSS for styling - Streamlit-compatible approach
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600;700;800&display=swap');
-    
-    /* Base styles */
-    html, body, [class*="css"], .stApp {
-        font-family: 'Poppins', sans-serif !important;
-    }
-    
-    /* Reset Streamlit defaults */
-    .stApp {
-        background-color: #fff;
-    }
-    
-    .css-18e3th9, .css-1d391kg, .css-12oz5g7, .st-emotion-cache-18e3th9, .st-emotion-cache-1d391kg {
-        padding: 0 !important;
-        background-color: #fff !important;
-    }
-    
-    div[data-testid="stVerticalBlock"] {
-        background-color: #fff !important;
-    }
-    
-    .block-container {
-        padding-top: 0;
-        padding-bottom: 0;
-        max-width: 100%;
-        margin: 0 auto;
-        background-color: #fff;
-    }
-    
-   /* Typography */
-    h1 {
-        font-weight: 700;
-        font-size: 3rem;
-        margin-bottom: 1rem;
-        color: #1E90FF !important;
-    }
-
-    h2 {
-        font-weight: 600;
-        font-size: 2.25rem;
-        margin-top: 3rem;
-        margin-bottom: 1.5rem;
-        color: #1E90FF !important;
-        text-align: center;
-    }
+# Prometheus endpoint on localhost when AQ_METRICS_PORT is set (no-op otherwise)
+start_metrics_server()
 
-    h3 {
-        font-weight: 600;
-        font-size: 1.5rem;
-        margin-top: 2rem;
-        margin-bottom: 1rem;
-        color: #1E90FF !important;
-    }
-    
-    p, li {
-        font-size: 1rem;
-        line-height: 1.6;
-        color: #212529;
-        font-weight: 400;
-    }
-    
-    /* Header styling */
-    .header-container {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        padding: 1rem 2rem;
-        background-color: white;
-        border-bottom: 1px solid #f0f0f0;
-        margin-bottom: 2rem;
-        position: sticky;
-        top: 0;
-        z-index: 1000;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-    }
-    
-    .logo-container {
-        display: flex;
-        align-items: center;
-    }
-    
-    .logo-text {
-        color: #1E90FF;
-        font-weight: 700;
-        font-size: 1.5rem;
-        margin-left: 0.5rem;
-    }
-    
-    .nav-links {
-        display: flex;
-        gap: 1.5rem;
-    }
-    
-    .nav-link {
-        text-decoration: none;
-        font-weight: 500;
-        transition: color 0.3s ease;
-        padding: 0.5rem 1rem;
-        border-radius: 4px;
-    }
-    
-    .nav-link:hover {
-        background-color: rgba(30,144,255,0.1);
-    }
-    
-    .nav-home {
-        color: #1E90FF;
-    }
-    
-    .nav-about {
-        color: #6f42c1;
-    }
-    
-    .nav-data {
-        color: #28a745;
-    }
-    
-    .nav-resources {
-        color: #fd7e14;
-    }
-    
-    .nav-home:hover {
-        color: #fff;
-        background-color: #1E90FF;
-    }
-    
-    .nav-about:hover {
-        color: #fff;
-        background-color: #6f42c1;
-    }
-    
-    .nav-data:hover {
-        color: #fff;
-        background-color: #28a745;
-    }
-    
-    .nav-resources:hover {
-        color: #fff;
-        background-color: #fd7e14;
-    }
-    
-    /* Theme toggle */
-    .toggle-container {
-        display: flex;
-        align-items: center;
-    }
-    
-    .toggle-box {
-        position: relative;
-        width: 60px;
-        height: 30px;
-    }
-    
-    .toggle-checkbox {
-        opacity: 0;
-        width: 0;
-        height: 0;
-    }
-    
-    .toggle-label {
-        position: absolute;
-        cursor: pointer;
-        top: 0;
-        left: 0;
-        right: 0;
-        bottom: 0;
-        background-color: #ccc;
-        transition: .4s;
-        border-radius: 34px;
-    }
-    
-    .toggle-label:before {
-        position: absolute;
-        content: "";
-        height: 22px;
-        width: 22px;
-        left: 4px;
-        bottom: 4px;
-        background-color: white;
-        transition: .4s;
-        border-radius: 50%;
-    }
-    
-    .toggle-checkbox:checked + .toggle-label {
-        background-color: #1E90FF;
-    }
-    
-    .toggle-checkbox:checked + .toggle-label:before {
-        transform: translateX(30px);
-    }
-    
-    /* Hero section */
-    .hero-container {
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        text-align: center;
-        padding: 3rem 0;
-        background-image: linear-gradient(rgba(0,0,0,0.6), rgba(0,0,0,0.6)), url('https://images.unsplash.com/photo-1519501025264-65ba15a82390?ixlib=rb-1.2.1&auto=format&fit=crop&w=1200&q=80');
-        background-size: cover;
-        background-position: center;
-        color: white;
-        border-radius: 10px;
-        margin-bottom: 2rem;
-    }
-    
-    .hero-title {
-        font-size: 3rem;
-        font-weight: 700;
-        margin-bottom: 1rem;
-    }
-    
-    .hero-subtitle {
-        font-size: 1.2rem;
-        max-width: 800px;
-        margin-bottom: 2rem;
-        color: white;
-        text-align: center;
-    }
-    
-    .hero-button {
-        background-color: white;
-    color: #1E90FF;
-        padding: 0.75rem 1.5rem;
-        border-radius: 5px;
-        font-weight: 500;
-        text-decoration: none;
-        transition: all 0.3s ease;
-    }
-    
-    .hero-button:hover {
-        background-color: #0056b3;
-        transform: translateY(-3px);
-        box-shadow: 0 10px 20px rgba(0,0,0,0.1);
-    }
-    
-    /* Stats cards */
-    .stats-container {
-        display: flex;
-        flex-wrap: wrap;
-        gap: 1rem;
-        margin-bottom: 2rem;
-    }
-    
-    .stat-card {
-        background-color: white;
-        border-radius: 10px;
-        padding: 1.5rem;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-        flex: 1;
-        min-width: 200px;
-        text-align: center;
-        transition: transform 0.3s ease, box-shadow 0.3s ease;
-    }
-    
-    .stat-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 10px 20px rgba(0,0,0,0.1);
-    }
-    
-    .stat-value {
-        font-size: 2.5rem;
-        font-weight: 700;
-        color: #1E90FF;
-        margin-bottom: 0.5rem;
-    }
-    
-    .stat-label {
-        color: #6c757d;
-        font-weight: 500;
-        text-align: center;
-    }
-    
-    /* Section styling */
-    .section-title {
-        font-size: 2rem;
-        font-weight: 600;
-        margin-bottom: 1rem;
-        color: #1E90FF;
-        text-align: center;
-    }
-    
-    .section-subtitle {
-        font-size: 1.1rem;
-        color: #757575;
-        margin-bottom: 2rem;
-        text-align: center;
-        max-width: 800px;
-        margin-left: auto;
-        margin-right: auto;
-        display: block;
-    }
-    
-    /* Improved subtitle styling for vertical centering */
-    .map-subtitle-container {
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        min-height: 60px; /* Ensures enough vertical space */
-    }
-    
-    .map-subtitle {
-        font-size: 1.1rem;
-        color: #757575;
-        text-align: center;
-        max-width: 800px;
-        margin: 0 auto;
-    }
-    
-    /* Card styling */
-    .content-card {
-        background-color: white;
-        border-radius: 10px;
-        padding: 1.5rem;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-        margin-bottom: 2rem;
-        transition: transform 0.3s ease, box-shadow 0.3s ease;
-    }
-    
-    .content-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 10px 20px rgba(0,0,0,0.1);
-    }
-    
-    /* Progress bars */
-    .progress-container {
-        margin-bottom: 1.5rem;
-    }
-    
-    .progress-label {
-        display: flex;
-        justify-content: space-between;
-        margin-bottom: 0.5rem;
-    }
-    
-    .progress-name {
-        font-weight: 500;
-        color: #1f2937; /* Ensuring skill names are dark and visible */
-    }
-    
-    .progress-value {
-        font-weight: 600;
-        color: #1E90FF;
-    }
-    
-    .progress-bar-bg {
-        height: 10px;
-        background-color: #f0f0f0;
-        border-radius: 5px;
-        overflow: hidden;
-    }
-    
-    .progress-bar-fill {
-        height: 100%;
-        border-radius: 5px;
-        transition: width 0.5s ease-in-out;
-    }
-    
-    .progress-pm25 {
-        width: 65%;
-        background-color: #1E90FF;
-    }
-    
-    .progress-24h {
-        width: 48%;
-        background-color: #1E90FF;
-    }
-    
-    .progress-weekly {
-        width: 37%;
-        background-color: #1E90FF;
-    }
-    
-    /* Skills progress bars */
-    .progress-python {
-        width: 90%;
-        background-color: #1E90FF;
-    }
-    
-    .progress-dataviz {
-        width: 85%;
-        background-color: #1E90FF;
-    }
-    
-    .progress-api {
-        width: 80%;
-        background-color: #1E90FF;
-    }
-    
-    .progress-sql {
-        width: 75%;
-        background-color: #1E90FF;
-    }
-    
-    .progress-webdev {
-        width: 70%;
-        background-color: #1E90FF;
-    }
-    
-    /* Timeline */
-    .timeline-container {
-        position: relative;
-        max-width: 1200px;
-        margin: 0 auto;
-        padding: 2rem 0;
-    }
-    
-    .timeline-item {
-        padding: 1.5rem;
-        background-color: white;
-        border-radius: 10px;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-        margin-bottom: 2rem;
-        position: relative;
-        transition: transform 0.3s ease, box-shadow 0.3s ease;
-    }
-    
-    .timeline-item:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 10px 20px rgba(0,0,0,0.1);
-    }
-    
-    .timeline-year {
-        font-weight: 600;
-        font-size: 1.2rem;
-        margin-bottom: 0.5rem;
-        color: #1E90FF;
-    }
-    
-    /* Footer */
-    .footer {
-        background-color: #f5f5f5;
-        padding: 3rem 0;
-        margin-top: 3rem;
-        text-align: center;
-    }
-    
-    .footer-text {
-        color: #757575;
-        text-align: center;
-    }
-    
-    /* Utility classes */
-    .text-blue {
-        color: #1E90FF;
-    }
-    
-    .text-center {
-        text-align: center;
-    }
-    
-    .mb-4 {
-        margin-bottom: 1.5rem;
-    }
-    
-    /* AQI categories */
-    .aqi-category {
-        color: #1E90FF;
-        font-weight: 500;
-    }
-    
-    /* City names and rankings */
-    .city-name, .city-value {
-        color: #1E90FF;
-    }
-    
-    /* Hide Streamlit elements */
-    #MainMenu, footer, header {
-        visibility: hidden;
-    }
-    
-    div[data-testid="stToolbar"] {
-        visibility: hidden;
-    }
-    
-    /* Animations */
-    @keyframes fadeInUp {
-        from {
-            opacity: 0;
-            transform: translateY(20px);
-        }
-        to {
-            opacity: 1;
-            transform: translateY(0);
-        }
-    }
-    
-    @keyframes fadeIn {
-        from {
-            opacity: 0;
-        }
-        to {
-            opacity: 1;
-        }
-    }
-    
-    .animate-fadeInUp {
-        animation: fadeInUp 1s ease-out;
-    }
-    
-    .animate-fadeIn {
-        animation: fadeIn 1s ease-out;
-    }
-    
-    /* Responsive adjustments */
-    @media (max-width: 768px) {
-        .hero-title {
-            font-size: 2.5rem;
-        }
-        
-        .hero-subtitle {
-            font-size: 1rem;
-        }
-        
-        .stats-container {
-            flex-direction: column;
-        }
-        
-        .nav-links {
-            gap: 0.5rem;
-        }
-        
-        .nav-link {
-            padding: 0.25rem 0.5rem;
-            font-size: 0.9rem;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for styling - Streamlit-compatible approach
+st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 # Header with navigation
-st.markdown("""
-<div class="header-container">
-    <div class="logo-container">
-        <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="#1E90FF" width="32" height="32">
-            <path d="M12 2a1 1 0 0 1 1 1c0 .24-.103.446-.271.623A4.126 4.126 0 0 0 11 7.5V9h1c3.866 0 7 3.134 7 7v5a1 1 0 0 1-1 1h-4a1 1 0 0 1-1-1v-5a2 2 0 0 0-2-2h-2a2 2 0 0 0-2 2v5a1 1 0 0 1-1 1H2a1 1 0 0 1-1-1v-5c0-3.866 3.134-7 7-7h1V7.5a4.126 4.126 0 0 0-1.729-3.377A1.003 1.003 0 0 1 7 3a1 1 0 0 1 1-1h4z"/>
-        </svg>
-        <span class="logo-text">Colorado Air & Asthma Tracker</span>
-    </div>
-    <div class="nav-links">
-        <a href="#" class="nav-link nav-home">Home</a>
-        <a href="#about" class="nav-link nav-about">About</a>
-        <a href="#data" class="nav-link nav-data">Data</a>
-        <a href="#resources" class="nav-link nav-resources">Resources</a>
-        <div class="toggle-container">
-            <div class="toggle-box">
-                <input type="checkbox" id="toggle-checkbox" class="toggle-checkbox">
-                <label for="toggle-checkbox" class="toggle-label"></label>
-            </div>
-        </div>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 # Hero section
-st.markdown("""
-<div class="hero-container">
-    <h1 class="hero-title">Colorado Air & Asthma Tracker</h1>
-    <p class="hero-subtitle">Explore real-time air quality across Colorado and understand its impact on asthma rates. Make informed decisions for your respiratory health.</p>
-    <a href="#data" class="hero-button">Explore Data</a>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(HERO_HTML, unsafe_allow_html=True)
 
 # Stats section
-st.markdown("""
-<div class="stats-container">
-    <div class="stat-card">
-        <div class="stat-value">471</div>
-        <div class="stat-label">Monitoring Stations</div>
-    </div>
-    <div class="stat-card">
-        <div class="stat-value">8.7%</div>
-        <div class="stat-label">Avg. Asthma Rate</div>
-    </div>
-    <div class="stat-card">
-        <div class="stat-value">24/7</div>
-        <div class="stat-label">Real-time Updates</div>
-    </div>
-    <div class="stat-card">
-        <div class="stat-value">PM2.5</div>
-        <div class="stat-label">Primary Pollutant</div>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(STATS_HTML, unsafe_allow_html=True)
 
-# Map section
-st.markdown('<div id="data"></div>', unsafe_allow_html=True)
-st.markdown('<h2 class="section-title">Colorado Air Quality Map</h2>', unsafe_allow_html=True)
-st.markdown('<div class="map-subtitle-container"><p class="map-subtitle">Interactive map showing air quality levels across Colorado. Larger circles indicate higher pollution levels. Color indicates AQI category.</p></div>', unsafe_allow_html=True)
+# Map and rankings only change when the data refreshes, so they live in their
+# own fragments; the ZIP selector below reruns just the detail sections.
+def data_version():
+    # Changes once per refresh period, so the map data and its index refresh together
+    return int(time.time() // DATA_REFRESH_SECONDS)
 
-# Map visualization
-map_data = get_map_data()
-create_aqi_map(map_data)
+@track_cache("map_data")
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_map_data(version):
+    mark_cache_miss()
+    return get_map_data()
 
-# Rankings section
-st.markdown('<h2 class="section-title">Air Quality Rankings</h2>', unsafe_allow_html=True)
-st.markdown('<div class="map-subtitle-container"><p class="map-subtitle">Comparison of the most polluted and cleanest cities in Colorado based on current air quality data.</p></div>', unsafe_allow_html=True)
+# The station map also shows low-cost sensors (sensors.py); rankings, ZIP
+# areas and smoke detection stay on the monitors, which are keyed by ZIP
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_station_points(version):
+    return merge_map_data(load_map_data(version), load_sensor_points())
 
-# Rankings visualization
-show_aqi_rankings(map_data)
+@st.cache_resource(max_entries=2 * (len(POLLUTANTS) + 1), show_spinner=False)
+def load_map_index(version, pollutant):
+    return SpatialIndex(select_map_pollutant(load_station_points(version), pollutant))
 
-# ZIP and pollutant selection
-st.markdown('<h2 class="section-title">Location & Pollutant Selection</h2>', unsafe_allow_html=True)
-st.markdown('<p class="section-subtitle">Select a specific ZIP code to view detailed air quality data.</p>', unsafe_allow_html=True)
+# Events come from the detector ingest.py feeds, shared by every process.
+# Without ingested data, a per-process detector follows the map refreshes.
+@st.cache_resource(show_spinner=False)
+def smoke_detector():
+    return SmokeDetector()
 
-col1, col2 = st.columns([1, 1])
-with col1:
-    zip_code = st.selectbox("Choose a ZIP Code", COLORADO_ZIPS)
-with col2:
-    # Only show PM2.5 as per user request
-    pollutant = "PM2.5"
-    st.info("Currently focusing on PM2.5 data only")
+@st.cache_resource(max_entries=2, show_spinner=False)
+def map_smoke_events(version):
+    _, events = smoke_detector().update_map_data(load_map_data(version), version * DATA_REFRESH_SECONDS)
+    return events
 
-# Data fetch
-air_data = get_air_quality_data(zip_code, pollutant)
-asthma_data = get_asthma_data(zip_code)
+@st.cache_data(ttl=DATA_REFRESH_SECONDS, max_entries=2, show_spinner=False)
+def load_stored_events(mtime):
+    return stored_events()
 
-# Pollution trend section with progress bars
-st.markdown('<h2 class="section-title">Pollution Trend Analysis</h2>', unsafe_allow_html=True)
-st.markdown('<p class="section-subtitle">Recent air quality levels for the selected ZIP and pollutant. Interactive and zoomable chart.</p>', unsafe_allow_html=True)
+def smoke_events(version):
+    mtime = smoke_state_mtime()
+    if mtime is None:
+        return map_smoke_events(version)
+    return load_stored_events(mtime)
 
-# Add progress bars for pollution levels - Fixed the display issue
-st.markdown("""
-<div class="content-card">
-    <div class="progress-container">
-        <div class="progress-label">
-            <span class="progress-name">Current PM2.5 Level</span>
-            <span class="progress-value">65%</span>
-        </div>
-        <div class="progress-bar-bg">
-            <div class="progress-bar-fill progress-pm25"></div>
-        </div>
-    </div>
-    
-    <div class="progress-container">
-        <div class="progress-label">
-            <span class="progress-name">24-Hour Average</span>
-            <span class="progress-value">48%</span>
-        </div>
-        <div class="progress-bar-bg">
-            <div class="progress-bar-fill progress-24h"></div>
+def smoke_zips(events):
+    return {zip_code for event in events for zip_code in event["zips"]}
+
+# All pollutants for a ZIP come back in one fetch; picking one is a column selection
+@track_cache("observations")
+@st.cache_data(ttl=DATA_REFRESH_SECONDS, show_spinner=False)
+def load_live_observations(zip_code):
+    mark_cache_miss()
+    return get_live_observations(zip_code)
+
+# Forecasts are built by forecast.py on each hourly ingest; the app only reads them
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_forecast_file(mtime):
+    return load_forecasts()
+
+def export_bytes(zip_code, pollutant, start, end, fmt):
+    # Runs only when the download button is clicked. The browser download goes
+    # through memory, so multi-GB exports belong in `python export.py` instead.
+    # Connecting would create an empty store, so a missing one exports nothing.
+    if not os.path.exists(STORE_PATH):
+        return b""
+    buffer = io.BytesIO()
+    export(buffer, fmt, [zip_code], pollutant, start, end)
+    return buffer.getvalue()
+
+# One store query and one concurrent live fetch for the whole selection
+@track_cache("comparison")
+@st.cache_data(ttl=DATA_REFRESH_SECONDS, max_entries=32, show_spinner=False)
+def load_comparison(zip_codes, pollutant, hours, version):
+    mark_cache_miss()
+    return comparison_frame(list(zip_codes), pollutant, hours)
+
+def load_observations(zip_code):
+    # Failures raise, and st.cache_data doesn't cache exceptions, so a fallback
+    # is never cached and the next rerun goes back through the circuit breaker
+    try:
+        return load_live_observations(zip_code)
+    except UpstreamUnavailable as e:
+        print("Error fetching air quality data:", e)
+        return stale_observations(zip_code)
+
+@st.fragment(run_every=DATA_REFRESH_SECONDS)
+def map_section():
+    version = data_version()
+    map_data = load_map_data(version)
+    events = smoke_events(version)
+
+    # Map section
+    st.markdown('<div id="data"></div>', unsafe_allow_html=True)
+    st.markdown('<h2 class="section-title">Colorado Air Quality Map</h2>', unsafe_allow_html=True)
+    st.markdown('<div class="map-subtitle-container"><p class="map-subtitle">Interactive map showing air quality levels across Colorado. Larger circles indicate higher pollution levels. Color indicates AQI category.</p></div>', unsafe_allow_html=True)
+
+    cities = {record["zip"]: record["city"] for record in map_data}
+    for event in events:
+        st.warning(
+            f"Possible wildfire smoke: sudden PM2.5 rise at {event['stations']} stations around "
+            f"{cities.get(event['peak_zip'], event['peak_zip'])}, AQI up to {event['current_peak']:.0f}."
+        )
+
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+    with col1:
+        map_view = st.radio("Map view", ["Stations", "ZIP areas"], horizontal=True)
+    with col2:
+        color_by = st.selectbox("Color by", ["Overall AQI"] + POLLUTANTS)
+    with col3:
+        cities = {record["city"]: record for record in map_data}
+        focus = st.selectbox("Focus", ["All of Colorado"] + sorted(cities))
+    with col4:
+        zoom = st.select_slider("Zoom", options=list(range(6, 13)), value=6 if focus == "All of Colorado" else 9)
+
+    map_pollutant = None if color_by == "Overall AQI" else color_by
+
+    if focus == "All of Colorado":
+        view = (*MAP_CENTER, zoom)
+    else:
+        view = (cities[focus]["lat"], cities[focus]["lon"], zoom)
+
+    # Map visualization
+    with section_timer("map"):
+        if map_view == "ZIP areas":
+            create_aqi_choropleth(select_map_pollutant(map_data, map_pollutant), view)
+        elif MAP_TILES and tile_server_ready():
+            # Tiles for this hour are rendered once and served by tiles.py
+            tile_key = f"{version}-{color_by.replace(' ', '')}"
+            publish(tile_key, select_map_pollutant(load_station_points(version), map_pollutant))
+            create_aqi_tile_map(tile_key, view)
+        else:
+            # Every monitor is sent; with many sensors, only those around the view are
+            create_aqi_map(load_map_index(version, map_pollutant).query_view(*view), view, events)
+
+@st.fragment(run_every=DATA_REFRESH_SECONDS)
+def rankings_section():
+    version = data_version()
+    map_data = load_map_data(version)
+
+    # Rankings section
+    st.markdown('<h2 class="section-title">Air Quality Rankings</h2>', unsafe_allow_html=True)
+    st.markdown('<div class="map-subtitle-container"><p class="map-subtitle">Comparison of the most polluted and cleanest cities in Colorado based on current air quality data.</p></div>', unsafe_allow_html=True)
+
+    # Rankings visualization
+    with section_timer("rankings"):
+        show_aqi_rankings(map_data, smoke_zips(smoke_events(version)))
+
+@st.fragment
+def zip_detail_sections():
+    # ZIP and pollutant selection
+    st.markdown('<h2 class="section-title">Location & Pollutant Selection</h2>', unsafe_allow_html=True)
+    st.markdown('<p class="section-subtitle">Select a specific ZIP code to view detailed air quality data.</p>', unsafe_allow_html=True)
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        zip_code = st.selectbox(
+            "Choose a ZIP Code",
+            zip_codes(),
+            key="zip_code",
+            index=zip_codes().index("80202"),
+            format_func=lambda z: f"{z} - {lookup(z)['city']}",
+        )
+    with col2:
+        pollutant = st.selectbox("Choose a Pollutant", POLLUTANTS)
+
+    # Both fetches run at once off the script thread; each chart below is drawn
+    # as soon as its own data arrives
+    observations_future = submit_call(load_observations, zip_code)
+    asthma_future = submit_call(get_asthma_data, zip_code)
+
+    # Pollution trend section with progress bars
+    st.markdown('<h2 class="section-title">Pollution Trend Analysis</h2>', unsafe_allow_html=True)
+    st.markdown('<p class="section-subtitle">Recent air quality levels for the selected ZIP and pollutant. Interactive and zoomable chart.</p>', unsafe_allow_html=True)
+
+    # Add progress bars for pollution levels - Fixed the display issue
+    st.markdown(f"""
+    <div class="content-card">
+        <div class="progress-container">
+            <div class="progress-label">
+                <span class="progress-name">Current {pollutant} Level</span>
+                <span class="progress-value">65%</span>
+            </div>
+            <div class="progress-bar-bg">
+                <div class="progress-bar-fill progress-pm25"></div>
+            </div>
         </div>
-    </div>
-    
-    <div class="progress-container">
-        <div class="progress-label">
-            <span class="progress-name">Weekly Average</span>
-            <span class="progress-value">37%</span>
+        
+        <div class="progress-container">
+            <div class="progress-label">
+                <span class="progress-name">24-Hour Average</span>
+                <span class="progress-value">48%</span>
+            </div>
+            <div class="progress-bar-bg">
+                <div class="progress-bar-fill progress-24h"></div>
+            </div>
         </div>
-        <div class="progress-bar-bg">
-            <div class="progress-bar-fill progress-weekly"></div>
+        
+        <div class="progress-container">
+            <div class="progress-label">
+                <span class="progress-name">Weekly Average</span>
+                <span class="progress-value">37%</span>
+            </div>
+            <div class="progress-bar-bg">
+                <div class="progress-bar-fill progress-weekly"></div>
+            </div>
         </div>
     </div>
-</div>
-""", unsafe_allow_html=True)
+    """, unsafe_allow_html=True)
+
+    trend_slot = st.empty()
+
+    # Asthma correlation section
+    st.markdown('<h2 class="section-title">Asthma and Pollution Correlation</h2>', unsafe_allow_html=True)
+    st.markdown('<p class="section-subtitle">This chart compares recent pollution trends with local asthma rates, showing potential health impacts.</p>', unsafe_allow_html=True)
 
-plot_pollution_trend(air_data, pollutant)
+    asthma_slot = st.empty()
+    trend_slot.caption("Loading air quality data...")
+    asthma_slot.caption("Loading asthma data...")
 
-# Asthma correlation section
-st.markdown('<h2 class="section-title">Asthma and Pollution Correlation</h2>', unsafe_allow_html=True)
-st.markdown('<p class="section-subtitle">This chart compares recent pollution trends with local asthma rates, showing potential health impacts.</p>', unsafe_allow_html=True)
+    with section_timer("zip_fetch"):
+        observations = observations_future.result()
+        air_data = select_pollutant(observations, pollutant)
+    with section_timer("trend"), trend_slot.container():
+        if observations.attrs.get("stale"):
+            as_of = observations.attrs.get("as_of")
+            if as_of is not None:
+                st.warning(f"AirNow is unavailable, showing the last good data as of {as_of.astimezone():%b %d, %H:%M}.")
+            else:
+                st.warning("AirNow is unavailable and there is no earlier data for this ZIP yet.")
+        forecast = None
+        if pollutant == "PM2.5":
+            forecast = forecast_for(load_forecast_file(forecast_mtime()), zip_code)
+        plot_pollution_trend(air_data, pollutant, forecast)
 
-plot_asthma_vs_pollution(air_data, asthma_data)
+    asthma_data = asthma_future.result()
+    with section_timer("asthma"), asthma_slot.container():
+        plot_asthma_vs_pollution(air_data, asthma_data, pollutant)
+
+    with st.expander("Download stored observations"):
+        today = datetime.date.today()
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            dates = st.date_input("Date range (UTC)", (today - datetime.timedelta(days=7), today), max_value=today)
+        with col2:
+            fmt = st.radio("Format", ["csv", "parquet"], horizontal=True)
+        if not os.path.exists(STORE_PATH):
+            st.caption("No stored observations yet; `python ingest.py` fills the store.")
+        elif len(dates) == 2:
+            start, end = dates
+            st.download_button(
+                f"Download {pollutant} for {zip_code}",
+                data=lambda: export_bytes(zip_code, pollutant, start, end, fmt),
+                file_name=f"aq_{zip_code}_{POLLUTANT_COLUMNS[pollutant]}_{start}_{end}.{fmt}",
+                mime="text/csv" if fmt == "csv" else "application/vnd.apache.parquet",
+                on_click="ignore",
+            )
+
+@st.fragment
+def comparison_section():
+    st.markdown('<h2 class="section-title">Compare ZIP Codes</h2>', unsafe_allow_html=True)
+    st.markdown(f'<p class="section-subtitle">Recent trends for up to {MAX_ZIPS} ZIP codes on one time axis.</p>', unsafe_allow_html=True)
+
+    selected = st.multiselect(
+        "ZIP codes to compare",
+        zip_codes(),
+        default=["80202", "80301", "80903"],
+        max_selections=MAX_ZIPS,
+        format_func=lambda z: f"{z} - {lookup(z)['city']}",
+    )
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        pollutant = st.selectbox("Pollutant", POLLUTANTS, key="compare_pollutant")
+    with col2:
+        hours = st.selectbox("Period", COMPARE_HOURS, index=1, format_func=lambda h: f"Last {h} hours")
+    with col3:
+        layout = st.radio("Layout", ["Overlay", "Small multiples"], horizontal=True)
+    if not selected:
+        st.info("Pick one or more ZIP codes to compare.")
+        return
+
+    with section_timer("comparison"):
+        frame = load_comparison(tuple(selected), pollutant, hours, data_version())
+        labels = {z: f"{z} - {lookup(z)['city']}" for z in frame.columns}
+        plot_comparison(frame, pollutant, labels, small_multiples=layout == "Small multiples")
+
+# Start the map and ZIP fetches together; the sections read the same cache
+# entries and only wait for whatever is still in flight
+submit_call(load_map_data, data_version())
+submit_call(load_observations, st.session_state.get("zip_code", "80202"))
+
+map_section()
+rankings_section()
+zip_detail_sections()
+comparison_section()
 
 # Historical data timeline
 st.markdown('<h2 class="section-title">Historical Air Quality Timeline</h2>', unsafe_allow_html=True)
@@ -824,6 +500,12 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Hidden admin panel, opened with ?admin=metrics
+if st.query_params.get("admin") == "metrics":
+    with st.expander("Performance metrics", expanded=True):
+        st.json(timing_summary())
+        st.code(render_prometheus(), language="text")
+
 # Add JavaScript for theme toggle and animations
 st.markdown("""
 <script>
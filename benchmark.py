@@ -0,0 +1,196 @@
+# benchmark.py
+#
+# Offline benchmarks for the data and rendering pipeline. Everything runs
+# against synthetic fixtures shaped like get_map_data() and the local mock
+# AirNow server, so no API key or network access is needed.
+#
+#   python benchmark.py                    # run all cases and print a table
+#   python benchmark.py -k classify        # only cases whose name contains "classify"
+#   python benchmark.py --save-baseline    # store medians in data/benchmark_baseline.json
+#   python benchmark.py --compare          # exit 1 if a case regressed past --tolerance
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+from config import BENCH_BASELINE_PATH
+from mock_airnow import start_mock_server
+
+BENCHMARKS = []
+
+def benchmark(name, repeat=5):
+    # Registered functions do their setup and return the callable to time
+    def decorator(func):
+        BENCHMARKS.append((name, func, repeat))
+        return func
+    return decorator
+
+def make_map_data(n, seed=0):
+    from data_loader import get_map_data
+
+    rng = random.Random(seed)
+    template = get_map_data()
+    records = []
+    for i in range(n):
+        base = template[i % len(template)]
+        record = dict(base)
+        record["zip"] = f"{80000 + i % 20000:05d}"
+        record["lat"] = base["lat"] + rng.uniform(-0.5, 0.5)
+        record["lon"] = base["lon"] + rng.uniform(-0.5, 0.5)
+        record["AQI"] = rng.randint(0, 500)
+        records.append(record)
+    return records
+
+def make_trend_frame(n, seed=0):
+    import pandas as pd
+
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "Date": pd.date_range("2024-01-01", periods=n, freq="h"),
+        "Value": [rng.randint(0, 300) for _ in range(n)],
+    })
+
+@benchmark("fetch/mock_airnow x20")
+def bench_fetch():
+    import data_loader
+    from ratelimit import TokenBucket
+
+    server = start_mock_server()
+    data_loader.AIRNOW_BASE_URL = server.base_url
+    # The mock has no quota, so measure fetches without client-side throttling
+    data_loader.airnow_quota = TokenBucket("mock", capacity=1e9, refill_per_second=1e9)
+
+    def run():
+        for _ in range(20):
+            data_loader.get_air_quality_data("80202", "PM2.5")
+    return run
+
+for size in (1_000, 100_000, 1_000_000):
+    @benchmark(f"classify/scalar/{size}", repeat=3)
+    def bench_classify_scalar(size=size):
+        from visualizations import get_aqi_color_rgb
+
+        values = [record["AQI"] for record in make_map_data(size)]
+        return lambda: [get_aqi_color_rgb(value) for value in values]
+
+    @benchmark(f"classify/vectorized/{size}", repeat=3)
+    def bench_classify_vectorized(size=size):
+        import numpy as np
+        from visualizations import get_aqi_colors_rgb
+
+        values = np.array([record["AQI"] for record in make_map_data(size)])
+        return lambda: get_aqi_colors_rgb(values)
+
+for size in (30, 1_000, 100_000):
+    @benchmark(f"map_frame/{size}")
+    def bench_map_frame(size=size):
+        from visualizations import prepare_map_frame
+
+        data = make_map_data(size)
+        return lambda: prepare_map_frame(data)
+
+for size in (30, 1_000, 100_000):
+    @benchmark(f"rankings_html/{size}")
+    def bench_rankings_html(size=size):
+        import pandas as pd
+        from visualizations import build_ranking_html, get_flag_image
+
+        df = pd.DataFrame(make_map_data(size))
+        flag_img = get_flag_image()
+
+        def run():
+            build_ranking_html(df.nlargest(10, "AQI"), "Most polluted", "", flag_img)
+            build_ranking_html(df.nsmallest(10, "AQI"), "Cleanest", "", flag_img)
+        return run
+
+for size in (100, 1_000, 10_000, 100_000):
+    @benchmark(f"figure_json/{size}", repeat=3)
+    def bench_figure_json(size=size):
+        from visualizations import build_trend_figure
+
+        frame = make_trend_frame(size)
+        return lambda: build_trend_figure(frame, "PM2.5").to_json()
+
+def make_history_matrix(zips, hours=14 * 24, seed=0):
+    # Diurnal PM2.5 with AR(1) noise and ~10% gaps, shaped like forecast.load_history()
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 4, (zips, hours))
+    for t in range(1, hours):
+        noise[:, t] += 0.8 * noise[:, t - 1]
+    matrix = 30 + 15 * np.sin(2 * np.pi * np.arange(hours) / 24) + noise
+    matrix[rng.random((zips, hours)) < 0.1] = np.nan
+    return matrix
+
+for size in (30, 1_000, 10_000):
+    @benchmark(f"forecast/fit/{size}", repeat=3)
+    def bench_forecast_fit(size=size):
+        from forecast import fit_all
+
+        matrix = make_history_matrix(size)
+        return lambda: fit_all(matrix, 0)
+
+def run_benchmarks(keyword=None):
+    results = {}
+    for name, setup, repeat in BENCHMARKS:
+        if keyword and keyword not in name:
+            continue
+        func = setup()
+        func()  # warm-up
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        results[name] = {"median_s": statistics.median(samples), "min_s": min(samples)}
+        print(f"{name:<32} median {results[name]['median_s'] * 1000:>10.2f} ms"
+              f"   min {results[name]['min_s'] * 1000:>10.2f} ms")
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_s"] / baseline[name]["median_s"]
+        marker = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:<32} {ratio:>6.2f}x baseline {marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data and rendering pipeline")
+    parser.add_argument("-k", dest="keyword", default=None)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--baseline", default=BENCH_BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a case counts as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.keyword)
+
+    if args.save_baseline:
+        baseline = {}
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            pass
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved {len(results)} results to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
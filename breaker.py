@@ -0,0 +1,73 @@
+# breaker.py
+#
+# Circuit breaker for upstream APIs. After `failure_threshold` consecutive
+# failures the circuit opens and calls are rejected without touching the
+# network for `cooldown` seconds; then a single probe is let through
+# (half-open). A successful probe closes the circuit, a failed one re-opens it.
+import threading
+import time
+
+from metrics import inc, set_gauge
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, cooldown=60.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        set_gauge("aq_circuit_state", {"upstream": name}, STATE_VALUES[CLOSED])
+
+    def _set_state(self, state):
+        self.state = state
+        set_gauge("aq_circuit_state", {"upstream": self.name}, STATE_VALUES[state])
+
+    def allow(self):
+        with self.lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.cooldown:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            # Half-open lets exactly one probe through at a time
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+        inc("aq_circuit_rejections_total", {"upstream": self.name})
+        return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probing = False
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                self._set_state(OPEN)
+
+    def release(self):
+        # The call ended without an answer either way (e.g. it was cancelled),
+        # so free the half-open slot for the next probe
+        with self.lock:
+            self.probing = False
+
+    def retry_in(self):
+        # Seconds until the next probe is allowed (0 unless open)
+        with self.lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (self.clock() - self.opened_at))
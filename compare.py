@@ -0,0 +1,102 @@
+# compare.py
+#
+# Side-by-side trends for up to MAX_ZIPS ZIP codes. History for all of them
+# comes from the local store in one query (forecast.load_history); ZIPs the
+# store has nothing for fall back to live AirNow observations, fetched
+# concurrently. Both are resampled onto one shared hourly axis, so the chart is
+# drawn from a single time x ZIP table instead of one fetch and figure per ZIP.
+#
+#   python compare.py 80202 80301 81301 --hours 72     # print the table
+import os
+import sys
+
+from config import POLLUTANTS, STORE_PATH
+
+MAX_ZIPS = 20
+COMPARE_HOURS = (24, 72, 168)
+TIMEZONE = "America/Denver"
+
+def store_frame(locations, pollutant, hours, store_path=STORE_PATH):
+    # Hourly UTC index x ZIP columns, only ZIPs with any stored readings
+    import pandas as pd
+    import store
+    from forecast import load_history
+
+    if not os.path.exists(store_path):
+        return None
+    conn = store.connect(store_path)
+    try:
+        history = load_history(conn, locations, pollutant, hours)
+    finally:
+        conn.close()
+    if history is None:
+        return None
+    zips, matrix, start = history
+    frame = pd.DataFrame(matrix.T, index=pd.date_range(start, periods=hours, freq="h"), columns=zips)
+    return frame.loc[:, frame.notna().any()]
+
+def live_frame(zip_codes, pollutant):
+    # Same shape from live observations: one concurrent fetch for all ZIPs,
+    # then a single pivot onto the hourly axis
+    import pandas as pd
+    from data_loader import get_many_observations
+
+    parts = [
+        observations[["Date", "Hour", pollutant]].assign(zip=zip_code)
+        for zip_code, observations in get_many_observations(zip_codes).items()
+        if not observations.empty
+    ]
+    if not parts:
+        return None
+    readings = pd.concat(parts, ignore_index=True).dropna(subset=[pollutant, "Hour"])
+    if readings.empty:
+        return None
+    # AirNow reports local time; the DST gap and overlap hours are dropped
+    local = pd.to_datetime(readings["Date"]) + pd.to_timedelta(readings["Hour"].astype(int), unit="h")
+    readings["Time"] = local.dt.tz_localize(TIMEZONE, ambiguous="NaT", nonexistent="NaT").dt.tz_convert("UTC")
+    return readings.dropna(subset=["Time"]).pivot_table(
+        index="Time", columns="zip", values=pollutant, aggfunc="max"
+    ).astype(float)
+
+def comparison_frame(zip_codes, pollutant="PM2.5", hours=72, store_path=STORE_PATH):
+    # Local-time hourly index, one column per requested ZIP that has data (in
+    # the order given), NaN where a ZIP has no reading for an hour
+    import pandas as pd
+    from geodata import lookup
+
+    zip_codes = list(dict.fromkeys(zip_codes))[:MAX_ZIPS]
+    locations = [location for location in map(lookup, zip_codes) if location is not None]
+    frames = [store_frame(locations, pollutant, hours, store_path)]
+    missing = [location["zip"] for location in locations if frames[0] is None or location["zip"] not in frames[0]]
+    if missing:
+        frames.append(live_frame(missing, pollutant))
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="Time"))
+
+    # Shared axis: the last `hours` hours up to the newest reading of any ZIP
+    combined = pd.concat(frames, axis=1)
+    end = combined.index.max()
+    axis = pd.date_range(end - pd.Timedelta(hours=hours - 1), end, freq="h")
+    combined = combined.reindex(axis)[[zip_code for zip_code in zip_codes if zip_code in combined.columns]]
+    combined.index = combined.index.tz_convert(TIMEZONE).tz_localize(None)
+    combined.index.name = "Time"
+    combined.columns.name = None
+    return combined
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare recent trends for several ZIP codes")
+    parser.add_argument("zips", nargs="+")
+    parser.add_argument("--pollutant", choices=POLLUTANTS, default="PM2.5")
+    parser.add_argument("--hours", type=int, default=72)
+    parser.add_argument("--store", default=STORE_PATH)
+    args = parser.parse_args()
+    if len(args.zips) > MAX_ZIPS:
+        print(f"At most {MAX_ZIPS} ZIP codes; comparing the first {MAX_ZIPS}")
+    frame = comparison_frame(args.zips, args.pollutant, args.hours, args.store)
+    if frame.empty:
+        print("No data for these ZIP codes")
+        sys.exit(1)
+    print(frame.dropna(how="all").tail(24).to_string(float_format=lambda value: f"{value:.0f}"))
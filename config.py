@@ -1,2 +1,68 @@
-COLORADO_ZIPS = ["80202", "80301", "80521", "80903", "80014"]
-POLLUTANTS = ["PM2.5"]  # Removed Ozone as per user request
+import os
+
+POLLUTANTS = ["PM2.5", "PM10", "O3", "NO2"]
+DATA_REFRESH_SECONDS = 3600  # AirNow observations update hourly
+AIRNOW_BASE_URL = os.getenv("AIRNOW_BASE_URL", "http://www.airnowapi.org")
+# Stop calling AirNow after this many consecutive failures, then probe again
+# once the cool-down has passed
+BREAKER_FAILURES = int(os.getenv("AQ_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("AQ_BREAKER_COOLDOWN", "60"))
+# AirNow allows this many requests per hour per API key. Set AQ_QUOTA_DB to
+# share the budget between worker processes (see ratelimit.py).
+AIRNOW_HOURLY_QUOTA = int(os.getenv("AQ_AIRNOW_QUOTA", "500"))
+QUOTA_DB_PATH = os.getenv("AQ_QUOTA_DB") or None
+# How long a user-facing fetch may wait for a token before falling back
+QUOTA_WAIT_SECONDS = float(os.getenv("AQ_QUOTA_WAIT", "5"))
+# Cross-process result cache for multi-process deployments (see shared_cache.py)
+SHARED_CACHE_PATH = os.getenv("AQ_SHARED_CACHE") or None
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+GAZETTEER_PATH = os.path.join(DATA_DIR, "co_zcta_gazetteer.csv")
+GEODATA_INDEX_PATH = os.path.join(DATA_DIR, "co_zcta_index.bin")
+MAP_CENTER = (39.55, -105.78)
+# Cold-start import budget for the app modules (see profile_imports.py and
+# tests/test_imports.py); about twice today's time, so only real growth fails
+IMPORT_BUDGET_MS = float(os.getenv("AQ_IMPORT_BUDGET_MS", "1500"))
+# Medians saved by `python benchmark.py --save-baseline` (machine-specific)
+BENCH_BASELINE_PATH = os.getenv("AQ_BENCH_BASELINE", os.path.join(DATA_DIR, "benchmark_baseline.json"))
+
+# Local observation store fed by the bulk ingester (see store.py, ingest.py)
+STORE_PATH = os.getenv("AQ_STORE_PATH", os.path.join(DATA_DIR, "observations.sqlite3"))
+AIRNOW_FILES_URL = os.getenv("AIRNOW_FILES_URL", "https://files.airnowtech.org/airnow")
+COLORADO_BOUNDS = (-109.06, 36.99, -102.04, 41.0)
+# Also keep every live ZIP-code API response in the store (see polls.py)
+INGEST_POLLS = os.getenv("AQ_INGEST_POLLS") == "1"
+# PurpleAir-format low-cost sensor files (CSV or JSON) shown on the station map
+# between monitors (see sensors.py)
+SENSOR_DIR = os.getenv("AQ_SENSOR_DIR", os.path.join(DATA_DIR, "sensors"))
+# Threshold alert subscriptions (see alerts.py); fired alerts are appended to
+# AQ_ALERT_LOG as JSON lines, or printed when it is unset
+ALERTS_PATH = os.getenv("AQ_ALERTS_DB", os.path.join(DATA_DIR, "alerts.sqlite3"))
+ALERT_LOG_PATH = os.getenv("AQ_ALERT_LOG") or None
+# Smoke detector state, fed by ingest.py and read by the app (see anomalies.py)
+SMOKE_STATE_PATH = os.path.join(DATA_DIR, "smoke_state.pkl")
+# Precomputed per-ZIP PM2.5 forecasts (see forecast.py)
+FORECAST_PATH = os.path.join(DATA_DIR, "forecasts.npz")
+
+# Vector tile service for large station counts (see tiles.py)
+MAP_TILES = os.getenv("AQ_MAP_TILES") == "1"
+TILE_PORT = int(os.getenv("AQ_TILE_PORT", "8502"))
+# Local only unless set, e.g. to 0.0.0.0 behind a proxy
+TILE_HOST = os.getenv("AQ_TILE_HOST", "127.0.0.1")
+# The map layers stop requesting tiles past this zoom, so none deeper are served
+TILE_MAX_ZOOM = 12
+TILE_URL = os.getenv("AQ_TILE_URL", f"http://localhost:{TILE_PORT}")
+TILE_CACHE_DIR = os.path.join(DATA_DIR, "tiles")
+# Published tile datasets, shared by the app processes and the tile server
+TILE_DATASET_DIR = os.path.join(DATA_DIR, "tile_datasets")
+TILE_CACHE_MAX_BYTES = int(os.getenv("AQ_TILE_CACHE_MB", "256")) * 1024 * 1024
+
+# Headless JSON/Arrow API for other services (see api.py)
+API_PORT = int(os.getenv("AQ_API_PORT", "8503"))
+API_HOST = os.getenv("AQ_API_HOST", "127.0.0.1")
+
+# Prerendered landing page (see snapshot.py); visitors who want a ZIP's detail
+# follow a link to the live app
+SNAPSHOT_DIR = os.getenv("AQ_SNAPSHOT_DIR", os.path.join(DATA_DIR, "snapshot"))
+SNAPSHOT_PORT = int(os.getenv("AQ_SNAPSHOT_PORT", "8504"))
+LIVE_APP_URL = os.getenv("AQ_LIVE_APP_URL", "http://localhost:8501")
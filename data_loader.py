@@ -1,93 +1,394 @@
 # data_loader.py
-import pandas as pd
-import requests
-from datetime import datetime
-from dotenv import load_dotenv
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+import asyncio
 import os
 import random
+import threading
 
-load_dotenv()
-API_KEY = os.getenv("AIRNOW_API_KEY")
+from breaker import CircuitBreaker
+from config import (
+    AIRNOW_BASE_URL,
+    AIRNOW_HOURLY_QUOTA,
+    BREAKER_COOLDOWN_SECONDS,
+    BREAKER_FAILURES,
+    DATA_REFRESH_SECONDS,
+    INGEST_POLLS,
+    POLLUTANTS,
+    QUOTA_DB_PATH,
+    QUOTA_WAIT_SECONDS,
+    STORE_PATH
+)
+from decode import loads, entry_columns, observation_columns
+from geodata import locations, lookup
+from metrics import instrument
+from ratelimit import BACKGROUND, INTERACTIVE, RateLimited, TokenBucket
+from shared_cache import get_shared_cache
 
-def get_air_quality_data(zip_code, pollutant):
-    url = "http://www.airnowapi.org/aq/observation/zipCode/current/"
-    params = {
-        "format": "application/json",
-        "zipCode": zip_code,
-        "distance": 25,
-        "API_KEY": API_KEY
-    }
+# pandas, requests and python-dotenv are imported on first use so the page can
+# start rendering before the network and dataframe stacks are loaded.
+#
+# The fetch_* coroutines are the data API. Streamlit scripts are synchronous, so
+# they go through the facade at the bottom of this module, which runs them on
+# one shared event loop in a background thread and hands back futures.
+
+@lru_cache(maxsize=1)
+def get_api_key():
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.getenv("AIRNOW_API_KEY")
+
+# AirNow ParameterName -> observation column
+PARAMETER_COLUMNS = {"PM2.5": "PM2.5", "PM10": "PM10", "O3": "O3", "OZONE": "O3", "NO2": "NO2"}
+OBSERVATION_COLUMNS = ["Date", "Hour", "Latitude", "Longitude", "AQI", *POLLUTANTS]
+OBSERVATION_DTYPES = {
+    "Hour": "Int8",
+    "Latitude": "float32",
+    "Longitude": "float32",
+    "AQI": "Int16",
+    **{pollutant: "Int16" for pollutant in POLLUTANTS},
+}
+
+def observations_frame(rows, as_of=None, stale=False):
+    # attrs carry when the data was fetched and whether it is a fallback
+    import pandas as pd
+    frame = pd.DataFrame(rows, columns=OBSERVATION_COLUMNS).astype(OBSERVATION_DTYPES)
+    frame.attrs["as_of"] = as_of
+    frame.attrs["stale"] = stale
+    return frame
+
+class UpstreamUnavailable(Exception):
+    pass
+
+airnow_breaker = CircuitBreaker("airnow", BREAKER_FAILURES, BREAKER_COOLDOWN_SECONDS)
+
+# A quarter of the hourly quota can go out in a burst and the rest refills
+# evenly, so no rolling hour can exceed the quota. The last fifth of the burst
+# is kept for interactive fetches.
+airnow_quota = TokenBucket(
+    "airnow",
+    capacity=AIRNOW_HOURLY_QUOTA * 0.25,
+    refill_per_second=AIRNOW_HOURLY_QUOTA * 0.75 / 3600,
+    reserve=AIRNOW_HOURLY_QUOTA * 0.25 * 0.2,
+    path=QUOTA_DB_PATH,
+)
 
+# Last good observations per ZIP, served while AirNow is down
+LAST_GOOD_ZIPS = 1024
+_last_good = OrderedDict()
+_last_good_lock = threading.Lock()
+
+def _request_body(url, params):
+    # Raw bytes; each parse function decodes just what it needs (decode.py)
+    import requests
+
+    response = requests.get(url, params=params, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+def _request_parsed(url, params, parse):
+    return parse(_request_body(url, params))
+
+async def _airnow_get(path, params, parse, priority):
+    # Every AirNow call spends a quota token and goes through the breaker
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        # Filter for selected pollutant
-        filtered = [entry for entry in data if entry["ParameterName"] == pollutant]
-        if not filtered:
-            return pd.DataFrame(columns=["Date", "Value"])
-
-        entry = filtered[0]
-        return pd.DataFrame({
-            "Date": [entry["DateObserved"]],
-            "Value": [entry["AQI"]]
-        })
+        await airnow_quota.acquire(priority, timeout=QUOTA_WAIT_SECONDS if priority == INTERACTIVE else None)
+    except RateLimited as e:
+        raise UpstreamUnavailable(str(e)) from e
+    if not airnow_breaker.allow():
+        await airnow_quota.refund_async()
+        raise UpstreamUnavailable(f"AirNow circuit open, retrying in {airnow_breaker.retry_in():.0f} s")
 
+    params = {"format": "application/json", **params, "API_KEY": get_api_key()}
+    try:
+        # requests is blocking and decoding a large response is CPU work, so
+        # both run in a worker thread while the loop keeps serving other fetches
+        result = await asyncio.get_running_loop().run_in_executor(
+            _upstream_executor, _request_parsed, f"{AIRNOW_BASE_URL}{path}", params, parse
+        )
     except Exception as e:
+        airnow_breaker.record_failure()
+        raise UpstreamUnavailable(str(e)) from e
+    except BaseException:
+        # Cancelled: a half-open probe must not stay taken forever
+        airnow_breaker.release()
+        raise
+    airnow_breaker.record_success()
+    return result
+
+async def fetch_live_observations(zip_code, priority=INTERACTIVE):
+    # Raises UpstreamUnavailable instead of falling back, so callers that
+    # cache results never cache a fallback
+    observations = await _airnow_get(
+        "/aq/observation/zipCode/current/",
+        {"zipCode": zip_code, "distance": 25},
+        parse_and_record_observations if INGEST_POLLS else parse_observations,
+        priority,
+    )
+
+    with _last_good_lock:
+        _last_good[zip_code] = observations
+        _last_good.move_to_end(zip_code)
+        if len(_last_good) > LAST_GOOD_ZIPS:
+            _last_good.popitem(last=False)
+    _check_alerts(zip_code, observations)
+    return observations
+
+def _check_alerts(zip_code, observations):
+    # Hands the latest hour's overall AQI to the alert watcher, which
+    # evaluates subscriptions on its own thread
+    from alerts import alert_watcher
+
+    if observations.empty:
+        return
+    latest = observations.iloc[-1]
+    alert_watcher().add([(zip_code, int(latest["AQI"]))], f"{latest['Date']} {int(latest['Hour']):02d}:00")
+
+async def fetch_observations(zip_code):
+    try:
+        return await fetch_live_observations(zip_code)
+    except UpstreamUnavailable as e:
         print("Error fetching air quality data:", e)
-        return pd.DataFrame(columns=["Date", "Value"])
+        return stale_observations(zip_code)
 
-def get_asthma_data(zip_code):
-    return pd.DataFrame({"Zip": [zip_code], "Asthma Rate": [12.3]})
+async def fetch_many_observations(zip_codes):
+    # Concurrent fetches, so N ZIPs take about as long as the slowest one
+    return await asyncio.gather(*(fetch_observations(zip_code) for zip_code in zip_codes))
 
-def get_map_data():
-    zip_codes = [
-        ("80202", "Denver", 39.7508, -104.9965),
-        ("80301", "Boulder", 40.0395, -105.2309),
-        ("80521", "Fort Collins", 40.5853, -105.0844),
-        ("80903", "Colorado Springs", 38.8339, -104.8214),
-        ("80014", "Aurora", 39.6662, -104.8351),
-        ("80401", "Golden", 39.7555, -105.2211),
-        ("81611", "Aspen", 39.1911, -106.8175),
-        ("81657", "Vail", 39.6403, -106.3742),
-        ("80538", "Loveland", 40.4170, -105.0740),
-        ("81003", "Pueblo", 38.2544, -104.6091),
-        ("81620", "Avon", 39.6319, -106.5222),
-        ("80501", "Longmont", 40.1672, -105.1019),
-        ("81435", "Telluride", 37.9375, -107.8123),
-        ("81230", "Gunnison", 38.5458, -106.9253),
-        ("81212", "Canon City", 38.4494, -105.2253),
-        ("81416", "Delta", 38.7401, -108.0720),
-        ("81101", "Alamosa", 37.4694, -105.8700),
-        ("81052", "Lamar", 38.0871, -102.6204),
-        ("81301", "Durango", 37.2753, -107.8801),
-        ("80550", "Windsor", 40.4770, -104.9014),
-        ("81625", "Craig", 40.5153, -107.5469),
-        ("81201", "Salida", 38.5347, -105.9989),
-        ("80461", "Leadville", 39.2508, -106.2925),
-        ("81401", "Montrose", 38.4783, -107.8762),
-        ("81082", "Trinidad", 37.1695, -104.5008),
-        ("80701", "Fort Morgan", 40.2508, -103.8000),
-        ("80504", "Firestone", 40.1636, -104.9367),
-        ("81007", "Pueblo West", 38.3508, -104.7222),
-        ("80817", "Fountain", 38.6822, -104.7003),
-        ("80831", "Peyton", 38.9608, -104.6006)
-    ]
+async def fetch_historical_observations(zip_code, date, priority=BACKGROUND):
+    # One day ("YYYY-MM-DD") of observations for backfill jobs; runs at
+    # background priority so it only spends quota the dashboard isn't using
+    return await _airnow_get(
+        "/aq/observation/zipCode/historical/",
+        {"zipCode": zip_code, "date": f"{date}T00-0000", "distance": 25},
+        parse_observations,
+        priority,
+    )
+
+def stale_observations(zip_code):
+    # Last good response for this ZIP, else the nearest stations in the local
+    # store (ingest.py), else an empty frame; always marked stale
+    with _last_good_lock:
+        observations = _last_good.get(zip_code)
+    if observations is None and get_shared_cache() is not None:
+        # Another worker process may have fetched this ZIP before the outage
+        cached = get_shared_cache().get(f"observations:{zip_code}", allow_expired=True)
+        observations = cached[0] if cached else None
+    if observations is not None:
+        stale = observations.copy()
+        stale.attrs.update(observations.attrs, stale=True)
+        return stale
+
+    location = lookup(zip_code)
+    if location is not None and os.path.exists(STORE_PATH):
+        import store
+
+        conn = store.connect()
+        try:
+            rows = store.nearby_observations(conn, location["lat"], location["lon"])
+        finally:
+            conn.close()
+        if rows:
+            # The store keeps UTC hours
+            frame_rows = [
+                {"Date": observed_at[:10], "Hour": int(observed_at[11:13]),
+                 "Latitude": location["lat"], "Longitude": location["lon"],
+                 "AQI": aqi, **dict(zip(POLLUTANTS, values))}
+                for observed_at, aqi, *values in rows
+            ]
+            as_of = datetime.strptime(rows[-1][0], "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+            return observations_frame(frame_rows, as_of=as_of, stale=True)
+    return observations_frame([], stale=True)
+
+def parse_observations(raw):
+    # Keep every pollutant in the response: one wide row per observation hour
+    return parse_observation_columns(observation_columns(raw, PARAMETER_INDEX))
+
+def parse_observation_rows(data):
+    # The same frame from decoded entries, one dict at a time
+    rows = {}
+    for entry in data:
+        column = PARAMETER_COLUMNS.get(entry["ParameterName"])
+        if column is None or entry["AQI"] < 0:
+            continue
+        date = entry["DateObserved"].strip()
+        row = rows.setdefault((date, entry["HourObserved"]), {
+            "Date": date,
+            "Hour": entry["HourObserved"],
+            "Latitude": entry.get("Latitude"),
+            "Longitude": entry.get("Longitude"),
+        })
+        row[column] = entry["AQI"]
+
+    # The overall AQI is the worst of the pollutant sub-indices
+    for row in rows.values():
+        row["AQI"] = max(row[pollutant] for pollutant in POLLUTANTS if pollutant in row)
+    return observations_frame(list(rows.values()), as_of=datetime.now(timezone.utc))
+
+# Column number of each ParameterName in POLLUTANTS
+PARAMETER_INDEX = {name: POLLUTANTS.index(column) for name, column in PARAMETER_COLUMNS.items()}
 
-    # Only use PM2.5 as the pollutant as per user request
-    pollutant = "PM2.5"
+def parse_observation_columns(columns):
+    # Same frame as parse_observation_rows: rows in order of each hour's first
+    # usable entry, which also supplies the coordinates, and the last entry
+    # wins when a pollutant repeats within an hour
+    import numpy as np
+    import pandas as pd
 
+    keep = (columns["parameter"] >= 0) & (columns["aqi"] >= 0)
+    if not keep.all():
+        columns = {name: values[keep] for name, values in columns.items()}
+    if not len(columns["aqi"]):
+        return observations_frame([], as_of=datetime.now(timezone.utc))
+
+    # Dates repeat across the response, so each distinct one is stripped once
+    date_codes, raw_dates = pd.factorize(columns["date"])
+    date_codes, dates = pd.factorize(np.array([value.strip() for value in raw_dates], dtype=object)[date_codes])
+    groups, _ = pd.factorize(date_codes.astype(np.int64) << 32 | (columns["hour"].astype(np.int64) & 0xFFFFFFFF))
+    _, first = np.unique(groups, return_index=True)
+
+    slots = groups.astype(np.int64) * len(POLLUTANTS) + columns["parameter"]
+    _, last_reversed = np.unique(slots[::-1], return_index=True)
+    last = len(slots) - 1 - last_reversed
+    wide = np.full(len(first) * len(POLLUTANTS), -1, dtype=np.int32)
+    wide[slots[last]] = columns["aqi"][last]
+    wide = wide.reshape(len(first), len(POLLUTANTS))
+
+    frame = {
+        "Date": dates[date_codes[first]],
+        "Hour": columns["hour"][first],
+        "Latitude": columns["lat"][first],
+        "Longitude": columns["lon"][first],
+        # The overall AQI is the worst of the pollutant sub-indices
+        "AQI": wide.max(axis=1),
+    }
+    for i, pollutant in enumerate(POLLUTANTS):
+        frame[pollutant] = pd.arrays.IntegerArray(wide[:, i].astype(np.int16), wide[:, i] < 0)
+    return observations_frame(frame, as_of=datetime.now(timezone.utc))
+
+def parse_and_record_observations(raw):
+    # The poll writer keeps whole entries, so these are decoded in full; it
+    # dedups and stores them off the event loop
+    from polls import poll_writer
+
+    data = loads(raw)
+    poll_writer().add(data)
+    return parse_observation_columns(entry_columns(data, PARAMETER_INDEX))
+
+def select_pollutant(observations, pollutant):
+    # Switching pollutant is a column selection on the already-fetched frame
+    values = observations[["Date", pollutant]].dropna()
+    return values.rename(columns={pollutant: "Value"}).astype({"Value": "int64"}).reset_index(drop=True)
+
+async def fetch_air_quality_data(zip_code, pollutant):
+    return select_pollutant(await fetch_observations(zip_code), pollutant)
+
+async def fetch_asthma_data(zip_code):
+    import pandas as pd
+    return pd.DataFrame({"Zip": [zip_code], "Asthma Rate": [12.3]})
+
+# Mock AQI range per pollutant for the statewide map
+MOCK_AQI_RANGES = {"PM2.5": (5, 150), "PM10": (5, 80), "O3": (5, 120), "NO2": (5, 60)}
+
+async def fetch_map_data():
     mock_data = []
-    for zip_code, city, lat, lon in zip_codes:
-        aqi = random.randint(5, 150)
+    for location in locations():
+        values = {pollutant: random.randint(*MOCK_AQI_RANGES[pollutant]) for pollutant in POLLUTANTS}
+        dominant = max(values, key=values.get)
         mock_data.append({
-            "zip": zip_code,
-            "city": city,
-            "lat": lat,
-            "lon": lon,
-            "AQI": aqi,
-            "Pollutant": pollutant
+            "zip": location["zip"],
+            "city": location["city"],
+            "lat": location["lat"],
+            "lon": location["lon"],
+            "AQI": values[dominant],
+            "Pollutant": dominant,
+            **values
         })
 
     return mock_data
+
+def select_map_pollutant(map_data, pollutant):
+    # None keeps the overall AQI; otherwise recolor by one pollutant's sub-index
+    if pollutant is None:
+        return map_data
+    return [
+        {**record, "AQI": record[pollutant], "Pollutant": pollutant}
+        for record in map_data
+        if record.get(pollutant) is not None
+    ]
+
+# --- Sync facade over a shared background event loop ---
+# These block on the loop, so call them from script or worker threads, never
+# from a coroutine running on the loop itself.
+
+_loop = None
+_loop_lock = threading.Lock()
+
+# Two pools so a blocked caller can never starve the requests it waits on:
+# upstream HTTP calls run only on _upstream_executor, and submit_call's
+# blocking callables (which wait on the loop) only on _call_executor
+_upstream_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="airnow-http")
+_call_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="data-loader-call")
+
+def get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="data-loader-loop", daemon=True).start()
+        return _loop
+
+def submit(coro):
+    # Schedules a coroutine on the shared loop; returns a concurrent.futures.Future
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+def submit_call(func, *args):
+    # Runs a blocking callable (e.g. a st.cache_data loader) off the script
+    # thread; returns a concurrent.futures.Future
+    return _call_executor.submit(func, *args)
+
+def shared(key, ttl, compute):
+    # With AQ_SHARED_CACHE set, worker processes on this host share results
+    # (one upstream fetch per key and TTL); otherwise just computes
+    cache = get_shared_cache()
+    return compute() if cache is None else cache.get_or_compute(key, ttl, compute)
+
+@instrument("get_observations")
+def get_observations(zip_code):
+    return submit(fetch_observations(zip_code)).result()
+
+@instrument("get_live_observations")
+def get_live_observations(zip_code):
+    return shared(
+        f"observations:{zip_code}",
+        DATA_REFRESH_SECONDS,
+        lambda: submit(fetch_live_observations(zip_code)).result(),
+    )
+
+@instrument("get_many_observations")
+def get_many_observations(zip_codes):
+    # {zip: observations}; ZIPs whose fetch fails get their stale fallback
+    zip_codes = list(zip_codes)
+    return dict(zip(zip_codes, submit(fetch_many_observations(zip_codes)).result()))
+
+def get_historical_observations(zip_code, date):
+    return submit(fetch_historical_observations(zip_code, date)).result()
+
+def quota_remaining():
+    return airnow_quota.remaining()
+
+@instrument("get_air_quality_data")
+def get_air_quality_data(zip_code, pollutant):
+    return submit(fetch_air_quality_data(zip_code, pollutant)).result()
+
+@instrument("get_asthma_data")
+def get_asthma_data(zip_code):
+    return submit(fetch_asthma_data(zip_code)).result()
+
+@instrument("get_map_data")
+def get_map_data():
+    # Keyed by refresh period so every process shows the same hour's map
+    period = int(datetime.now(timezone.utc).timestamp() // DATA_REFRESH_SECONDS)
+    return shared(f"map_data:{period}", DATA_REFRESH_SECONDS, lambda: submit(fetch_map_data()).result())
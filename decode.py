@@ -0,0 +1,187 @@
+# decode.py
+#
+# Fast decoding of AirNow observation responses. Only the fields the dashboard
+# uses -- ParameterName, AQI, DateObserved, HourObserved, Latitude, Longitude --
+# are decoded, straight into typed numpy columns that data_loader pivots into
+# the observations frame. With msgspec installed the body is decoded against
+# that schema and every other field is skipped by the parser; without it,
+# orjson (or the json module) decodes the full entries and the columns are
+# picked out of them.
+#
+#   python decode.py bench --entries 200000     # vs response.json() + dict rows
+import gc
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def decoder_name():
+    return "msgspec" if msgspec is not None else "orjson" if orjson is not None else "json"
+
+# gc.disable() is process-wide and decoding runs on several threads at once,
+# so GC is paused while any decode is running and resumed after the last one
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+@contextmanager
+def _gc_paused():
+    global _gc_pauses, _gc_was_enabled
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+def loads(raw):
+    # raw: bytes or str. Large responses are hundreds of thousands of small
+    # dicts, and cyclic GC passes while they are built cost more than parsing.
+    with _gc_paused():
+        if orjson is not None:
+            return orjson.loads(raw)
+        return json.loads(raw)
+
+@lru_cache(maxsize=1)
+def _observation_decoder():
+    class Observation(msgspec.Struct, gc=False):
+        ParameterName: str
+        AQI: int
+        DateObserved: str
+        HourObserved: int
+        Latitude: float | None = None
+        Longitude: float | None = None
+
+    return msgspec.json.Decoder(list[Observation])
+
+def observation_columns(raw, parameter_index):
+    # raw: response body. parameter_index maps ParameterName -> column number;
+    # other parameters get -1. Returns a dict of equal-length arrays.
+    import numpy as np
+
+    if msgspec is not None:
+        try:
+            entries = _observation_decoder().decode(raw)
+        except msgspec.ValidationError:
+            # Not the shape we expect (e.g. a float AQI); decode it in full
+            return entry_columns(loads(raw), parameter_index)
+        count = len(entries)
+        return {
+            "parameter": np.fromiter((parameter_index.get(entry.ParameterName, -1) for entry in entries), np.int8, count),
+            "aqi": np.fromiter((entry.AQI for entry in entries), np.int32, count),
+            "date": np.array([entry.DateObserved for entry in entries], dtype=object),
+            "hour": np.fromiter((entry.HourObserved for entry in entries), np.int32, count),
+            "lat": np.array([entry.Latitude for entry in entries], dtype=np.float64),
+            "lon": np.array([entry.Longitude for entry in entries], dtype=np.float64),
+        }
+    return entry_columns(loads(raw), parameter_index)
+
+def entry_columns(data, parameter_index):
+    # The same columns from already-decoded entries
+    import numpy as np
+
+    count = len(data)
+    return {
+        "parameter": np.fromiter((parameter_index.get(entry["ParameterName"], -1) for entry in data), np.int8, count),
+        "aqi": np.fromiter((entry["AQI"] for entry in data), np.int32, count),
+        "date": np.array([entry["DateObserved"] for entry in data], dtype=object),
+        "hour": np.fromiter((entry["HourObserved"] for entry in data), np.int32, count),
+        "lat": np.array([entry.get("Latitude") for entry in data], dtype=np.float64),
+        "lon": np.array([entry.get("Longitude") for entry in data], dtype=np.float64),
+    }
+
+def recorded_payload(entries, seed=0):
+    # A large response built from the recorded fixture entries: many reporting
+    # areas over ten days, with pollutants the dashboard ignores mixed in
+    import random
+
+    from mock_airnow import DEFAULT_FIXTURES
+
+    with open(DEFAULT_FIXTURES, encoding="utf-8") as f:
+        template = next(iter(json.load(f).values()))[0]
+    rng = random.Random(seed)
+    parameters = ["O3", "PM2.5", "PM10", "NO2", "CO", "SO2"]
+    payload = []
+    hour_index = 0
+    while len(payload) < entries:
+        area, hour_of_area = divmod(hour_index, 240)
+        day, hour = divmod(hour_of_area, 24)
+        for parameter in parameters:
+            aqi = rng.randint(0, 200)
+            payload.append({
+                **template,
+                "DateObserved": f"2026-10-{1 + day:02d} ",
+                "HourObserved": hour,
+                "ReportingArea": f"Area {area}",
+                "Latitude": 37 + area % 40 * 0.1,
+                "Longitude": -109 + area // 40 % 70 * 0.1,
+                "ParameterName": parameter,
+                # AirNow reports -1 for a missing reading
+                "AQI": aqi if rng.random() > 0.05 else -1,
+                "Category": {"Number": 1 + aqi // 50, "Name": "Good"},
+            })
+        hour_index += 1
+    return json.dumps(payload[:entries]).encode()
+
+def bench(entries, repeat=5):
+    import pandas as pd
+
+    from data_loader import parse_observation_rows, parse_observations
+
+    raw = recorded_payload(entries)
+    # The old path: requests' response.json() is json.loads on the text
+    old = parse_observation_rows(json.loads(raw.decode()))
+    new = parse_observations(raw)
+    pd.testing.assert_frame_equal(old, new)
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    return {
+        "bytes": len(raw),
+        "rows": len(new),
+        "old": timed(lambda: parse_observation_rows(json.loads(raw.decode()))),
+        "old_decode": timed(lambda: json.loads(raw.decode())),
+        "new": timed(lambda: parse_observations(raw)),
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AirNow response decoding")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--entries", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    result = bench(args.entries, args.repeat)
+    print(f"{args.entries:,} entries, {result['bytes'] / 1024 ** 2:.1f} MiB -> {result['rows']:,} hourly rows "
+          f"(identical frames)")
+    print(f"json + dict rows:  {result['old'] * 1000:8.1f} ms  (decode alone {result['old_decode'] * 1000:.1f} ms)")
+    print(f"{decoder_name() + ' + columns:':18} {result['new'] * 1000:8.1f} ms")
+    print(f"{result['old'] / result['new']:.1f}x faster")
+    if msgspec is None:
+        print("msgspec is not installed, so full entries are decoded; "
+              "pip install msgspec to skip unused fields", file=sys.stderr)
@@ -0,0 +1,192 @@
+# export.py
+#
+# Bulk export of station observations from the local store (ingest.py) as CSV
+# or Parquet. Rows are read with a cursor in fixed-size chunks and written out
+# chunk by chunk, one Parquet row group per chunk, so memory stays flat however
+# large the export is. Filters: ZIP codes (stations near any of them), one
+# pollutant, and an inclusive date range in UTC.
+#
+#   python export.py out.csv --zips 80202 80301 --pollutant PM2.5 --from 2026-10-01 --to 2026-10-19
+#   python export.py all.parquet --rss
+import csv
+import io
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from config import STORE_PATH
+from rss import peak_rss_mb
+
+CHUNK_ROWS = 50_000
+FORMATS = ("csv", "parquet")
+# Stations within this many degrees of a ZIP centroid count as that ZIP's
+NEARBY_DEGREES = 0.35
+
+def export_columns(pollutant=None):
+    from store import OBSERVATION_FIELDS, POLLUTANT_COLUMNS
+
+    if pollutant is None:
+        return list(OBSERVATION_FIELDS)
+    return ["station", "site", "lat", "lon", "observed_at", POLLUTANT_COLUMNS[pollutant]]
+
+def export_query(zip_codes=None, pollutant=None, start=None, end=None):
+    # Returns (sql, params, columns). start/end are dates or "YYYY-MM-DD"
+    # strings; end is inclusive.
+    from geodata import lookup
+
+    columns = export_columns(pollutant)
+    where, params = [], []
+    if pollutant is not None:
+        where.append(f"{columns[-1]} IS NOT NULL")
+    if start is not None:
+        where.append("observed_at >= ?")
+        params.append(str(start))
+    if end is not None:
+        # observed_at is "YYYY-MM-DD HH:00", so compare against the next day
+        next_day = date.fromisoformat(str(end)) + timedelta(days=1)
+        where.append("observed_at < ?")
+        params.append(next_day.isoformat())
+    if zip_codes:
+        boxes = []
+        for zip_code in zip_codes:
+            location = lookup(zip_code)
+            if location is None:
+                print(f"Unknown ZIP code {zip_code}, skipped")
+                continue
+            boxes.append("(lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?)")
+            params += [location["lat"] - NEARBY_DEGREES, location["lat"] + NEARBY_DEGREES,
+                       location["lon"] - NEARBY_DEGREES, location["lon"] + NEARBY_DEGREES]
+        # Only unknown ZIPs: match nothing rather than everything
+        where.append(f"({' OR '.join(boxes)})" if boxes else "0")
+
+    sql = f"SELECT {', '.join(columns)} FROM observations"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # The observed_at index gives this order without a sort of the whole result
+    sql += " ORDER BY observed_at"
+    return sql, params, columns
+
+def query_chunks(conn, zip_codes=None, pollutant=None, start=None, end=None, chunk_rows=CHUNK_ROWS):
+    # Yields lists of row tuples, at most chunk_rows each
+    sql, params, _ = export_query(zip_codes, pollutant, start, end)
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+def iter_csv(chunks, columns):
+    # Yields UTF-8 CSV bytes, one piece per chunk; usable as an HTTP body
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def write_csv(chunks, columns, f):
+    # f: path or binary file object
+    if isinstance(f, (str, os.PathLike)):
+        with open(f, "wb") as out:
+            return write_csv(chunks, columns, out)
+    for piece in iter_csv(chunks, columns):
+        f.write(piece)
+
+def parquet_schema(columns):
+    import pyarrow as pa
+
+    types = {"station": pa.string(), "site": pa.string(), "lat": pa.float64(), "lon": pa.float64(),
+             "observed_at": pa.timestamp("s", tz="UTC")}
+    return pa.schema([(column, types.get(column, pa.int16())) for column in columns])
+
+def write_parquet(chunks, columns, f):
+    # One row group per chunk; pyarrow ships with Streamlit
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(columns)
+    time_column = columns.index("observed_at")
+    with pq.ParquetWriter(f, schema, compression="zstd") as writer:
+        for rows in chunks:
+            arrays = []
+            for i, (column, values) in enumerate(zip(columns, zip(*rows))):
+                if i == time_column:
+                    times = pc.strptime(pa.array(values, pa.string()), format="%Y-%m-%d %H:%M", unit="s")
+                    arrays.append(times.cast(schema.field(column).type))
+                else:
+                    arrays.append(pa.array(values, schema.field(column).type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+def _counted(chunks, counter):
+    for rows in chunks:
+        counter(rows)
+        yield rows
+
+def export(f, fmt="csv", zip_codes=None, pollutant=None, start=None, end=None,
+           store_path=STORE_PATH, chunk_rows=CHUNK_ROWS, report_rss=False):
+    # Writes to a path or binary file object; returns the row count
+    import store
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {FORMATS}")
+    conn = store.connect(store_path)
+    count = chunks_done = 0
+
+    def tally(rows):
+        nonlocal count, chunks_done
+        count += len(rows)
+        chunks_done += 1
+        if report_rss and chunks_done % 20 == 0:
+            print(f"  {count:,} rows, peak RSS {peak_rss_mb():.1f} MiB")
+
+    try:
+        chunks = _counted(query_chunks(conn, zip_codes, pollutant, start, end, chunk_rows), tally)
+        columns = export_columns(pollutant)
+        if fmt == "parquet":
+            write_parquet(chunks, columns, f)
+        else:
+            write_csv(chunks, columns, f)
+    finally:
+        conn.close()
+    return count
+
+if __name__ == "__main__":
+    import argparse
+
+    from config import POLLUTANTS
+
+    parser = argparse.ArgumentParser(description="Export stored observations as CSV or Parquet")
+    parser.add_argument("output", help="output file; the format follows the extension unless --format is given")
+    parser.add_argument("--zips", nargs="*", help="only stations near these ZIP codes")
+    parser.add_argument("--pollutant", choices=POLLUTANTS)
+    parser.add_argument("--from", dest="start", help="first UTC date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="last UTC date, YYYY-MM-DD (inclusive)")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--rss", action="store_true", help="report peak memory while exporting")
+    args = parser.parse_args()
+
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    if fmt == "parquet":
+        try:
+            import pyarrow
+        except ImportError:
+            print("Parquet export needs pyarrow (pip install pyarrow)")
+            sys.exit(1)
+    started = time.perf_counter()
+    count = export(args.output, fmt, args.zips, args.pollutant, args.start, args.end,
+                   args.store, args.chunk_rows, args.rss)
+    print(f"Exported {count:,} rows to {args.output} in {time.perf_counter() - started:.1f} s")
+    if args.rss:
+        print(f"peak RSS {peak_rss_mb():.1f} MiB")
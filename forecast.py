@@ -0,0 +1,226 @@
+# forecast.py
+#
+# Short-term PM2.5 forecasts for every ZIP at once. Recent hourly history from
+# the local store (ingest.py) is turned into a ZIP x hour matrix; each ZIP gets
+# an hour-of-day baseline plus an autoregressive model of the departures from
+# it, fitted for all ZIPs together with batched least squares. Large ZIP sets
+# are split across a process pool. Results are written to FORECAST_PATH, which
+# the app only reads, so page views never fit a model.
+#
+#   python forecast.py build                 # after each hourly ingest
+#   python ingest.py 2026101908 --forecast   # or as part of it
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import FORECAST_PATH, STORE_PATH
+
+HISTORY_HOURS = 14 * 24
+HORIZON_HOURS = 72
+# Autoregressive lags on the baseline departures (hours)
+LAGS = (1, 2, 3, 24)
+RIDGE = 1e-3
+# Central 80% band
+BAND_Z = 1.2816
+# Below this many ZIPs a process pool costs more than it saves
+POOL_MIN_ZIPS = 2000
+# Stations within this many degrees of a ZIP centroid feed its series
+NEARBY_DEGREES = 0.35
+
+def _hour_key(moment):
+    return moment.strftime("%Y-%m-%d %H:00")
+
+def load_history(conn, locations, pollutant="PM2.5", hours=HISTORY_HOURS):
+    # Returns (zips, ZIP x hour matrix with NaN gaps, first hour as UTC datetime).
+    # One query covers every location; stations are resampled onto the shared
+    # hourly axis with array indexing rather than row by row.
+    import numpy as np
+    from store import POLLUTANT_COLUMNS
+
+    latest = conn.execute("SELECT MAX(observed_at) FROM observations").fetchone()[0]
+    if latest is None or not locations:
+        return None
+    end = datetime.strptime(latest, "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+    start = end - timedelta(hours=hours - 1)
+    column = POLLUTANT_COLUMNS[pollutant]
+    zip_lat = np.array([location["lat"] for location in locations])
+    zip_lon = np.array([location["lon"] for location in locations])
+    rows = conn.execute(
+        f"SELECT station, lat, lon, observed_at, {column} FROM observations "
+        f"WHERE observed_at >= ? AND {column} IS NOT NULL "
+        f"AND lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?",
+        (_hour_key(start),
+         zip_lat.min() - NEARBY_DEGREES, zip_lat.max() + NEARBY_DEGREES,
+         zip_lon.min() - NEARBY_DEGREES, zip_lon.max() + NEARBY_DEGREES),
+    ).fetchall()
+    if not rows:
+        return None
+
+    # Station x hour matrix first (few stations), then the worst nearby
+    # station per ZIP and hour
+    station_names, lats, lons, observed, values = zip(*rows)
+    names, first_row, station_index = np.unique(np.array(station_names), return_index=True, return_inverse=True)
+    t = (np.array(observed).astype("datetime64[h]") - np.datetime64(start.replace(tzinfo=None), "h")).astype(np.int64)
+    station_values = np.full((len(names), hours), -np.inf)
+    station_values[station_index, t] = np.array(values, dtype=float)
+    station_lat = np.array(lats, dtype=float)[first_row]
+    station_lon = np.array(lons, dtype=float)[first_row]
+
+    zips = [location["zip"] for location in locations]
+    near = ((np.abs(zip_lat[:, None] - station_lat) <= NEARBY_DEGREES)
+            & (np.abs(zip_lon[:, None] - station_lon) <= NEARBY_DEGREES))
+
+    matrix = np.full((len(zips), hours), -np.inf)
+    for s, series in enumerate(station_values):
+        rows_near = near[:, s]
+        matrix[rows_near] = np.maximum(matrix[rows_near], series)
+    matrix[np.isinf(matrix)] = np.nan
+    return zips, matrix, start
+
+def fit_forecast(matrix, first_hour, horizon=HORIZON_HOURS, lags=LAGS):
+    # matrix: ZIP x hour with NaN gaps; first_hour: UTC hour-of-day of column 0.
+    # Returns (mean, lower, upper), each ZIP x horizon, NaN for ZIPs with no data.
+    import numpy as np
+
+    zips, hours = matrix.shape
+    hour_of_day = (first_hour + np.arange(hours + horizon)) % 24
+    observed = ~np.isnan(matrix)
+    filled = np.where(observed, matrix, 0.0)
+
+    # Hour-of-day baseline, falling back to the ZIP mean for unseen hours
+    counts = observed.sum(axis=1)
+    zip_mean = filled.sum(axis=1) / np.maximum(counts, 1)
+    profile = np.repeat(zip_mean[:, None], 24, axis=1)
+    for h in range(24):
+        columns = hour_of_day[:hours] == h
+        seen = observed[:, columns].sum(axis=1)
+        profile[:, h] = np.where(seen > 0, filled[:, columns].sum(axis=1) / np.maximum(seen, 1), zip_mean)
+    baseline = profile[:, hour_of_day]
+
+    # Departures from the baseline; gaps count as "no departure"
+    residual = np.where(observed, matrix - baseline[:, :hours], 0.0)
+
+    # Batched least squares: one small p x p system per ZIP
+    max_lag = max(lags)
+    design = np.stack([residual[:, max_lag - lag:hours - lag] for lag in lags], axis=2)
+    target = residual[:, max_lag:]
+    weight = observed[:, max_lag:].astype(float)
+    xtx = np.einsum("znk,zn,znl->zkl", design, weight, design) + RIDGE * np.eye(len(lags))
+    xty = np.einsum("znk,zn,zn->zk", design, weight, target)
+    phi = np.linalg.solve(xtx, xty[..., None])[..., 0]
+    # Keep every model stable (sum of |phi| below 1)
+    scale = np.abs(phi).sum(axis=1)
+    phi *= np.where(scale > 0.98, 0.98 / np.maximum(scale, 1e-12), 1.0)[:, None]
+
+    errors = (target - np.einsum("znk,zk->zn", design, phi)) * weight
+    sigma = np.sqrt((errors ** 2).sum(axis=1) / np.maximum(weight.sum(axis=1) - len(lags), 1))
+
+    # Roll the model forward, and its impulse response for the error growth
+    extended = np.concatenate([residual, np.zeros((zips, horizon))], axis=1)
+    psi = np.zeros((zips, horizon))
+    psi[:, 0] = 1.0
+    for step in range(horizon):
+        t = hours + step
+        extended[:, t] = sum(phi[:, k] * extended[:, t - lag] for k, lag in enumerate(lags))
+        if step:
+            psi[:, step] = sum(phi[:, k] * psi[:, step - lag] for k, lag in enumerate(lags) if step - lag >= 0)
+
+    mean = np.maximum(baseline[:, hours:] + extended[:, hours:], 0.0)
+    spread = BAND_Z * sigma[:, None] * np.sqrt(np.cumsum(psi ** 2, axis=1))
+    lower = np.maximum(mean - spread, 0.0)
+    upper = mean + spread
+
+    no_data = counts == 0
+    for values in (mean, lower, upper):
+        values[no_data] = np.nan
+    return mean, lower, upper
+
+def _fit_block(args):
+    return fit_forecast(*args)
+
+def fit_all(matrix, first_hour, horizon=HORIZON_HOURS, workers=None):
+    # Vectorized within a block; blocks of ZIPs go to a process pool when the
+    # ZIP set is large enough to pay for it
+    import numpy as np
+
+    if workers is None:
+        workers = os.cpu_count() if len(matrix) >= POOL_MIN_ZIPS else 1
+    if workers <= 1:
+        return fit_forecast(matrix, first_hour, horizon)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    blocks = np.array_split(matrix, workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_fit_block, [(block, first_hour, horizon) for block in blocks]))
+    return tuple(np.concatenate([result[i] for result in results]) for i in range(3))
+
+def build_forecasts(store_path=STORE_PATH, forecast_path=FORECAST_PATH, workers=None):
+    import numpy as np
+    import store
+    from geodata import locations
+
+    conn = store.connect(store_path)
+    try:
+        history = load_history(conn, locations())
+    finally:
+        conn.close()
+    if history is None:
+        return 0
+    zips, matrix, start = history
+    mean, lower, upper = fit_all(matrix, start.hour, workers=workers)
+
+    keep = ~np.isnan(mean[:, 0])
+    first = start + timedelta(hours=matrix.shape[1])
+    tmp_path = f"{forecast_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            zips=np.array(zips)[keep],
+            start=np.array(first.strftime("%Y-%m-%dT%H:00:00")),
+            mean=mean[keep].astype("float32"),
+            lower=lower[keep].astype("float32"),
+            upper=upper[keep].astype("float32"),
+        )
+    os.replace(tmp_path, forecast_path)
+    return int(keep.sum())
+
+def forecast_mtime(forecast_path=FORECAST_PATH):
+    # Changes whenever build_forecasts() writes a new file
+    return os.path.getmtime(forecast_path) if os.path.exists(forecast_path) else None
+
+def load_forecasts(forecast_path=FORECAST_PATH):
+    # {zip: row} plus the arrays, or None when no forecast has been built
+    import numpy as np
+
+    if not os.path.exists(forecast_path):
+        return None
+    with np.load(forecast_path) as data:
+        forecasts = {key: data[key] for key in ("zips", "mean", "lower", "upper")}
+        forecasts["start"] = str(data["start"])
+    forecasts["rows"] = {zip_code: i for i, zip_code in enumerate(forecasts["zips"].tolist())}
+    return forecasts
+
+def forecast_for(forecasts, zip_code, timezone_name="America/Denver"):
+    # Time / Forecast / Lower / Upper for one ZIP in local time, or None
+    import pandas as pd
+
+    if not forecasts or zip_code not in forecasts["rows"]:
+        return None
+    i = forecasts["rows"][zip_code]
+    times = pd.date_range(forecasts["start"], periods=forecasts["mean"].shape[1], freq="h", tz="UTC")
+    return pd.DataFrame({
+        "Time": times.tz_convert(timezone_name).tz_localize(None),
+        "Forecast": forecasts["mean"][i],
+        "Lower": forecasts["lower"][i],
+        "Upper": forecasts["upper"][i],
+    })
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["build"]:
+        started = time.perf_counter()
+        count = build_forecasts()
+        print(f"Forecast {count} ZIPs {HORIZON_HOURS} h ahead in {time.perf_counter() - started:.1f} s")
+    else:
+        print("usage: python forecast.py build")
@@ -0,0 +1,130 @@
+# geodata.py
+#
+# ZIP/ZCTA lookups backed by a compact binary index built from the local
+# gazetteer (zip,city,county,lat,lon CSV of every Colorado delivery ZIP). The
+# index is built once and then memory-mapped, so lookups and the ZIP list cost
+# no parsing on reruns.
+#
+#   python geodata.py build     # (re)build the index after updating the gazetteer
+import csv
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from functools import lru_cache
+
+from config import GAZETTEER_PATH, GEODATA_INDEX_PATH
+
+MAGIC = b"AQZI"
+VERSION = 1
+# magic, version, record count, string table offset
+HEADER = struct.Struct("<4sHII")
+# zip, latitude, longitude, city id, county id
+RECORD = struct.Struct("<5sxffHH")
+
+def build_index(gazetteer_path=GAZETTEER_PATH, index_path=GEODATA_INDEX_PATH):
+    with open(gazetteer_path, newline="", encoding="utf-8") as f:
+        rows = sorted(csv.DictReader(f), key=lambda row: row["zip"])
+
+    # City and county names are stored once and referenced by id
+    names = []
+    name_ids = {}
+    def name_id(name):
+        if name not in name_ids:
+            name_ids[name] = len(names)
+            names.append(name)
+        return name_ids[name]
+
+    records = b"".join(
+        RECORD.pack(
+            row["zip"].zfill(5).encode("ascii"),
+            float(row["lat"]),
+            float(row["lon"]),
+            name_id(row["city"].strip()),
+            name_id(row["county"].strip()),
+        )
+        for row in rows
+    )
+    strings = "\n".join(names).encode("utf-8")
+
+    # A private temp file per build, so processes rebuilding at the same time
+    # never write into each other's file before the rename
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path) or ".", prefix=".geodata-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(rows), HEADER.size + len(records)))
+            f.write(records)
+            f.write(strings)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(rows)
+
+class ZipIndex:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, strings_offset = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} ZIP index")
+        self.names = self.buffer[strings_offset:].decode("utf-8").split("\n")
+
+    def zip_at(self, i):
+        offset = HEADER.size + i * RECORD.size
+        return self.buffer[offset:offset + 5].decode("ascii")
+
+    def record_at(self, i):
+        zip_code, lat, lon, city_id, county_id = RECORD.unpack_from(self.buffer, HEADER.size + i * RECORD.size)
+        return {
+            "zip": zip_code.decode("ascii"),
+            "city": self.names[city_id],
+            "county": self.names[county_id],
+            "lat": round(lat, 4),
+            "lon": round(lon, 4),
+        }
+
+    def find(self, zip_code):
+        # Binary search over the sorted fixed-width records
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.zip_at(mid) < zip_code:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.zip_at(lo) == zip_code:
+            return lo
+        return None
+
+@lru_cache(maxsize=1)
+def get_index():
+    stale = (
+        not os.path.exists(GEODATA_INDEX_PATH)
+        or os.path.getmtime(GEODATA_INDEX_PATH) < os.path.getmtime(GAZETTEER_PATH)
+    )
+    if stale:
+        build_index()
+    return ZipIndex(GEODATA_INDEX_PATH)
+
+def lookup(zip_code):
+    index = get_index()
+    i = index.find(str(zip_code).zfill(5))
+    return index.record_at(i) if i is not None else None
+
+@lru_cache(maxsize=1)
+def zip_codes():
+    index = get_index()
+    return tuple(index.zip_at(i) for i in range(index.count))
+
+@lru_cache(maxsize=1)
+def locations():
+    index = get_index()
+    return tuple(index.record_at(i) for i in range(index.count))
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["build"]:
+        print(f"Indexed {build_index()} ZIPs into {GEODATA_INDEX_PATH}")
+    else:
+        print("usage: python geodata.py build")
@@ -0,0 +1,247 @@
+# ingest.py
+#
+# Streaming ingester for AirNow's hourly bulk observation files
+# (HourlyAQObs_YYYYMMDDHH.dat). The file is read line by line through a
+# generator pipeline -- parse, keep Colorado, convert to typed rows, group into
+# fixed-size chunks -- and each chunk is written to the local store before the
+# next is read, so memory stays flat however large the input is.
+#
+#   python ingest.py 2026101908                  # fetch one hour from AIRNOW_FILES_URL
+#   python ingest.py HourlyAQObs_2026101908.dat  # or a local (optionally .gz) file
+#   python ingest.py synth big.dat --gb 4        # write a synthetic file for testing
+#   python ingest.py big.dat --rss               # report peak RSS while ingesting
+#   python ingest.py 2026101908 --forecast       # then refresh the ZIP forecasts
+#
+# Once a file is in the store, its newest station readings are checked
+# against alert subscriptions (alerts.py) and fed to the shared smoke
+# detector (anomalies.py).
+import argparse
+import csv
+import gzip
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+from alerts import alert_watcher
+from anomalies import update_from_stations
+from config import AIRNOW_FILES_URL, COLORADO_BOUNDS, POLLUTANTS, STORE_PATH
+from rss import peak_rss_mb
+import store
+
+CHUNK_ROWS = 5000
+PM25_FIELD = store.OBSERVATION_FIELDS.index("pm25")
+# Pollutant -> HourlyAQObs column
+AQI_FIELDS = {"PM2.5": "PM25_AQI", "PM10": "PM10_AQI", "O3": "OZONE_AQI", "NO2": "NO2_AQI"}
+HOURLY_FIELDS = [
+    "AQSID", "SiteName", "Status", "EPARegion", "Latitude", "Longitude", "Elevation",
+    "GMTOffset", "CountryCode", "StateName", "ValidDate", "ValidTime", "DataSource",
+    "ReportingArea_PipeDelimited", "OZONE_AQI", "PM10_AQI", "PM25_AQI", "NO2_AQI",
+    "OZONE_Measured", "PM10_Measured", "PM25_Measured", "NO2_Measured",
+    "PM25", "PM25_Unit", "OZONE", "OZONE_Unit", "NO2", "NO2_Unit",
+    "CO", "CO_Unit", "SO2", "SO2_Unit", "PM10", "PM10_Unit",
+]
+
+def bulk_file_url(hour):
+    # hour is "YYYYMMDDHH" (UTC)
+    return f"{AIRNOW_FILES_URL}/{hour[:4]}/{hour[:8]}/HourlyAQObs_{hour}.dat"
+
+def read_lines(source):
+    if source.startswith(("http://", "https://")):
+        import requests
+
+        with requests.get(source, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            response.encoding = response.encoding or "utf-8"
+            yield from response.iter_lines(decode_unicode=True)
+        return
+    opener = gzip.open if source.endswith(".gz") else open
+    with opener(source, "rt", newline="", encoding="utf-8", errors="replace") as f:
+        yield from f
+
+def parse_records(lines):
+    # Yields (header index, row) so later stages look fields up by name
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    index = {name.strip(): i for i, name in enumerate(header)}
+    for row in reader:
+        if len(row) == len(header):
+            yield index, row
+
+def colorado(records, state="CO", bounds=COLORADO_BOUNDS):
+    # Keep rows tagged with the state code; untagged rows are kept when they
+    # fall inside the bounding box
+    west, south, east, north = bounds
+    for index, row in records:
+        row_state = row[index["StateName"]].strip()
+        if row_state:
+            if row_state == state:
+                yield index, row
+            continue
+        try:
+            lat, lon = float(row[index["Latitude"]]), float(row[index["Longitude"]])
+        except ValueError:
+            continue
+        if south <= lat <= north and west <= lon <= east:
+            yield index, row
+
+def _aqi(value):
+    try:
+        aqi = int(float(value))
+    except ValueError:
+        return None
+    return aqi if aqi >= 0 else None
+
+def _observed_at(valid_date, valid_time):
+    # "MM/DD/YY" or "MM/DD/YYYY" plus "HH:MM" (UTC) -> "YYYY-MM-DD HH:00"
+    month, day, year = valid_date.strip().split("/")
+    if len(year) == 2:
+        year = f"20{year}"
+    return f"{year}-{int(month):02d}-{int(day):02d} {int(valid_time.strip().split(':')[0]):02d}:00"
+
+def typed_rows(records):
+    # Converts each kept row to a tuple in store.OBSERVATION_FIELDS order
+    for index, row in records:
+        try:
+            values = [_aqi(row[index[AQI_FIELDS[pollutant]]]) for pollutant in POLLUTANTS]
+            present = [value for value in values if value is not None]
+            if not present:
+                continue
+            yield (
+                row[index["AQSID"]].strip(),
+                row[index["SiteName"]].strip(),
+                float(row[index["Latitude"]]),
+                float(row[index["Longitude"]]),
+                _observed_at(row[index["ValidDate"]], row[index["ValidTime"]]),
+                max(present),
+                *values,
+            )
+        except (KeyError, ValueError):
+            continue
+
+def chunked(rows, size=CHUNK_ROWS):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def ingest(source, store_path=STORE_PATH, chunk_size=CHUNK_ROWS, report_rss=False):
+    conn = store.connect(store_path)
+    stats = {"lines": 0, "rows": 0, "chunks": 0}
+    # Station -> (observed_at, lat, lon, aqi, pm25) of its newest row, for
+    # alerts and smoke detection
+    latest = {}
+
+    def counted(lines):
+        for line in lines:
+            stats["lines"] += 1
+            yield line
+
+    started = time.perf_counter()
+    try:
+        pipeline = chunked(typed_rows(colorado(parse_records(counted(read_lines(source))))), chunk_size)
+        for chunk in pipeline:
+            store.write_observations(conn, chunk)
+            for row in chunk:
+                if row[4] >= latest.get(row[0], ("",))[0]:
+                    latest[row[0]] = (row[4], row[2], row[3], row[5], row[PM25_FIELD])
+            stats["rows"] += len(chunk)
+            stats["chunks"] += 1
+            if report_rss and stats["chunks"] % 10 == 0:
+                print(f"  {stats['lines']:>12,} lines  {stats['rows']:>10,} rows  peak RSS {peak_rss_mb():.1f} MiB")
+    finally:
+        conn.close()
+    stats["seconds"] = time.perf_counter() - started
+    if latest:
+        observed_at = max(observed_at for observed_at, *_ in latest.values())
+        stats["alerts"] = len(alert_watcher().evaluate_stations(
+            [(lat, lon, aqi) for _, lat, lon, aqi, _ in latest.values()], observed_at
+        ))
+        events = update_from_stations(
+            [(lat, lon, pm25) for _, lat, lon, _, pm25 in latest.values()],
+            datetime.strptime(observed_at, "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc).timestamp(),
+        )
+        stats["smoke_events"] = len(events) if events is not None else None
+    return stats
+
+def write_synthetic(path, size_bytes, colorado_share=0.02, seed=0):
+    # A file shaped like HourlyAQObs with mostly out-of-state stations. One
+    # block of rows is generated and re-written with a new hour each time, so
+    # multi-GB files take seconds rather than minutes.
+    import io
+
+    rng = random.Random(seed)
+    states = ["CA", "TX", "NY", "WA", "AZ", "UT", "WY", "NM", "KS", "NE"]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    block_rows = 20000
+    for i in range(block_rows):
+        in_colorado = rng.random() < colorado_share
+        lat = rng.uniform(37.0, 41.0) if in_colorado else rng.uniform(25.0, 49.0)
+        lon = rng.uniform(-109.0, -102.05) if in_colorado else rng.uniform(-124.0, -67.0)
+        aqis = [rng.choice(["", str(rng.randint(0, 200))]) for _ in range(4)]
+        writer.writerow([
+            f"{840000000000 + i:012d}", f"Site {i}", "Active", "R8",
+            f"{lat:.4f}", f"{lon:.4f}", "1600.0", "-7", "US",
+            "CO" if in_colorado else rng.choice(states),
+            "@DATE@", "@TIME@", "Synthetic", "Somewhere", *aqis, "1", "1", "1", "1",
+            "12.0", "UG/M3", "40.0", "PPB", "10.0", "PPB", "", "", "", "", "20.0", "UG/M3",
+        ])
+    block = buffer.getvalue()
+
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        f.write(",".join(HOURLY_FIELDS) + "\r\n")
+        hour = 0
+        while f.tell() < size_bytes:
+            day, time_of_day = divmod(hour, 24)
+            f.write(block.replace("@DATE@", f"{1 + day // 28 % 12:02d}/{1 + day % 28:02d}/26")
+                         .replace("@TIME@", f"{time_of_day:02d}:00"))
+            rows += block_rows
+            hour += 1
+    return rows
+
+def main():
+    if sys.argv[1:2] == ["synth"]:
+        parser = argparse.ArgumentParser(description="Write a synthetic HourlyAQObs file")
+        parser.add_argument("command")
+        parser.add_argument("path")
+        parser.add_argument("--gb", type=float, default=1.0)
+        args = parser.parse_args()
+        count = write_synthetic(args.path, int(args.gb * 1024 ** 3))
+        print(f"Wrote {count:,} rows to {args.path}")
+        return
+
+    parser = argparse.ArgumentParser(description="Ingest AirNow hourly bulk files into the local store")
+    parser.add_argument("sources", nargs="+", help="YYYYMMDDHH, URL or path (.dat or .dat.gz)")
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--rss", action="store_true", help="print peak RSS as chunks are written")
+    parser.add_argument("--forecast", action="store_true", help="rebuild ZIP forecasts afterwards")
+    args = parser.parse_args()
+
+    for source in args.sources:
+        if source.isdigit() and len(source) == 10:
+            source = bulk_file_url(source)
+        stats = ingest(source, args.store, args.chunk_rows, args.rss)
+        print(f"{source}: {stats['lines']:,} lines, {stats['rows']:,} Colorado rows "
+              f"in {stats['chunks']} chunks, {stats['seconds']:.1f} s")
+        if stats.get("alerts"):
+            print(f"  {stats['alerts']} alerts sent")
+        if stats.get("smoke_events"):
+            print(f"  {stats['smoke_events']} possible smoke events")
+        if args.rss:
+            print(f"  peak RSS {peak_rss_mb():.1f} MiB")
+
+    if args.forecast:
+        from forecast import build_forecasts
+
+        print(f"Forecast {build_forecasts(args.store)} ZIPs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,588 @@
+# layout.py
+#
+# Page chrome shared by the Streamlit app and the prerendered landing page
+# (snapshot.py): the stylesheet, header, hero and stats cards.
+
+PAGE_CSS = """
+<style>
+    @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600;700;800&display=swap');
+    
+    /* Base styles */
+    html, body, [class*="css"], .stApp {
+        font-family: 'Poppins', sans-serif !important;
+    }
+    
+    /* Reset Streamlit defaults */
+    .stApp {
+        background-color: #fff;
+    }
+    
+    .css-18e3th9, .css-1d391kg, .css-12oz5g7, .st-emotion-cache-18e3th9, .st-emotion-cache-1d391kg {
+        padding: 0 !important;
+        background-color: #fff !important;
+    }
+    
+    div[data-testid="stVerticalBlock"] {
+        background-color: #fff !important;
+    }
+    
+    .block-container {
+        padding-top: 0;
+        padding-bottom: 0;
+        max-width: 100%;
+        margin: 0 auto;
+        background-color: #fff;
+    }
+    
+   /* Typography */
+    h1 {
+        font-weight: 700;
+        font-size: 3rem;
+        margin-bottom: 1rem;
+        color: #1E90FF !important;
+    }
+
+    h2 {
+        font-weight: 600;
+        font-size: 2.25rem;
+        margin-top: 3rem;
+        margin-bottom: 1.5rem;
+        color: #1E90FF !important;
+        text-align: center;
+    }
+
+    h3 {
+        font-weight: 600;
+        font-size: 1.5rem;
+        margin-top: 2rem;
+        margin-bottom: 1rem;
+        color: #1E90FF !important;
+    }
+    
+    p, li {
+        font-size: 1rem;
+        line-height: 1.6;
+        color: #212529;
+        font-weight: 400;
+    }
+    
+    /* Header styling */
+    .header-container {
+        display: flex;
+        justify-content: space-between;
+        align-items: center;
+        padding: 1rem 2rem;
+        background-color: white;
+        border-bottom: 1px solid #f0f0f0;
+        margin-bottom: 2rem;
+        position: sticky;
+        top: 0;
+        z-index: 1000;
+        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+    }
+    
+    .logo-container {
+        display: flex;
+        align-items: center;
+    }
+    
+    .logo-text {
+        color: #1E90FF;
+        font-weight: 700;
+        font-size: 1.5rem;
+        margin-left: 0.5rem;
+    }
+    
+    .nav-links {
+        display: flex;
+        gap: 1.5rem;
+    }
+    
+    .nav-link {
+        text-decoration: none;
+        font-weight: 500;
+        transition: color 0.3s ease;
+        padding: 0.5rem 1rem;
+        border-radius: 4px;
+    }
+    
+    .nav-link:hover {
+        background-color: rgba(30,144,255,0.1);
+    }
+    
+    .nav-home {
+        color: #1E90FF;
+    }
+    
+    .nav-about {
+        color: #6f42c1;
+    }
+    
+    .nav-data {
+        color: #28a745;
+    }
+    
+    .nav-resources {
+        color: #fd7e14;
+    }
+    
+    .nav-home:hover {
+        color: #fff;
+        background-color: #1E90FF;
+    }
+    
+    .nav-about:hover {
+        color: #fff;
+        background-color: #6f42c1;
+    }
+    
+    .nav-data:hover {
+        color: #fff;
+        background-color: #28a745;
+    }
+    
+    .nav-resources:hover {
+        color: #fff;
+        background-color: #fd7e14;
+    }
+    
+    /* Theme toggle */
+    .toggle-container {
+        display: flex;
+        align-items: center;
+    }
+    
+    .toggle-box {
+        position: relative;
+        width: 60px;
+        height: 30px;
+    }
+    
+    .toggle-checkbox {
+        opacity: 0;
+        width: 0;
+        height: 0;
+    }
+    
+    .toggle-label {
+        position: absolute;
+        cursor: pointer;
+        top: 0;
+        left: 0;
+        right: 0;
+        bottom: 0;
+        background-color: #ccc;
+        transition: .4s;
+        border-radius: 34px;
+    }
+    
+    .toggle-label:before {
+        position: absolute;
+        content: "";
+        height: 22px;
+        width: 22px;
+        left: 4px;
+        bottom: 4px;
+        background-color: white;
+        transition: .4s;
+        border-radius: 50%;
+    }
+    
+    .toggle-checkbox:checked + .toggle-label {
+        background-color: #1E90FF;
+    }
+    
+    .toggle-checkbox:checked + .toggle-label:before {
+        transform: translateX(30px);
+    }
+    
+    /* Hero section */
+    .hero-container {
+        display: flex;
+        flex-direction: column;
+        align-items: center;
+        text-align: center;
+        padding: 3rem 0;
+        background-image: linear-gradient(rgba(0,0,0,0.6), rgba(0,0,0,0.6)), url('https://images.unsplash.com/photo-1519501025264-65ba15a82390?ixlib=rb-1.2.1&auto=format&fit=crop&w=1200&q=80');
+        background-size: cover;
+        background-position: center;
+        color: white;
+        border-radius: 10px;
+        margin-bottom: 2rem;
+    }
+    
+    .hero-title {
+        font-size: 3rem;
+        font-weight: 700;
+        margin-bottom: 1rem;
+    }
+    
+    .hero-subtitle {
+        font-size: 1.2rem;
+        max-width: 800px;
+        margin-bottom: 2rem;
+        color: white;
+        text-align: center;
+    }
+    
+    .hero-button {
+        background-color: white;
+    color: #1E90FF;
+        padding: 0.75rem 1.5rem;
+        border-radius: 5px;
+        font-weight: 500;
+        text-decoration: none;
+        transition: all 0.3s ease;
+    }
+    
+    .hero-button:hover {
+        background-color: #0056b3;
+        transform: translateY(-3px);
+        box-shadow: 0 10px 20px rgba(0,0,0,0.1);
+    }
+    
+    /* Stats cards */
+    .stats-container {
+        display: flex;
+        flex-wrap: wrap;
+        gap: 1rem;
+        margin-bottom: 2rem;
+    }
+    
+    .stat-card {
+        background-color: white;
+        border-radius: 10px;
+        padding: 1.5rem;
+        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+        flex: 1;
+        min-width: 200px;
+        text-align: center;
+        transition: transform 0.3s ease, box-shadow 0.3s ease;
+    }
+    
+    .stat-card:hover {
+        transform: translateY(-5px);
+        box-shadow: 0 10px 20px rgba(0,0,0,0.1);
+    }
+    
+    .stat-value {
+        font-size: 2.5rem;
+        font-weight: 700;
+        color: #1E90FF;
+        margin-bottom: 0.5rem;
+    }
+    
+    .stat-label {
+        color: #6c757d;
+        font-weight: 500;
+        text-align: center;
+    }
+    
+    /* Section styling */
+    .section-title {
+        font-size: 2rem;
+        font-weight: 600;
+        margin-bottom: 1rem;
+        color: #1E90FF;
+        text-align: center;
+    }
+    
+    .section-subtitle {
+        font-size: 1.1rem;
+        color: #757575;
+        margin-bottom: 2rem;
+        text-align: center;
+        max-width: 800px;
+        margin-left: auto;
+        margin-right: auto;
+        display: block;
+    }
+    
+    /* Improved subtitle styling for vertical centering */
+    .map-subtitle-container {
+        display: flex;
+        justify-content: center;
+        align-items: center;
+        min-height: 60px; /* Ensures enough vertical space */
+    }
+    
+    .map-subtitle {
+        font-size: 1.1rem;
+        color: #757575;
+        text-align: center;
+        max-width: 800px;
+        margin: 0 auto;
+    }
+    
+    /* Card styling */
+    .content-card {
+        background-color: white;
+        border-radius: 10px;
+        padding: 1.5rem;
+        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+        margin-bottom: 2rem;
+        transition: transform 0.3s ease, box-shadow 0.3s ease;
+    }
+    
+    .content-card:hover {
+        transform: translateY(-5px);
+        box-shadow: 0 10px 20px rgba(0,0,0,0.1);
+    }
+    
+    /* Progress bars */
+    .progress-container {
+        margin-bottom: 1.5rem;
+    }
+    
+    .progress-label {
+        display: flex;
+        justify-content: space-between;
+        margin-bottom: 0.5rem;
+    }
+    
+    .progress-name {
+        font-weight: 500;
+        color: #1f2937; /* Ensuring skill names are dark and visible */
+    }
+    
+    .progress-value {
+        font-weight: 600;
+        color: #1E90FF;
+    }
+    
+    .progress-bar-bg {
+        height: 10px;
+        background-color: #f0f0f0;
+        border-radius: 5px;
+        overflow: hidden;
+    }
+    
+    .progress-bar-fill {
+        height: 100%;
+        border-radius: 5px;
+        transition: width 0.5s ease-in-out;
+    }
+    
+    .progress-pm25 {
+        width: 65%;
+        background-color: #1E90FF;
+    }
+    
+    .progress-24h {
+        width: 48%;
+        background-color: #1E90FF;
+    }
+    
+    .progress-weekly {
+        width: 37%;
+        background-color: #1E90FF;
+    }
+    
+    /* Skills progress bars */
+    .progress-python {
+        width: 90%;
+        background-color: #1E90FF;
+    }
+    
+    .progress-dataviz {
+        width: 85%;
+        background-color: #1E90FF;
+    }
+    
+    .progress-api {
+        width: 80%;
+        background-color: #1E90FF;
+    }
+    
+    .progress-sql {
+        width: 75%;
+        background-color: #1E90FF;
+    }
+    
+    .progress-webdev {
+        width: 70%;
+        background-color: #1E90FF;
+    }
+    
+    /* Timeline */
+    .timeline-container {
+        position: relative;
+        max-width: 1200px;
+        margin: 0 auto;
+        padding: 2rem 0;
+    }
+    
+    .timeline-item {
+        padding: 1.5rem;
+        background-color: white;
+        border-radius: 10px;
+        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+        margin-bottom: 2rem;
+        position: relative;
+        transition: transform 0.3s ease, box-shadow 0.3s ease;
+    }
+    
+    .timeline-item:hover {
+        transform: translateY(-5px);
+        box-shadow: 0 10px 20px rgba(0,0,0,0.1);
+    }
+    
+    .timeline-year {
+        font-weight: 600;
+        font-size: 1.2rem;
+        margin-bottom: 0.5rem;
+        color: #1E90FF;
+    }
+    
+    /* Footer */
+    .footer {
+        background-color: #f5f5f5;
+        padding: 3rem 0;
+        margin-top: 3rem;
+        text-align: center;
+    }
+    
+    .footer-text {
+        color: #757575;
+        text-align: center;
+    }
+    
+    /* Utility classes */
+    .text-blue {
+        color: #1E90FF;
+    }
+    
+    .text-center {
+        text-align: center;
+    }
+    
+    .mb-4 {
+        margin-bottom: 1.5rem;
+    }
+    
+    /* AQI categories */
+    .aqi-category {
+        color: #1E90FF;
+        font-weight: 500;
+    }
+    
+    /* City names and rankings */
+    .city-name, .city-value {
+        color: #1E90FF;
+    }
+    
+    /* Hide Streamlit elements */
+    #MainMenu, footer, header {
+        visibility: hidden;
+    }
+    
+    div[data-testid="stToolbar"] {
+        visibility: hidden;
+    }
+    
+    /* Animations */
+    @keyframes fadeInUp {
+        from {
+            opacity: 0;
+            transform: translateY(20px);
+        }
+        to {
+            opacity: 1;
+            transform: translateY(0);
+        }
+    }
+    
+    @keyframes fadeIn {
+        from {
+            opacity: 0;
+        }
+        to {
+            opacity: 1;
+        }
+    }
+    
+    .animate-fadeInUp {
+        animation: fadeInUp 1s ease-out;
+    }
+    
+    .animate-fadeIn {
+        animation: fadeIn 1s ease-out;
+    }
+    
+    /* Responsive adjustments */
+    @media (max-width: 768px) {
+        .hero-title {
+            font-size: 2.5rem;
+        }
+        
+        .hero-subtitle {
+            font-size: 1rem;
+        }
+        
+        .stats-container {
+            flex-direction: column;
+        }
+        
+        .nav-links {
+            gap: 0.5rem;
+        }
+        
+        .nav-link {
+            padding: 0.25rem 0.5rem;
+            font-size: 0.9rem;
+        }
+    }
+</style>
+"""
+
+HEADER_HTML = """
+<div class="header-container">
+    <div class="logo-container">
+        <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="#1E90FF" width="32" height="32">
+            <path d="M12 2a1 1 0 0 1 1 1c0 .24-.103.446-.271.623A4.126 4.126 0 0 0 11 7.5V9h1c3.866 0 7 3.134 7 7v5a1 1 0 0 1-1 1h-4a1 1 0 0 1-1-1v-5a2 2 0 0 0-2-2h-2a2 2 0 0 0-2 2v5a1 1 0 0 1-1 1H2a1 1 0 0 1-1-1v-5c0-3.866 3.134-7 7-7h1V7.5a4.126 4.126 0 0 0-1.729-3.377A1.003 1.003 0 0 1 7 3a1 1 0 0 1 1-1h4z"/>
+        </svg>
+        <span class="logo-text">Colorado Air & Asthma Tracker</span>
+    </div>
+    <div class="nav-links">
+        <a href="#" class="nav-link nav-home">Home</a>
+        <a href="#about" class="nav-link nav-about">About</a>
+        <a href="#data" class="nav-link nav-data">Data</a>
+        <a href="#resources" class="nav-link nav-resources">Resources</a>
+        <div class="toggle-container">
+            <div class="toggle-box">
+                <input type="checkbox" id="toggle-checkbox" class="toggle-checkbox">
+                <label for="toggle-checkbox" class="toggle-label"></label>
+            </div>
+        </div>
+    </div>
+</div>
+"""
+
+HERO_HTML = """
+<div class="hero-container">
+    <h1 class="hero-title">Colorado Air & Asthma Tracker</h1>
+    <p class="hero-subtitle">Explore real-time air quality across Colorado and understand its impact on asthma rates. Make informed decisions for your respiratory health.</p>
+    <a href="#data" class="hero-button">Explore Data</a>
+</div>
+"""
+
+STATS_HTML = """
+<div class="stats-container">
+    <div class="stat-card">
+        <div class="stat-value">471</div>
+        <div class="stat-label">Monitoring Stations</div>
+    </div>
+    <div class="stat-card">
+        <div class="stat-value">8.7%</div>
+        <div class="stat-label">Avg. Asthma Rate</div>
+    </div>
+    <div class="stat-card">
+        <div class="stat-value">24/7</div>
+        <div class="stat-label">Real-time Updates</div>
+    </div>
+    <div class="stat-card">
+        <div class="stat-value">PM2.5</div>
+        <div class="stat-label">Primary Pollutant</div>
+    </div>
+</div>
+"""
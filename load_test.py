@@ -0,0 +1,92 @@
+# load_test.py
+#
+# Headless load generator: N concurrent dashboard sessions against the mock
+# AirNow server, each loading the page and then switching ZIP codes.
+#
+#   python load_test.py --sessions 20 --interactions 10 --latency lognormal:150,0.4
+#
+# Reports p50/p95/p99 rerun latency and how many upstream requests were made.
+import argparse
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_airnow import DEFAULT_FIXTURES, start_mock_server
+
+def percentiles(samples):
+    if len(samples) < 2:
+        value = samples[0] if samples else 0.0
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+def run_session(session_id, interactions, timeout):
+    from streamlit.testing.v1 import AppTest
+    # geodata imports config, so it must wait until AIRNOW_BASE_URL is set
+    from geodata import zip_codes
+
+    rng = random.Random(session_id)
+    timings = {"initial": [], "rerun": []}
+
+    app = AppTest.from_file("app.py", default_timeout=timeout)
+    start = time.perf_counter()
+    app.run()
+    timings["initial"].append(time.perf_counter() - start)
+
+    selectbox = app.selectbox(key="zip_code")
+    for _ in range(interactions):
+        selectbox.select(rng.choice(zip_codes()))
+        start = time.perf_counter()
+        app.run()
+        timings["rerun"].append(time.perf_counter() - start)
+        selectbox = app.selectbox(key="zip_code")
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent dashboard sessions")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--interactions", type=int, default=10)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--latency", default="lognormal:120,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", default=None)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    server = start_mock_server(
+        args.fixtures,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+    # Must be set before app.py (and so config) is first imported
+    os.environ["AIRNOW_BASE_URL"] = server.base_url
+    # Quota is the mock's job here (--rate-limit), not the client token bucket's
+    os.environ.setdefault("AQ_AIRNOW_QUOTA", "1000000000")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        results = list(pool.map(
+            lambda session_id: run_session(session_id, args.interactions, args.timeout),
+            range(args.sessions),
+        ))
+    elapsed = time.perf_counter() - started
+
+    for kind in ("initial", "rerun"):
+        samples = [value for result in results for value in result[kind]]
+        stats = percentiles(samples)
+        print(f"{kind:<8} n={len(samples):<5} p50 {stats['p50'] * 1000:8.1f} ms"
+              f"   p95 {stats['p95'] * 1000:8.1f} ms   p99 {stats['p99'] * 1000:8.1f} ms")
+
+    stats = dict(server.mock.stats)
+    print(f"upstream requests: {stats.get('requests', 0)} "
+          f"({stats.get('requests', 0) / args.sessions:.1f} per session) in {elapsed:.1f} s")
+    for key, value in sorted(stats.items()):
+        if key != "requests":
+            print(f"  {key}: {value}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# metrics.py
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+PROFILE = os.getenv("AQ_PROFILE") == "1"
+# Stage histograms, cache and payload counters are only collected when enabled
+ENABLED = os.getenv("AQ_METRICS") == "1"
+METRICS_PORT = int(os.getenv("AQ_METRICS_PORT", "0"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAYLOAD_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000, 20_000_000)
+# Payload sizes need a serialization pass, so only every Nth render is measured
+PAYLOAD_SAMPLE_EVERY = 20
+
+_lock = threading.Lock()
+_local = threading.local()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_payload_calls = {}
+_server = None
+
+# Last few hundred durations (ms) per page section
+section_timings = {}
+
+@contextmanager
+def section_timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        # Script and fragment threads time sections concurrently
+        with _lock:
+            section_timings.setdefault(name, deque(maxlen=500)).append(elapsed * 1000)
+        if ENABLED:
+            observe("aq_section_seconds", {"section": name}, elapsed, LATENCY_BUCKETS)
+        if PROFILE:
+            print(f"[timing] {name}: {elapsed * 1000:.1f} ms")
+
+def timing_summary():
+    summary = {}
+    with _lock:
+        snapshot = [(name, sorted(samples)) for name, samples in section_timings.items()]
+    for name, ordered in snapshot:
+        summary[name] = {
+            "runs": len(ordered),
+            "p50_ms": ordered[len(ordered) // 2],
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        }
+    return summary
+
+def observe(metric, labels, value, buckets):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        hist = _histograms.setdefault(key, {
+            "buckets": buckets,
+            "counts": [0] * (len(buckets) + 1),
+            "sum": 0.0,
+            "count": 0,
+        })
+        hist["counts"][bisect_left(buckets, value)] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+def inc(metric, labels, amount=1):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def set_gauge(metric, labels, value):
+    with _lock:
+        _gauges[(metric, tuple(sorted(labels.items())))] = value
+
+def instrument(stage):
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe("aq_stage_seconds", {"stage": stage}, time.perf_counter() - start, LATENCY_BUCKETS)
+        return wrapper
+    return decorator
+
+def mark_cache_miss():
+    # Called from inside a cached function body, which only runs on a miss
+    _local.cache_miss = True
+
+def track_cache(name):
+    def decorator(cached_func):
+        if not ENABLED:
+            return cached_func
+
+        @wraps(cached_func)
+        def wrapper(*args, **kwargs):
+            _local.cache_miss = False
+            result = cached_func(*args, **kwargs)
+            inc("aq_cache_requests_total", {"cache": name, "result": "miss" if _local.cache_miss else "hit"})
+            return result
+        return wrapper
+    return decorator
+
+def record_payload(stage, size_func):
+    if not ENABLED:
+        return
+    with _lock:
+        calls = _payload_calls.get(stage, 0)
+        _payload_calls[stage] = calls + 1
+    # Measured outside the lock: size_func serializes a whole figure or deck
+    if calls % PAYLOAD_SAMPLE_EVERY == 0:
+        observe("aq_payload_bytes", {"stage": stage}, size_func(), PAYLOAD_BUCKETS)
+
+def _escape_label(value):
+    # Prometheus text format: backslash, double quote and newline are escaped
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+def render_prometheus():
+    lines = []
+    with _lock:
+        # Copy the counts so a scrape never sees a half-updated histogram
+        histograms = sorted((key, {**hist, "counts": list(hist["counts"])}) for key, hist in _histograms.items())
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+
+    seen = set()
+    for (metric, labels), hist in histograms:
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} histogram")
+            seen.add(metric)
+        running = 0
+        for bound, count in zip(hist["buckets"], hist["counts"]):
+            running += count
+            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', bound),))} {running}")
+        lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} {hist['count']}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {hist['sum']}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {hist['count']}")
+
+    for kind, items in (("counter", counters), ("gauge", gauges)):
+        for (metric, labels), value in items:
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} {kind}")
+                seen.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+def start_metrics_server(port=METRICS_PORT):
+    # Serves /metrics on localhost from a daemon thread, once per process
+    global _server
+    if not port or _server is not None:
+        return _server
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
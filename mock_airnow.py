@@ -0,0 +1,205 @@
+# mock_airnow.py
+#
+# Local stand-in for the AirNow API, for load and latency testing.
+#
+#   python mock_airnow.py --port 8765 --latency lognormal:120,0.5 --error-rate 0.02 --rate-limit 500/60
+#   AIRNOW_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+#
+# Responses come from recorded fixtures (see --record) keyed by ZIP. ZIPs without
+# a recording reuse the closest recorded payload so every request gets the real
+# response shape. GET /_stats returns request counters as JSON.
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CURRENT_PATH = "/aq/observation/zipCode/current/"
+HISTORICAL_PATH = "/aq/observation/zipCode/historical/"
+DEFAULT_FIXTURES = "fixtures/airnow_current.json"
+
+def parse_latency(spec):
+    # "fixed:50", "uniform:20,200" or "lognormal:120,0.5" (median ms, sigma)
+    if not spec:
+        return lambda rng: 0.0
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+def parse_rate_limit(spec):
+    # "500/60" allows 500 requests per rolling 60 seconds
+    if not spec:
+        return None
+    limit, _, window = spec.partition("/")
+    return int(limit), float(window or 3600)
+
+def load_fixtures(path):
+    with open(path) as f:
+        return json.load(f)
+
+class MockAirNow:
+    def __init__(self, fixtures, latency=None, error_rate=0.0, rate_limit=None, seed=0):
+        self.fixtures = fixtures
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit = parse_rate_limit(rate_limit)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.stats = Counter()
+
+    def observations(self, zip_code):
+        if zip_code in self.fixtures:
+            return self.fixtures[zip_code]
+        recorded = sorted(self.fixtures)
+        nearest = min(recorded, key=lambda known: abs(int(known) - int(zip_code or 0)))
+        return self.fixtures[nearest]
+
+    def historical(self, zip_code, date):
+        # Deterministic per (zip, date) so repeated runs see identical payloads
+        seed = int(hashlib.md5(f"{zip_code}:{date}".encode()).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        day = date[:10]
+        entries = []
+        for entry in self.observations(zip_code):
+            entry = dict(entry)
+            entry["DateObserved"] = f"{day} "
+            entry["AQI"] = max(0, int(entry["AQI"] * rng.uniform(0.5, 1.5)))
+            entries.append(entry)
+        return entries
+
+    def admit(self):
+        # Returns the HTTP status this request should get before any payload
+        with self.lock:
+            now = time.monotonic()
+            if self.rate_limit:
+                limit, window = self.rate_limit
+                while self.recent and now - self.recent[0] > window:
+                    self.recent.popleft()
+                if len(self.recent) >= limit:
+                    return 429
+                self.recent.append(now)
+            if self.rng.random() < self.error_rate:
+                return 500
+            return 200
+
+    def delay(self):
+        with self.lock:
+            seconds = self.latency(self.rng)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+                if url.path == "/_stats":
+                    with mock.lock:
+                        self.send_json(200, dict(mock.stats))
+                    return
+                if url.path not in (CURRENT_PATH, HISTORICAL_PATH):
+                    self.send_json(404, {"error": "Not found"})
+                    return
+
+                mock.delay()
+                status = mock.admit()
+                with mock.lock:
+                    mock.stats[f"{url.path} {status}"] += 1
+                    mock.stats["requests"] += 1
+
+                if status == 429:
+                    self.send_json(429, {"error": "Request limit exceeded"}, {"Retry-After": "60"})
+                elif status != 200:
+                    self.send_json(status, {"error": "Injected upstream failure"})
+                elif url.path == CURRENT_PATH:
+                    self.send_json(200, mock.observations(params.get("zipCode")))
+                else:
+                    self.send_json(200, mock.historical(params.get("zipCode"), params.get("date", "")))
+
+            def send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def start_mock_server(fixtures_path=DEFAULT_FIXTURES, port=0, **options):
+    mock = MockAirNow(load_fixtures(fixtures_path), **options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), mock.make_handler())
+    server.mock = mock
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def record_fixtures(zip_codes, path):
+    # Captures live /current responses for the given ZIPs into a fixture file
+    import requests
+    from data_loader import get_api_key
+
+    fixtures = {}
+    for zip_code in zip_codes:
+        response = requests.get(
+            f"https://www.airnowapi.org{CURRENT_PATH}",
+            params={"format": "application/json", "zipCode": zip_code, "distance": 25, "API_KEY": get_api_key()},
+            timeout=30,
+        )
+        response.raise_for_status()
+        if response.json():
+            fixtures[zip_code] = response.json()
+    with open(path, "w") as f:
+        json.dump(fixtures, f, indent=2, sort_keys=True)
+    print(f"Recorded {len(fixtures)} ZIPs to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local mock of the AirNow API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--latency", default=None, help="fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", default=None, help="REQUESTS/SECONDS, answered with 429 when exceeded")
+    parser.add_argument("--record", nargs="+", metavar="ZIP", help="record live responses instead of serving")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.record, args.fixtures)
+        return
+
+    server = start_mock_server(
+        args.fixtures,
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+    print(f"Mock AirNow listening on {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
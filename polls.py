@@ -0,0 +1,240 @@
+# polls.py
+#
+# Idempotent ingest of AirNow ZIP-code API responses into the local store.
+# Polls overlap: the same reporting-area reading comes back for every ZIP in
+# the area and on every poll until the hour rolls over, and AirNow sometimes
+# revises a reading after first reporting it. Each entry gets a compact 64-bit
+# key (local hour in the high bits, a hash of area, state and pollutant below),
+# a batch is deduplicated in memory, and what is left is upserted so the
+# reading from the latest poll wins whatever order polls arrive in.
+#
+#   AQ_INGEST_POLLS=1 streamlit run app.py       # record every live fetch
+#   python polls.py bench --rows 1000000        # replayed polls, rows/s
+import hashlib
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+from config import STORE_PATH
+import store
+
+FLUSH_ROWS = 20_000
+FLUSH_SECONDS = 5.0
+# Keys are hour << HASH_BITS | hash: 20 bits of hours since 1970 last until
+# 2089, and 43 hash bits make a collision among ~10,000 area/pollutant pairs
+# about a one-in-100,000 event
+HASH_BITS = 43
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_identity_hashes = {}
+_day_hours = {}
+
+def _identity_hash(area, state, parameter):
+    # A few thousand distinct identities, so each is hashed once
+    identity = (area, state, parameter)
+    value = _identity_hashes.get(identity)
+    if value is None:
+        digest = hashlib.blake2b("\x1f".join(identity).encode(), digest_size=8).digest()
+        value = _identity_hashes[identity] = int.from_bytes(digest, "big") >> (64 - HASH_BITS)
+    return value
+
+def _day_hour(observed_date):
+    hours = _day_hours.get(observed_date)
+    if hours is None:
+        hours = _day_hours[observed_date] = (date.fromisoformat(observed_date).toordinal() - EPOCH_ORDINAL) * 24
+    return hours
+
+def observation_key(area, state, parameter, observed_date, hour):
+    return (_day_hour(observed_date) + hour) << HASH_BITS | _identity_hash(area, state, parameter)
+
+def poll_rows(entries, polled_at):
+    # AirNow entries -> tuples in store.POLLED_FIELDS order
+    for entry in entries:
+        try:
+            area = entry["ReportingArea"].strip()
+            state = entry["StateCode"].strip()
+            parameter = entry["ParameterName"].strip()
+            observed_date = entry["DateObserved"].strip()
+            hour = int(entry["HourObserved"])
+            key = observation_key(area, state, parameter, observed_date, hour)
+        except (KeyError, AttributeError, TypeError, ValueError):
+            continue
+        aqi = entry.get("AQI")
+        yield (
+            key, area, state, parameter, observed_date, hour, entry.get("LocalTimeZone"),
+            entry.get("Latitude"), entry.get("Longitude"),
+            aqi if aqi is not None and aqi >= 0 else None,
+            (entry.get("Category") or {}).get("Number"),
+            polled_at,
+        )
+
+def latest_rows(polls):
+    # polls: iterable of (polled_at, entries). One row per key, from the
+    # latest poll; on a tie the first one seen stays, as in the store.
+    rows = {}
+    for polled_at, entries in polls:
+        for row in poll_rows(entries, polled_at):
+            kept = rows.get(row[0])
+            if kept is None or polled_at > kept[-1]:
+                rows[row[0]] = row
+    # Sorted keys insert in B-tree order, mostly at the end for new hours
+    return [rows[key] for key in sorted(rows)]
+
+def ingest_polls(conn, polls):
+    # Returns (unique keys in the batch, rows inserted or updated)
+    rows = latest_rows(polls)
+    return len(rows), store.upsert_polled(conn, rows)
+
+class PollWriter:
+    # Collects polls from fetches and writes them in bulk on its own thread,
+    # so a fetch never waits on SQLite
+    def __init__(self, store_path=STORE_PATH, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS):
+        self.store_path = store_path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, entries, polled_at=None):
+        self.queue.put((polled_at if polled_at is not None else time.time(), entries))
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="poll-writer", daemon=True)
+                self.thread.start()
+
+    def _batch(self):
+        batch = [self.queue.get()]
+        pending = len(batch[0][1])
+        deadline = time.monotonic() + self.flush_seconds
+        while pending < self.flush_rows:
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+            pending += len(batch[-1][1])
+        return batch
+
+    def _run(self):
+        conn = store.connect(self.store_path)
+        while True:
+            batch = self._batch()
+            try:
+                ingest_polls(conn, batch)
+            except Exception as e:
+                # Dropping a batch only loses history; the next poll repeats most of it
+                print("Error writing polled observations:", e)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def poll_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = PollWriter()
+        return _writer
+
+def replayed_polls(rows, areas=250, zips_per_area=2, polls_per_hour=4,
+                   revise_share=0.1, late_share=0.05, seed=0):
+    # (polled_at, entries) in delivery order, about `rows` entries in all.
+    # Every ZIP of an area sees the same readings, each poll repeats the
+    # hour so far, some polls revise a reading and some arrive an hour late.
+    import random
+
+    rng = random.Random(seed)
+    parameters = ["PM2.5", "PM10", "O3", "NO2"]
+    per_hour = areas * zips_per_area * polls_per_hour * len(parameters)
+    hours = max(1, -(-rows // per_hour))
+    start = date(2026, 1, 1).toordinal()
+    values = {}
+    late = []
+    for hour_index in range(hours):
+        day, hour = divmod(hour_index, 24)
+        observed_date = date.fromordinal(start + day).isoformat() + " "
+        on_time = []
+        for poll in range(polls_per_hour):
+            polled_at = 1_767_225_600 + hour_index * 3600 + poll * 3600 / polls_per_hour
+            for area in range(areas):
+                entries = []
+                for parameter in parameters:
+                    identity = (area, parameter, hour_index)
+                    aqi = values.get(identity)
+                    if aqi is None or rng.random() < revise_share:
+                        aqi = values[identity] = rng.randint(0, 200)
+                    entries.append({
+                        "DateObserved": observed_date, "HourObserved": hour, "LocalTimeZone": "MST",
+                        "ReportingArea": f"Area {area}", "StateCode": "CO",
+                        "Latitude": 37 + area % 40 * 0.1, "Longitude": -109 + area // 40 * 0.1,
+                        "ParameterName": parameter, "AQI": aqi,
+                        "Category": {"Number": 1 + min(aqi, 300) // 50, "Name": ""},
+                    })
+                for _ in range(zips_per_area):
+                    (late if rng.random() < late_share else on_time).append((polled_at, entries))
+        yield from on_time
+        # Late polls from the previous hour turn up after this hour's
+        if hour_index:
+            yield from late_before
+        late_before, late = late, []
+    yield from late_before
+
+def bench(rows, batch_rows=FLUSH_ROWS, store_path=None):
+    # Replays polls through ingest_polls in batches like PollWriter's and
+    # checks the result against the latest poll of every reading
+    directory = None
+    if store_path is None:
+        directory = tempfile.mkdtemp()
+        store_path = os.path.join(directory, "polls.sqlite3")
+    polls = list(replayed_polls(rows))
+    entries = sum(len(poll_entries) for _, poll_entries in polls)
+    expected = {row[0]: row for row in latest_rows(polls)}
+
+    conn = store.connect(store_path)
+    written = 0
+    started = time.perf_counter()
+    batch, pending = [], 0
+    for poll in polls:
+        batch.append(poll)
+        pending += len(poll[1])
+        if pending >= batch_rows:
+            written += ingest_polls(conn, batch)[1]
+            batch, pending = [], 0
+    if batch:
+        written += ingest_polls(conn, batch)[1]
+    seconds = time.perf_counter() - started
+
+    stored = {row[0]: (row[9], row[10]) for row in conn.execute(
+        f"SELECT {', '.join(store.POLLED_FIELDS)} FROM polled_observations")}
+    revisions = conn.execute("SELECT SUM(revisions) FROM polled_observations").fetchone()[0] or 0
+    conn.close()
+    size = os.path.getsize(store_path)
+    if directory is not None:
+        import shutil
+
+        shutil.rmtree(directory, ignore_errors=True)
+    correct = stored == {key: (row[9], row[10]) for key, row in expected.items()}
+    return {"entries": entries, "seconds": seconds, "written": written, "stored": len(stored),
+            "revisions": revisions, "bytes": size, "correct": correct}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Idempotent ingest of polled AirNow observations")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-rows", type=int, default=FLUSH_ROWS)
+    args = parser.parse_args()
+
+    result = bench(args.rows, args.batch_rows)
+    print(f"{result['entries']:,} polled entries in {result['seconds']:.2f} s "
+          f"({result['entries'] / result['seconds']:,.0f} entries/s)")
+    print(f"{result['stored']:,} readings stored ({result['entries'] / result['stored']:.1f}x fewer rows than "
+          f"appending), {result['written']:,} rows written, {result['revisions']:,} revisions, "
+          f"{result['bytes'] / 1024 ** 2:.1f} MiB")
+    print("latest poll wins for every reading" if result["correct"] else "MISMATCH against the latest polls")
+    if not result["correct"]:
+        sys.exit(1)
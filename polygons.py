@@ -0,0 +1,209 @@
+# polygons.py
+#
+# ZIP (ZCTA) boundary pipeline for the choropleth map. Full-resolution ZCTA
+# GeoJSON is simplified offline into a few zoom levels, quantized onto a 16-bit
+# grid, delta-encoded and zlib-compressed, so the app only ever decodes the
+# small level the current view needs. The tile server (tiles.py) serves each
+# level as static GeoJSON under a versioned URL, so browsers fetch the
+# geometry once and each data refresh only sends per-ZIP values.
+#
+#   python polygons.py build tl_2020_us_zcta520.geojson
+import json
+import os
+import sys
+import tempfile
+import zlib
+from array import array
+from functools import lru_cache
+
+from config import DATA_DIR
+
+# Douglas-Peucker tolerance in degrees per level, and the max zoom each serves
+POLYGON_LEVELS = {
+    "low": (0.01, 7),
+    "mid": (0.003, 9),
+    "high": (0.0008, 22),
+}
+QUANTIZATION = 65535
+ZIP_PROPERTIES = ("ZCTA5CE20", "ZCTA5CE10", "GEOID20", "GEOID10", "zip")
+
+def level_path(level):
+    return os.path.join(DATA_DIR, f"zcta_polygons_{level}.bin")
+
+def level_for_zoom(zoom):
+    for level, (_, max_zoom) in POLYGON_LEVELS.items():
+        if zoom <= max_zoom:
+            return level
+    return "high"
+
+def available_levels():
+    return [level for level in POLYGON_LEVELS if os.path.exists(level_path(level))]
+
+def simplify_ring(points, tolerance):
+    # Iterative Douglas-Peucker; returns None when the ring collapses
+    if len(points) <= 4:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance * tolerance
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        ax, ay = points[start]
+        bx, by = points[end]
+        dx, dy = bx - ax, by - ay
+        norm = dx * dx + dy * dy
+        max_dist, index = -1.0, None
+        for i in range(start + 1, end):
+            px, py = points[i]
+            t = 0.0 if norm == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / norm))
+            dist = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if index is not None and max_dist > tolerance_sq:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    simplified = [point for point, kept in zip(points, keep) if kept]
+    return simplified if len(simplified) >= 4 else None
+
+def read_zcta_geojson(path, zip_filter=None):
+    with open(path, encoding="utf-8") as f:
+        collection = json.load(f)
+    for feature in collection["features"]:
+        properties = feature.get("properties") or {}
+        zip_code = next((str(properties[key]) for key in ZIP_PROPERTIES if key in properties), None)
+        if zip_code is None or (zip_filter and zip_code not in zip_filter):
+            continue
+        geometry = feature["geometry"]
+        if geometry["type"] == "Polygon":
+            yield zip_code, [geometry["coordinates"]]
+        elif geometry["type"] == "MultiPolygon":
+            yield zip_code, geometry["coordinates"]
+
+def encode_level(features, tolerance):
+    xs = [x for _, polygons in features for polygon in polygons for ring in polygon for x, _ in ring]
+    ys = [y for _, polygons in features for polygon in polygons for ring in polygon for _, y in ring]
+    bbox = [min(xs), min(ys), max(xs), max(ys)]
+    scale_x = QUANTIZATION / ((bbox[2] - bbox[0]) or 1)
+    scale_y = QUANTIZATION / ((bbox[3] - bbox[1]) or 1)
+
+    def quantize(ring):
+        simplified = simplify_ring(ring, tolerance)
+        if simplified is None:
+            return None
+        quantized = []
+        for x, y in simplified:
+            point = (round((x - bbox[0]) * scale_x), round((y - bbox[1]) * scale_y))
+            if not quantized or quantized[-1] != point:
+                quantized.append(point)
+        return quantized if len(quantized) >= 4 else None
+
+    deltas = array("i")
+    header_features = []
+    last_x = last_y = 0
+    for zip_code, polygons in features:
+        polygon_rings = []
+        for polygon in polygons:
+            rings = [quantize(ring) for ring in polygon]
+            # A polygon whose outer ring collapsed is dropped along with its holes
+            if rings[0] is None:
+                continue
+            ring_lengths = []
+            for ring in rings:
+                if ring is None:
+                    continue
+                for qx, qy in ring:
+                    deltas.append(qx - last_x)
+                    deltas.append(qy - last_y)
+                    last_x, last_y = qx, qy
+                ring_lengths.append(len(ring))
+            polygon_rings.append(ring_lengths)
+        if polygon_rings:
+            header_features.append([zip_code, polygon_rings])
+
+    header = {"version": 1, "bbox": bbox, "quantization": QUANTIZATION, "tolerance": tolerance,
+              "features": header_features}
+    return json.dumps(header, separators=(",", ":")).encode("utf-8") + b"\n" + zlib.compress(deltas.tobytes(), 9)
+
+def build_levels(geojson_path, zip_filter=None):
+    features = list(read_zcta_geojson(geojson_path, zip_filter))
+    sizes = {}
+    for level, (tolerance, _) in POLYGON_LEVELS.items():
+        payload = encode_level(features, tolerance)
+        path = level_path(level)
+        # A private temp file, so concurrent builds never write into each other's
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".polygons-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        sizes[level] = len(payload)
+    return len(features), sizes
+
+def level_version(level):
+    # Changes whenever the level is rebuilt; part of the geometry URL
+    stat = os.stat(level_path(level))
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+@lru_cache(maxsize=len(POLYGON_LEVELS))
+def level_geojson(level, version):
+    # Gzipped GeoJSON for the tile server. Feature i is shape i of
+    # load_level(level), which is how the map joins each refresh's values.
+    import gzip
+
+    features = [
+        {"type": "Feature", "properties": {"i": i, "zip": zip_code},
+         "geometry": {"type": "MultiPolygon", "coordinates": polygons}}
+        for i, (zip_code, polygons) in enumerate(load_level(level, version))
+    ]
+    body = json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":"))
+    return gzip.compress(body.encode("utf-8"), 6)
+
+@lru_cache(maxsize=len(POLYGON_LEVELS))
+def load_level(level, version=None):
+    # Decoded once per process (and per version, when given); returns
+    # ((zip, [polygon rings...]), ...)
+    with open(level_path(level), "rb") as f:
+        header_line, compressed = f.read().split(b"\n", 1)
+    header = json.loads(header_line)
+    deltas = array("i")
+    deltas.frombytes(zlib.decompress(compressed))
+
+    x0, y0, x1, y1 = header["bbox"]
+    step_x = (x1 - x0) / header["quantization"]
+    step_y = (y1 - y0) / header["quantization"]
+
+    features = []
+    position = 0
+    qx = qy = 0
+    for zip_code, polygon_rings in header["features"]:
+        polygons = []
+        for ring_lengths in polygon_rings:
+            rings = []
+            for length in ring_lengths:
+                ring = []
+                for _ in range(length):
+                    qx += deltas[position]
+                    qy += deltas[position + 1]
+                    position += 2
+                    ring.append([round(x0 + qx * step_x, 5), round(y0 + qy * step_y, 5)])
+                rings.append(ring)
+            polygons.append(rings)
+        features.append((zip_code, polygons))
+    return tuple(features)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "build":
+        from geodata import zip_codes
+
+        count, sizes = build_levels(sys.argv[2], zip_filter=set(zip_codes()))
+        print(f"Simplified {count} ZCTAs: " + ", ".join(f"{level} {size / 1024:.0f} KiB" for level, size in sizes.items()))
+    else:
+        print("usage: python polygons.py build ZCTA.geojson")
@@ -0,0 +1,83 @@
+# profile_imports.py
+#
+# Cold-start import profile built from `python -X importtime`.
+#
+#   python profile_imports.py                      # top imports for the app modules
+#   python profile_imports.py --budget             # exit 1 if cold start exceeds IMPORT_BUDGET_MS
+#   python profile_imports.py --budget-ms 150      # or a budget of your own
+#   python profile_imports.py data_loader --top 10
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from config import IMPORT_BUDGET_MS
+
+DEFAULT_MODULES = ["config", "metrics", "data_loader", "visualizations"]
+
+def run_importtime(modules):
+    # A fresh interpreter per run so nothing is already in sys.modules
+    code = "; ".join(f"import {name}" for name in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        # The app modules live next to this script, wherever it is run from
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return result.stderr
+
+def parse_importtime(output):
+    # Lines look like: "import time:       512 |       1375 |   pandas.core"
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.rstrip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+    return rows
+
+def profile(modules, repeat):
+    runs = [parse_importtime(run_importtime(modules)) for _ in range(repeat)]
+    # Median per module across runs keeps the profile stable between runs
+    cumulative = {}
+    for rows in runs:
+        for row in rows:
+            if row["depth"] == 0:
+                cumulative.setdefault(row["module"], []).append(row["cumulative_us"])
+    per_module = {name: statistics.median(values) for name, values in cumulative.items()}
+    total_us = statistics.median(sum(r["cumulative_us"] for r in rows if r["depth"] == 0) for rows in runs)
+    return per_module, total_us
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile cold-start import time")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if the median cold-start import time is above this")
+    parser.add_argument("--budget", action="store_const", const=IMPORT_BUDGET_MS, dest="budget_ms",
+                        help=f"the same with the configured budget ({IMPORT_BUDGET_MS:.0f} ms)")
+    args = parser.parse_args()
+
+    per_module, total_us = profile(args.modules, args.repeat)
+
+    print(f"{'cumulative ms':>14}  module")
+    for name, value in sorted(per_module.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{value / 1000:>14.1f}  {name}")
+    print(f"{total_us / 1000:>14.1f}  TOTAL ({', '.join(args.modules)})")
+
+    if args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+        print(f"Cold-start import time {total_us / 1000:.1f} ms exceeds budget of {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
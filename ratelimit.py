@@ -0,0 +1,163 @@
+# ratelimit.py
+#
+# Token bucket for the AirNow hourly request quota. Interactive fetches (a
+# user waiting on the page) may spend every token; background work (refresh,
+# backfill) may only spend tokens above a reserve and yields to any waiting
+# interactive fetch, so a backfill can never starve the dashboard.
+#
+# The bucket lives in process memory by default. With a path it is kept in a
+# small SQLite table instead, so every worker process on the host draws from
+# the same quota, and interactive callers waiting in any process hold back
+# background work in all of them.
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import inc, set_gauge
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# An interactive waiter's row outlives a crashed process by at most this;
+# live waiters refresh it at least once a second
+WAITER_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL);
+CREATE TABLE IF NOT EXISTS waiters (id TEXT PRIMARY KEY, bucket TEXT, expires REAL);
+"""
+
+# Shared-bucket transactions from coroutines run here, off the event loop
+_db_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="quota-db")
+
+class RateLimited(Exception):
+    pass
+
+class TokenBucket:
+    def __init__(self, name, capacity, refill_per_second, reserve=0.0, path=None, clock=time.time):
+        self.name = name
+        self.capacity = float(capacity)
+        self.refill_per_second = refill_per_second
+        # Tokens only interactive callers may spend
+        self.reserve = reserve
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.interactive_waiters = 0
+        self.tokens = self.capacity
+        self.updated = clock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._connect() as conn:
+                conn.executescript(SCHEMA)
+                conn.execute("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?)", (name, self.capacity, self.updated))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _refilled(self, tokens, updated, now):
+        return min(self.capacity, tokens + max(0.0, now - updated) * self.refill_per_second)
+
+    def _update(self, change, waiter=None):
+        # change(tokens, interactive waiters) -> (new tokens, result); applied
+        # atomically to the in-memory or shared bucket after refilling it.
+        # waiter: an interactive caller's id to (re)register in the shared table.
+        with self.lock:
+            now = self.clock()
+            if not self.path:
+                tokens, result = change(self._refilled(self.tokens, self.updated, now), self.interactive_waiters)
+                self.tokens, self.updated = tokens, now
+            else:
+                conn = self._connect()
+                try:
+                    # BEGIN IMMEDIATE takes the write lock up front, so two
+                    # processes can't both spend the same token
+                    conn.execute("BEGIN IMMEDIATE")
+                    if waiter is not None:
+                        conn.execute("INSERT OR REPLACE INTO waiters VALUES (?, ?, ?)",
+                                     (waiter, self.name, now + WAITER_SECONDS))
+                    # Waiters of every process count; a crashed one's row expires
+                    conn.execute("DELETE FROM waiters WHERE bucket = ? AND expires <= ?", (self.name, now))
+                    waiters = conn.execute("SELECT COUNT(*) FROM waiters WHERE bucket = ?", (self.name,)).fetchone()[0]
+                    stored, updated = conn.execute(
+                        "SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)
+                    ).fetchone()
+                    tokens, result = change(self._refilled(stored, updated, now), waiters)
+                    conn.execute("UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?", (tokens, now, self.name))
+                    conn.execute("COMMIT")
+                finally:
+                    conn.close()
+        set_gauge("aq_quota_tokens", {"upstream": self.name}, tokens)
+        return result
+
+    def try_acquire(self, priority=INTERACTIVE, amount=1, waiter=None):
+        # Returns 0 when granted, otherwise seconds until a retry could succeed
+        floor = 0.0 if priority == INTERACTIVE else self.reserve
+
+        def take(tokens, interactive_waiters):
+            if priority != INTERACTIVE and interactive_waiters:
+                return tokens, 1.0 / self.refill_per_second
+            if tokens - amount >= floor:
+                return tokens - amount, 0.0
+            return tokens, (floor + amount - tokens) / self.refill_per_second
+        return self._update(take, waiter)
+
+    def _remove_waiter(self, waiter):
+        with self.lock:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+            finally:
+                conn.close()
+
+    async def _call(self, func, *args):
+        # The shared bucket's SQLite transactions block, so they run off the loop
+        if not self.path:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(_db_executor, func, *args)
+
+    async def acquire(self, priority=INTERACTIVE, timeout=None, amount=1):
+        # Waits for a token; raises RateLimited if none arrives within timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiter = None
+        if priority == INTERACTIVE:
+            if self.path:
+                # Registered (and kept alive) by each try_acquire below
+                waiter = f"{os.getpid()}-{uuid.uuid4().hex}"
+            else:
+                with self.lock:
+                    self.interactive_waiters += 1
+        try:
+            while True:
+                wait = await self._call(self.try_acquire, priority, amount, waiter)
+                if wait == 0:
+                    inc("aq_quota_requests_total", {"upstream": self.name, "priority": priority, "result": "granted"})
+                    return
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    inc("aq_quota_requests_total", {"upstream": self.name, "priority": priority, "result": "denied"})
+                    raise RateLimited(f"{self.name} quota exhausted, next token in {wait:.0f} s")
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            if priority == INTERACTIVE:
+                if waiter is not None:
+                    await self._call(self._remove_waiter, waiter)
+                else:
+                    with self.lock:
+                        self.interactive_waiters -= 1
+
+    def refund(self, amount=1):
+        # Gives back tokens for a call that never reached the upstream
+        self._update(lambda tokens, _: (min(self.capacity, tokens + amount), None))
+
+    async def refund_async(self, amount=1):
+        # refund() for coroutines on the event loop
+        await self._call(self.refund, amount)
+
+    def remaining(self):
+        return self._update(lambda tokens, _: (tokens, tokens))
@@ -0,0 +1,12 @@
+# rss.py
+#
+# Peak resident memory of this process, for the --rss reports of the bulk
+# tools (ingest.py, export.py).
+import sys
+
+def peak_rss_mb():
+    import resource
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
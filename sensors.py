@@ -0,0 +1,329 @@
+# sensors.py
+#
+# Low-cost PM2.5 sensors (PurpleAir) to fill in the map between AirNow's
+# regulatory monitors. Readings come from local PurpleAir-format CSV or JSON
+# files in SENSOR_DIR; each file is read into columns and processed with numpy
+# in one pass: A/B channel QA, the EPA US-wide correction for humidity (with
+# its high-concentration extension for smoke), then hourly means per sensor.
+# The latest hour of each sensor becomes a map point next to the monitors.
+#
+#   python sensors.py synth data/sensors/sample.csv --sensors 2000 --days 7
+#   python sensors.py process data/sensors/*.csv     # hourly summary + timing
+import glob
+import json
+import os
+import sys
+import time
+from functools import lru_cache
+
+from config import POLLUTANTS, SENSOR_DIR
+
+# PurpleAir API field names; any alias found in a file is used
+TIME_FIELDS = ("time_stamp", "last_seen")
+SENSOR_FIELDS = ("sensor_index",)
+CHANNEL_A_FIELDS = ("pm2.5_cf_1_a",)
+CHANNEL_B_FIELDS = ("pm2.5_cf_1_b",)
+HUMIDITY_FIELDS = ("humidity", "humidity_a")
+LAT_FIELDS = ("latitude",)
+LON_FIELDS = ("longitude",)
+
+# Channels agreeing within 5 ug/m3 or 70% (relative to their mean) pass QA
+QA_MAX_DIFF = 5.0
+QA_MAX_RELATIVE_DIFF = 0.7
+# Above this the optical counters saturate
+MAX_CF1 = 1000.0
+MIN_READINGS_PER_HOUR = 1
+# Sensors whose last hour is older than this, relative to the newest hour in
+# the data, are left off the map
+MAX_SENSOR_AGE_HOURS = 2
+
+# 2024 PM2.5 AQI breakpoints: concentration (ug/m3) and index bounds
+PM25_LOW = [0.0, 9.1, 35.5, 55.5, 125.5, 225.5]
+PM25_HIGH = [9.0, 35.4, 55.4, 125.4, 225.4, 325.4]
+AQI_LOW = [0, 51, 101, 151, 201, 301]
+AQI_HIGH = [50, 100, 150, 200, 300, 500]
+
+def _pick(names, fields, required=True):
+    for field in fields:
+        if field in names:
+            return field
+    if required:
+        raise ValueError(f"missing column, expected one of {', '.join(fields)}")
+    return None
+
+def _columns(table, names):
+    # table: mapping of field name -> sequence. Returns the typed columns the
+    # pipeline uses.
+    import numpy as np
+    import pandas as pd
+
+    times = pd.Series(table[_pick(names, TIME_FIELDS)])
+    if pd.api.types.is_numeric_dtype(times):
+        seconds = times.to_numpy(np.int64)
+    else:
+        seconds = pd.to_datetime(times, utc=True).to_numpy("datetime64[s]").astype(np.int64)
+    return {
+        "sensor": np.asarray(table[_pick(names, SENSOR_FIELDS)]).astype(np.int64),
+        "time": seconds,
+        "a": np.asarray(table[_pick(names, CHANNEL_A_FIELDS)], dtype=np.float64),
+        "b": np.asarray(table[_pick(names, CHANNEL_B_FIELDS)], dtype=np.float64),
+        "humidity": np.asarray(table[_pick(names, HUMIDITY_FIELDS)], dtype=np.float64),
+        "lat": np.asarray(table[_pick(names, LAT_FIELDS)], dtype=np.float64),
+        "lon": np.asarray(table[_pick(names, LON_FIELDS)], dtype=np.float64),
+    }
+
+def read_readings(path):
+    # CSV with a header row, or JSON: the API's {"fields": [...], "data":
+    # [[...], ...]} or a list of records
+    import pandas as pd
+
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if isinstance(payload, dict):
+            names = payload["fields"]
+            rows = payload["data"]
+            return _columns({name: [row[i] for row in rows] for i, name in enumerate(names)}, names)
+        frame = pd.DataFrame(payload)
+        return _columns(frame, set(frame.columns))
+
+    names = pd.read_csv(path, nrows=0).columns
+    wanted = [_pick(names, fields, required=False) for fields in
+              (TIME_FIELDS, SENSOR_FIELDS, CHANNEL_A_FIELDS, CHANNEL_B_FIELDS, HUMIDITY_FIELDS,
+               LAT_FIELDS, LON_FIELDS)]
+    frame = pd.read_csv(path, usecols=[name for name in wanted if name], engine="c")
+    return _columns(frame, set(frame.columns))
+
+def qa_mask(a, b):
+    # Both channels present, in range, and agreeing with each other
+    import numpy as np
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        diff = np.abs(a - b)
+        relative = diff / ((a + b) / 2)
+        return (
+            (a >= 0) & (b >= 0) & (a <= MAX_CF1) & (b <= MAX_CF1)
+            & ((diff <= QA_MAX_DIFF) | (relative <= QA_MAX_RELATIVE_DIFF))
+        )
+
+def epa_correct(pm, humidity):
+    # EPA correction of the A/B mean of pm2.5_cf_1 (Barkjohn et al. 2021),
+    # with the blended high-concentration extension AirNow's Fire and Smoke
+    # map uses above 50 ug/m3
+    import numpy as np
+
+    low = 0.524 * pm - 0.0862 * humidity + 5.75
+    mid = 0.786 * pm - 0.0862 * humidity + 5.75
+    high = 0.69 * pm + 8.84e-4 * pm ** 2 + 2.966
+    # Linear blends across 30-50 and 210-260 ug/m3
+    w1 = np.clip(pm / 20 - 3 / 2, 0, 1)
+    w2 = np.clip(pm / 50 - 21 / 5, 0, 1)
+    corrected = np.where(pm < 50, (1 - w1) * low + w1 * mid, (1 - w2) * mid + w2 * high)
+    return np.maximum(corrected, 0)
+
+def pm25_aqi(concentration):
+    # Vectorized AQI from PM2.5 ug/m3, truncated to 0.1 as the EPA specifies
+    import numpy as np
+
+    c = np.floor(np.asarray(concentration, dtype=np.float64) * 10) / 10
+    i = np.minimum(np.searchsorted(PM25_HIGH, c, side="left"), len(PM25_HIGH) - 1)
+    c_low, c_high = np.take(PM25_LOW, i), np.take(PM25_HIGH, i)
+    aqi_low, aqi_high = np.take(AQI_LOW, i), np.take(AQI_HIGH, i)
+    aqi = aqi_low + (np.minimum(c, c_high) - c_low) * (aqi_high - aqi_low) / (c_high - c_low)
+    return np.rint(aqi).astype(np.int64)
+
+def hourly_means(readings, min_readings=MIN_READINGS_PER_HOUR):
+    # QA + correction per reading, then one row per (sensor, hour). Returns
+    # (columns, stats) with columns sensor, hour (epoch s), pm25, lat, lon,
+    # count, sorted by sensor then hour.
+    import numpy as np
+
+    keep = qa_mask(readings["a"], readings["b"]) & ~np.isnan(readings["humidity"])
+    stats = {"readings": len(keep), "passed_qa": int(keep.sum())}
+    pm = epa_correct((readings["a"][keep] + readings["b"][keep]) / 2, readings["humidity"][keep])
+    sensor = readings["sensor"][keep]
+    hour = readings["time"][keep] // 3600
+
+    # One int64 per (sensor, hour); sensors are factorized so the key stays small
+    sensors, sensor_codes = np.unique(sensor, return_inverse=True)
+    first_hour = hour.min() if len(hour) else 0
+    span = int(hour.max() - first_hour + 1) if len(hour) else 1
+    keys, groups = np.unique(sensor_codes.astype(np.int64) * span + (hour - first_hour), return_inverse=True)
+    count = np.bincount(groups, minlength=len(keys))
+    total = np.bincount(groups, weights=pm, minlength=len(keys))
+    # A sensor's position can change between readings; the hour keeps its last
+    last = np.zeros(len(keys), dtype=np.int64)
+    np.maximum.at(last, groups, np.arange(len(groups)))
+
+    full = count >= min_readings
+    columns = {
+        "sensor": sensors[keys // span][full],
+        "hour": ((keys % span + first_hour) * 3600)[full],
+        "pm25": (total / np.maximum(count, 1))[full],
+        "lat": readings["lat"][keep][last][full],
+        "lon": readings["lon"][keep][last][full],
+        "count": count[full],
+    }
+    stats["hours"] = int(full.sum())
+    stats["sensors"] = len(np.unique(columns["sensor"]))
+    return columns, stats
+
+def process_files(paths, min_readings=MIN_READINGS_PER_HOUR):
+    import numpy as np
+
+    parts = []
+    for path in paths:
+        try:
+            parts.append(read_readings(path))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Skipping sensor file {path}: {e}")
+    if not parts:
+        return None, {"readings": 0, "passed_qa": 0, "hours": 0, "sensors": 0}
+    readings = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    return hourly_means(readings, min_readings)
+
+def _nearest_locations(lat, lon):
+    # Nearest ZIP centroid for each point, in blocks to bound memory
+    import numpy as np
+    from geodata import locations
+
+    places = locations()
+    zip_lat = np.array([place["lat"] for place in places])
+    zip_lon = np.array([place["lon"] for place in places])
+    scale = np.cos(np.radians(39.0)) ** 2
+    nearest = np.empty(len(lat), dtype=np.int64)
+    for start in range(0, len(lat), 4096):
+        block = slice(start, start + 4096)
+        distance = (lat[block, None] - zip_lat) ** 2 + scale * (lon[block, None] - zip_lon) ** 2
+        nearest[block] = distance.argmin(axis=1)
+    return [places[i] for i in nearest.tolist()]
+
+def sensor_points(hourly, max_age_hours=MAX_SENSOR_AGE_HOURS):
+    # Map records in get_map_data()'s shape for each sensor's latest hour
+    import numpy as np
+
+    if hourly is None or not len(hourly["sensor"]):
+        return []
+    # Rows are sorted by sensor then hour, so each sensor's last row is latest
+    last = np.flatnonzero(np.append(hourly["sensor"][1:] != hourly["sensor"][:-1], True))
+    last = last[hourly["hour"][last] >= hourly["hour"].max() - max_age_hours * 3600]
+    aqi = pm25_aqi(hourly["pm25"][last])
+    lat, lon = hourly["lat"][last], hourly["lon"][last]
+    places = _nearest_locations(lat, lon)
+    empty = {pollutant: None for pollutant in POLLUTANTS}
+    return [
+        {
+            "zip": place["zip"],
+            "city": place["city"],
+            "lat": point_lat,
+            "lon": point_lon,
+            "AQI": point_aqi,
+            "Pollutant": "PM2.5",
+            **empty,
+            "PM2.5": point_aqi,
+            "source": "sensor",
+            "sensor": sensor,
+        }
+        for sensor, point_lat, point_lon, point_aqi, place in zip(
+            hourly["sensor"][last].tolist(), lat.tolist(), lon.tolist(), aqi.tolist(), places
+        )
+    ]
+
+def sensor_files(sensor_dir=SENSOR_DIR):
+    return sorted(glob.glob(os.path.join(sensor_dir, "*.csv")) + glob.glob(os.path.join(sensor_dir, "*.json")))
+
+@lru_cache(maxsize=2)
+def _cached_points(signature):
+    hourly, _ = process_files([path for path, _, _ in signature])
+    return tuple(sensor_points(hourly))
+
+def load_sensor_points(sensor_dir=SENSOR_DIR):
+    # Files are only reprocessed when one is added, removed or changed
+    signature = []
+    for path in sensor_files(sensor_dir):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return list(_cached_points(tuple(signature))) if signature else []
+
+def merge_map_data(map_data, points):
+    # Monitors first, so a sensor never hides the monitor it sits next to
+    # when the map keeps one point per cell at equal AQI
+    return list(map_data) + list(points)
+
+def write_synthetic(path, sensors=2000, days=7, interval_minutes=10, seed=0):
+    # PurpleAir-style readings across Colorado: smooth PM2.5 with humidity
+    # bias, plus channel faults for QA to catch. CSV or the API's JSON.
+    import numpy as np
+    import pandas as pd
+
+    from config import COLORADO_BOUNDS
+
+    rng = np.random.default_rng(seed)
+    west, south, east, north = COLORADO_BOUNDS
+    steps = days * 24 * 60 // interval_minutes
+    start = int(pd.Timestamp("2026-10-01", tz="UTC").timestamp())
+    sensor_lat = rng.uniform(south, north, sensors)
+    sensor_lon = rng.uniform(west, east, sensors)
+    base = rng.gamma(2.0, 4.0, sensors)
+
+    times = start + np.arange(steps) * interval_minutes * 60
+    daily = 1 + 0.5 * np.sin(2 * np.pi * (times % 86400) / 86400)
+    true_pm = base[:, None] * daily[None, :] * rng.lognormal(0, 0.2, (sensors, steps))
+    humidity = np.clip(rng.normal(35, 15, (sensors, steps)), 5, 95)
+    # Inverse of the low-range correction, so corrected values land near true_pm
+    cf1 = np.maximum((true_pm + 0.0862 * humidity - 5.75) / 0.524, 0)
+    a = cf1 * rng.normal(1, 0.05, cf1.shape)
+    b = cf1 * rng.normal(1, 0.05, cf1.shape)
+    faulty = rng.random(cf1.shape) < 0.02
+    b[faulty] = b[faulty] * rng.uniform(3, 10, faulty.sum()) + 20
+
+    frame = pd.DataFrame({
+        "time_stamp": np.tile(times, sensors),
+        "sensor_index": np.repeat(100000 + np.arange(sensors), steps),
+        "humidity": humidity.ravel().round(0),
+        "pm2.5_cf_1_a": a.ravel().round(2),
+        "pm2.5_cf_1_b": b.ravel().round(2),
+        "latitude": np.repeat(sensor_lat, steps).round(5),
+        "longitude": np.repeat(sensor_lon, steps).round(5),
+    })
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".json"):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"fields": list(frame.columns), "data": frame.to_numpy().tolist()}, f)
+    else:
+        frame.to_csv(path, index=False)
+    return len(frame)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Low-cost sensor readings for the map")
+    parser.add_argument("command", choices=["synth", "process"])
+    parser.add_argument("paths", nargs="*", help="synth: output file; process: input files (default: SENSOR_DIR)")
+    parser.add_argument("--sensors", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--min-readings", type=int, default=MIN_READINGS_PER_HOUR)
+    args = parser.parse_args()
+
+    if args.command == "synth":
+        if len(args.paths) != 1:
+            parser.error("synth takes one output path")
+        print(f"Wrote {write_synthetic(args.paths[0], args.sensors, args.days):,} readings to {args.paths[0]}")
+        sys.exit(0)
+
+    paths = args.paths or sensor_files()
+    started = time.perf_counter()
+    hourly, stats = process_files(paths, args.min_readings)
+    seconds = time.perf_counter() - started
+    if hourly is None:
+        print("No sensor readings found")
+        sys.exit(1)
+    points = sensor_points(hourly)
+    print(f"{stats['readings']:,} readings from {len(paths)} file(s) in {seconds:.2f} s "
+          f"({stats['readings'] / seconds:,.0f} readings/s)")
+    print(f"{stats['passed_qa']:,} passed A/B QA ({stats['passed_qa'] / max(stats['readings'], 1):.1%}), "
+          f"{stats['hours']:,} sensor-hours from {stats['sensors']:,} sensors")
+    print(f"{len(points):,} sensors on the map, median AQI {sorted(p['AQI'] for p in points)[len(points) // 2]}")
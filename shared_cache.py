@@ -0,0 +1,187 @@
+# shared_cache.py
+#
+# Cross-process cache for data_loader results, for running several Streamlit
+# processes on one host. Entries live in a SQLite database in WAL mode with an
+# expiry time. When an entry is missing or expired, one process takes a short
+# refresh lease and recomputes it while the others keep serving the previous
+# value (or wait for the first one), so N processes cost one upstream fetch.
+# The new value replaces the old in a single transaction, so readers never see
+# a partial refresh.
+#
+#   AQ_SHARED_CACHE=data/shared_cache.sqlite3 streamlit run app.py --server.port 8501
+#   python shared_cache.py check --workers 8      # multiprocessing self-check
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+
+from config import SHARED_CACHE_PATH
+
+# How long a refresh may run before another process may take over
+LEASE_SECONDS = 30
+WAIT_POLL_SECONDS = 0.05
+# Expired entries are kept this long for stale fallbacks before being purged
+KEEP_EXPIRED_SECONDS = 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    stored_at REAL,
+    expires REAL,
+    lease_until REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+class SharedCache:
+    def __init__(self, path, lease_seconds=LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn().executescript(SCHEMA)
+
+    def conn(self):
+        # SQLite connections can't be shared across threads; keep one per thread
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key, allow_expired=False):
+        # Returns (value, stored_at) or None
+        row = self.conn().execute(
+            "SELECT value, stored_at, expires FROM entries WHERE key = ? AND value IS NOT NULL", (key,)
+        ).fetchone()
+        if row is None or (not allow_expired and row[2] <= time.time()):
+            return None
+        return pickle.loads(row[0]), row[1]
+
+    def _take_lease(self, key):
+        conn = self.conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT expires, lease_until FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] is not None and row[0] > now:
+                # Someone refreshed it while we were waiting for the lock
+                conn.execute("COMMIT")
+                return False
+            if row is not None and row[1] > now:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT INTO entries (key, lease_until) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET lease_until = excluded.lease_until",
+                (key, now + self.lease_seconds),
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _store(self, key, value, ttl):
+        now = time.time()
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at, expires, lease_until) VALUES (?, ?, ?, ?, 0)",
+                (key, payload, now, now + ttl),
+            )
+            conn.execute("DELETE FROM entries WHERE expires < ?", (now - KEEP_EXPIRED_SECONDS,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release(self, key):
+        self.conn().execute("UPDATE entries SET lease_until = 0 WHERE key = ?", (key,))
+
+    def get_or_compute(self, key, ttl, compute):
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                return cached[0]
+            if self._take_lease(key):
+                try:
+                    value = compute()
+                except BaseException:
+                    # Failures aren't cached; the next caller tries again
+                    self._release(key)
+                    raise
+                self._store(key, value, ttl)
+                return value
+            # Another process is refreshing: serve its previous value if there
+            # is one, otherwise wait for the fresh one
+            previous = self.get(key, allow_expired=True)
+            if previous is not None:
+                return previous[0]
+            time.sleep(WAIT_POLL_SECONDS)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_shared_cache():
+    # None unless AQ_SHARED_CACHE is set
+    global _cache
+    if SHARED_CACHE_PATH is None:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SharedCache(SHARED_CACHE_PATH)
+        return _cache
+
+def _check_worker(path, rounds, ttl, computes, start):
+    cache = SharedCache(path)
+
+    def compute():
+        with computes.get_lock():
+            computes.value += 1
+        time.sleep(0.2)  # a slow upstream fetch
+        return {"fetched_at": time.time()}
+
+    start.wait()
+    for _ in range(rounds):
+        cache.get_or_compute("check", ttl, compute)
+        time.sleep(ttl)
+
+def check(workers, rounds, ttl=0.5):
+    # Starts `workers` processes hitting the same key for `rounds` TTL periods
+    import multiprocessing
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), "shared_cache_check.sqlite3")
+    computes = multiprocessing.Value("i", 0)
+    start = multiprocessing.Event()
+    processes = [
+        multiprocessing.Process(target=_check_worker, args=(path, rounds, ttl, computes, start))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    start.set()
+    for process in processes:
+        process.join()
+    return workers * rounds, computes.value
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["check"]:
+        import argparse
+
+        parser = argparse.ArgumentParser(description="Check that N processes share one fetch per TTL")
+        parser.add_argument("command")
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--rounds", type=int, default=3)
+        args = parser.parse_args()
+        calls, computes = check(args.workers, args.rounds)
+        print(f"{args.workers} processes x {args.rounds} rounds: {calls} lookups, {computes} upstream fetches")
+        sys.exit(0 if computes <= args.rounds + 1 else 1)
+    print("usage: python shared_cache.py check [--workers N] [--rounds N]")
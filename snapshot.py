@@ -0,0 +1,246 @@
+# snapshot.py
+#
+# Prerendered landing page. Most visitors only look at the hero, the map and
+# the rankings, so once per data refresh those are rendered into a static
+# bundle (index.html, map.html, data.json) and served from disk; only visitors
+# who follow the "look up your ZIP" link start a Streamlit session. Each build
+# goes into its own directory and a "current" symlink is swapped to it, so a
+# visitor never sees half of an update.
+#
+#   python snapshot.py build                  # once, e.g. from cron
+#   python snapshot.py serve [--port 8504]    # serve and rebuild every refresh
+#   python snapshot.py bench --visitors 200   # server CPU per visitor vs live
+import html
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from config import DATA_REFRESH_SECONDS, LIVE_APP_URL, SNAPSHOT_DIR, SNAPSHOT_PORT
+
+# Builds kept besides the current one, for visitors still loading the last one
+KEEP_BUILDS = 2
+
+SNAPSHOT_CSS = """
+<style>
+    body { margin: 0 auto; max-width: 1200px; padding: 0 1.5rem; background: #fff; }
+    .snapshot-map { width: 100%; height: 520px; border: 0; border-radius: 10px; }
+    .ranking-columns { display: grid; grid-template-columns: 1fr 1fr; gap: 1.5rem; }
+    .live-cta { text-align: center; margin: 2rem 0; }
+    .snapshot-note { text-align: center; color: #6b7280; font-size: 0.85rem; margin-bottom: 2rem; }
+    @media (max-width: 768px) { .ranking-columns { grid-template-columns: 1fr; } }
+</style>
+"""
+
+def render_page(map_data, generated_at, live_url=LIVE_APP_URL):
+    import pandas as pd
+    from layout import HEADER_HTML, HERO_HTML, PAGE_CSS, STATS_HTML
+    from visualizations import AQI_LEGEND_HTML, RANKING_CSS, build_rankings_html
+
+    df = pd.DataFrame(map_data)
+    if df.empty:
+        rankings = '<p class="map-subtitle">No data available for rankings.</p>'
+    else:
+        polluted_html, cleanest_html = build_rankings_html(df)
+        rankings = f'<div class="ranking-columns"><div>{polluted_html}</div><div>{cleanest_html}</div></div>'
+    updated = generated_at.astimezone().strftime("%b %d, %H:%M")
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Colorado Air & Asthma Tracker</title>
+{PAGE_CSS}{RANKING_CSS}{SNAPSHOT_CSS}
+</head>
+<body>
+{HEADER_HTML}{HERO_HTML}{STATS_HTML}
+<div id="data"></div>
+<h2 class="section-title">Colorado Air Quality Map</h2>
+<div class="map-subtitle-container"><p class="map-subtitle">Air quality levels across Colorado. Larger circles indicate higher pollution levels. Color indicates AQI category.</p></div>
+<iframe class="snapshot-map" src="map.html" title="Colorado air quality map"></iframe>
+{AQI_LEGEND_HTML}
+<h2 class="section-title">Air Quality Rankings</h2>
+<div class="map-subtitle-container"><p class="map-subtitle">Comparison of the most polluted and cleanest cities in Colorado based on current air quality data.</p></div>
+{rankings}
+<div class="live-cta"><a class="hero-button" href="{html.escape(live_url)}">Look up your ZIP code</a></div>
+<p class="snapshot-note">Updated {updated}</p>
+</body>
+</html>
+"""
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def build_snapshot(snapshot_dir=SNAPSHOT_DIR, map_data=None):
+    # Renders a new bundle and makes it current; returns its directory
+    import pydeck as pdk
+    from data_loader import get_map_data
+    from visualizations import build_aqi_deck
+
+    if map_data is None:
+        map_data = get_map_data()
+    generated_at = datetime.now(timezone.utc)
+    build_dir = os.path.join(snapshot_dir, f"build-{generated_at:%Y%m%d%H%M%S}-{os.getpid()}")
+    os.makedirs(build_dir)
+
+    _write(os.path.join(build_dir, "index.html"), render_page(map_data, generated_at))
+    # No Mapbox token outside Streamlit, so the static map uses the Carto basemap
+    deck = build_aqi_deck(map_data, map_style=pdk.map_styles.LIGHT) if map_data else None
+    _write(os.path.join(build_dir, "map.html"), deck.to_html(as_string=True) if deck else "")
+    ranked = sorted(map_data, key=lambda record: record["AQI"])
+    _write(os.path.join(build_dir, "data.json"), json.dumps({
+        "generated_at": generated_at.isoformat(),
+        "map": map_data,
+        "rankings": {"most_polluted": ranked[::-1][:10], "cleanest": ranked[:10]},
+    }, separators=(",", ":")))
+
+    # Swap the symlink in one rename, then drop builds nobody is loading
+    current = os.path.join(snapshot_dir, "current")
+    link = f"{current}.{os.getpid()}.tmp"
+    os.symlink(os.path.basename(build_dir), link)
+    os.replace(link, current)
+    builds = sorted(name for name in os.listdir(snapshot_dir) if name.startswith("build-"))
+    for name in builds[:-(KEEP_BUILDS + 1)]:
+        shutil.rmtree(os.path.join(snapshot_dir, name), ignore_errors=True)
+    return build_dir
+
+class SnapshotHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def end_headers(self):
+        # Browsers and any CDN in front may reuse a bundle until the next refresh
+        self.send_header("Cache-Control", f"public, max-age={DATA_REFRESH_SECONDS // 4}")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def _rebuild_loop(snapshot_dir):
+    while True:
+        time.sleep(DATA_REFRESH_SECONDS - time.time() % DATA_REFRESH_SECONDS)
+        try:
+            build_snapshot(snapshot_dir)
+        except Exception as e:
+            # Keep serving the previous bundle
+            print("Error building snapshot:", e)
+
+def serve(port=SNAPSHOT_PORT, snapshot_dir=SNAPSHOT_DIR, rebuild=True):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    if rebuild or not os.path.exists(os.path.join(snapshot_dir, "current")):
+        build_snapshot(snapshot_dir)
+    if rebuild:
+        threading.Thread(target=_rebuild_loop, args=(snapshot_dir,), daemon=True).start()
+    # "current" is resolved per request, so a swap takes effect immediately
+    handler = partial(SnapshotHandler, directory=os.path.join(snapshot_dir, "current"))
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    server.daemon_threads = True
+    print(f"Snapshot served on http://localhost:{port}")
+    server.serve_forever()
+
+def _cpu_seconds(pid):
+    # user + system CPU of another process (Linux)
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def _live_visitors(visitors, result):
+    # Runs in a spawned process so config picks up the mock AirNow URL. One
+    # warm-up session fills the caches; the rest are measured like real
+    # visitors who load the page and leave.
+    from streamlit.testing.v1 import AppTest
+
+    AppTest.from_file("app.py", default_timeout=120).run()
+    started = time.process_time()
+    for _ in range(visitors):
+        AppTest.from_file("app.py", default_timeout=120).run()
+    result.put(time.process_time() - started)
+
+def bench(visitors):
+    import http.client
+    import multiprocessing
+    import socket
+    import subprocess
+    import tempfile
+
+    from mock_airnow import start_mock_server
+
+    mock = start_mock_server()
+    os.environ["AIRNOW_BASE_URL"] = mock.base_url
+    os.environ.setdefault("AQ_AIRNOW_QUOTA", "1000000000")
+
+    # Live: every visitor is a full script run
+    context = multiprocessing.get_context("spawn")
+    result = context.Queue()
+    live_visitors = max(1, visitors // 10)
+    process = context.Process(target=_live_visitors, args=(live_visitors, result))
+    process.start()
+    live_cpu = result.get() / live_visitors
+    process.join()
+
+    # Snapshot: every visitor is two static files from the server process
+    snapshot_dir = tempfile.mkdtemp()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, __file__, "serve", "--port", str(port), "--dir", snapshot_dir])
+    try:
+        for _ in range(300):
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/")
+                response = conn.getresponse()
+                response.read()
+                if response.status == 200:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.1)
+        cpu_before = _cpu_seconds(server.pid)
+        sent = 0
+        for _ in range(visitors):
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            for path in ("/", "/map.html"):
+                conn.request("GET", path)
+                response = conn.getresponse()
+                sent += len(response.read())
+            conn.close()
+        snapshot_cpu = (_cpu_seconds(server.pid) - cpu_before) / visitors
+    finally:
+        server.terminate()
+        server.wait()
+        mock.shutdown()
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+    return live_cpu, live_visitors, snapshot_cpu, sent / visitors
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prerendered landing page")
+    parser.add_argument("command", choices=["build", "serve", "bench"])
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--port", type=int, default=SNAPSHOT_PORT)
+    parser.add_argument("--visitors", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        os.makedirs(args.dir, exist_ok=True)
+        print(f"Snapshot written to {build_snapshot(args.dir)}")
+    elif args.command == "serve":
+        try:
+            serve(args.port, args.dir)
+        except KeyboardInterrupt:
+            pass
+    else:
+        live_cpu, live_visitors, snapshot_cpu, page_bytes = bench(args.visitors)
+        print(f"live mode:     {live_cpu * 1000:8.2f} ms server CPU per visitor ({live_visitors} sessions)")
+        print(f"snapshot mode: {snapshot_cpu * 1000:8.2f} ms server CPU per visitor "
+              f"({args.visitors} visitors, {page_bytes / 1024:.0f} KiB each)")
+        if snapshot_cpu > 0:
+            print(f"{live_cpu / snapshot_cpu:,.0f}x less CPU per visitor")
@@ -0,0 +1,127 @@
+# spatial.py
+#
+# Viewport culling for the map. Up to MAX_POINTS points are all sent as they
+# are. Beyond that, monitors are still always sent, and only low-cost sensors
+# (source="sensor", see sensors.py) are culled to a wide margin around the
+# view, since Streamlit never reports the browser's pan and zoom back. If too
+# many sensors remain, they are thinned through a web-mercator cell pyramid to
+# one per screen cell, so detail increases as the user zooms. Per-tile results
+# are cached, so panning back to a tile is free.
+import math
+import threading
+from collections import OrderedDict
+
+INDEX_ZOOM = 12
+# Keep one point per 1/2**CELL_BITS of a tile (~32 px at 256 px tiles)
+CELL_BITS = 3
+TILE_SIZE = 256
+MAX_CACHED_TILES = 4096
+# Below this many points nothing is culled or thinned
+MAX_POINTS = 3000
+# Culling keeps sensors within two view widths/heights either side
+# (viewport_bounds grows each side by margin / 2)
+PAN_MARGIN = 4.0
+
+def lonlat_to_tile(lon, lat, zoom):
+    lat = max(min(lat, 85.0511), -85.0511)
+    n = 2 ** zoom
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+def tile_to_lonlat(x, y, zoom):
+    n = 2 ** zoom
+    lon = x / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return lon, lat
+
+def viewport_bounds(lat, lon, zoom, width=1200, height=500, margin=0.25):
+    # (west, south, east, north) of a width x height px view, grown by
+    # margin / 2 view sizes on each side
+    cx, cy = lonlat_to_tile(lon, lat, zoom)
+    half_w = width / TILE_SIZE / 2 * (1 + margin)
+    half_h = height / TILE_SIZE / 2 * (1 + margin)
+    west, north = tile_to_lonlat(cx - half_w, cy - half_h, zoom)
+    east, south = tile_to_lonlat(cx + half_w, cy + half_h, zoom)
+    return west, south, east, north
+
+class SpatialIndex:
+    def __init__(self, points):
+        import numpy as np
+
+        self.points = points
+        self.monitors = [point for point in points if point.get("source") != "sensor"]
+        self.sensors = [i for i, point in enumerate(points) if point.get("source") == "sensor"]
+        self.sensor_lat = np.array([points[i]["lat"] for i in self.sensors], dtype=np.float64)
+        self.sensor_lon = np.array([points[i]["lon"] for i in self.sensors], dtype=np.float64)
+        # levels[L] maps a cell (tile coordinates at zoom L) to the index of its
+        # worst sensor reading, so hot spots never vanish when the view is thinned
+        top = INDEX_ZOOM + CELL_BITS
+        cells = {}
+        for i in self.sensors:
+            point = points[i]
+            x, y = lonlat_to_tile(point["lon"], point["lat"], top)
+            cell = (int(x), int(y))
+            if cell not in cells or point["AQI"] > points[cells[cell]]["AQI"]:
+                cells[cell] = i
+        self.levels = {top: cells}
+        for level in range(top - 1, CELL_BITS - 1, -1):
+            coarser = {}
+            for (x, y), i in self.levels[level + 1].items():
+                cell = (x >> 1, y >> 1)
+                if cell not in coarser or points[i]["AQI"] > points[coarser[cell]]["AQI"]:
+                    coarser[cell] = i
+            self.levels[level] = coarser
+        # The index is shared by every session (st.cache_resource), so the
+        # tile LRU is used from several script threads at once
+        self.tile_cache = OrderedDict()
+        self.tile_lock = threading.Lock()
+
+    def tile(self, z, x, y):
+        z = min(z, INDEX_ZOOM)
+        key = (z, x, y)
+        with self.tile_lock:
+            result = self.tile_cache.get(key)
+            if result is not None:
+                self.tile_cache.move_to_end(key)
+                return result
+
+        cells = self.levels[z + CELL_BITS]
+        span = 1 << CELL_BITS
+        x0, y0 = x << CELL_BITS, y << CELL_BITS
+        result = sorted(
+            cells[(cx, cy)]
+            for cx in range(x0, x0 + span)
+            for cy in range(y0, y0 + span)
+            if (cx, cy) in cells
+        )
+
+        with self.tile_lock:
+            self.tile_cache[key] = result
+            if len(self.tile_cache) > MAX_CACHED_TILES:
+                self.tile_cache.popitem(last=False)
+        return result
+
+    def query(self, west, south, east, north, zoom):
+        # Sensors in the bounds, thinned to one per cell at this zoom
+        z = min(int(zoom), INDEX_ZOOM)
+        x0, y0 = lonlat_to_tile(west, north, z)
+        x1, y1 = lonlat_to_tile(east, south, z)
+        n = 2 ** z
+        indices = []
+        for x in range(max(0, int(x0)), min(n - 1, int(x1)) + 1):
+            for y in range(max(0, int(y0)), min(n - 1, int(y1)) + 1):
+                indices.extend(self.tile(z, x, y))
+        return [self.points[i] for i in indices]
+
+    def query_view(self, lat, lon, zoom, width=1200, height=500, margin=PAN_MARGIN):
+        if len(self.points) <= MAX_POINTS:
+            return self.points
+        west, south, east, north = bounds = viewport_bounds(lat, lon, zoom, width, height, margin)
+        inside = (
+            (self.sensor_lat >= south) & (self.sensor_lat <= north)
+            & (self.sensor_lon >= west) & (self.sensor_lon <= east)
+        ).nonzero()[0]
+        if len(self.monitors) + len(inside) <= MAX_POINTS:
+            return self.monitors + [self.points[self.sensors[i]] for i in inside.tolist()]
+        return self.monitors + self.query(*bounds, zoom)
@@ -0,0 +1,143 @@
+# store.py
+#
+# Local SQLite store of hourly station observations, filled by ingest.py.
+# One row per (station, UTC hour) with the overall AQI and one sub-index
+# column per pollutant; re-ingesting a file replaces rows instead of
+# duplicating them. Polled ZIP-code API readings (polls.py) go in a separate
+# table keyed by reporting area, pollutant and local hour.
+import os
+import sqlite3
+
+from config import POLLUTANTS, STORE_PATH
+
+# Pollutant -> store column
+POLLUTANT_COLUMNS = {"PM2.5": "pm25", "PM10": "pm10", "O3": "o3", "NO2": "no2"}
+OBSERVATION_FIELDS = ["station", "site", "lat", "lon", "observed_at", "aqi",
+                      *(POLLUTANT_COLUMNS[pollutant] for pollutant in POLLUTANTS)]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS observations (
+    station TEXT NOT NULL,
+    site TEXT,
+    lat REAL,
+    lon REAL,
+    observed_at TEXT NOT NULL,
+    aqi INTEGER,
+    {", ".join(f"{POLLUTANT_COLUMNS[pollutant]} INTEGER" for pollutant in POLLUTANTS)},
+    PRIMARY KEY (station, observed_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_by_hour ON observations (observed_at);
+CREATE TABLE IF NOT EXISTS polled_observations (
+    key INTEGER PRIMARY KEY,
+    area TEXT,
+    state TEXT,
+    parameter TEXT,
+    observed_date TEXT,
+    observed_hour INTEGER,
+    time_zone TEXT,
+    lat REAL,
+    lon REAL,
+    aqi INTEGER,
+    category INTEGER,
+    polled_at REAL,
+    revisions INTEGER DEFAULT 0
+);
+"""
+
+def connect(path=STORE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    # WAL lets the dashboard read while an ingest is writing
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def write_observations(conn, rows):
+    # rows: tuples in OBSERVATION_FIELDS order
+    placeholders = ", ".join("?" for _ in OBSERVATION_FIELDS)
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO observations ({', '.join(OBSERVATION_FIELDS)}) VALUES ({placeholders})",
+            rows,
+        )
+
+# AirNow reporting-area readings from API polls (see polls.py), one row per
+# area, pollutant and local hour
+POLLED_FIELDS = ["key", "area", "state", "parameter", "observed_date", "observed_hour", "time_zone",
+                 "lat", "lon", "aqi", "category", "polled_at"]
+
+def upsert_polled(conn, rows):
+    # rows: tuples in POLLED_FIELDS order. A row only replaces the stored one
+    # if it comes from a later poll, so late deliveries of an old poll can't
+    # undo a revision; returns the number of rows inserted or updated.
+    placeholders = ", ".join("?" for _ in POLLED_FIELDS)
+    before = conn.total_changes
+    with conn:
+        conn.executemany(
+            f"""
+            INSERT INTO polled_observations ({', '.join(POLLED_FIELDS)}) VALUES ({placeholders})
+            ON CONFLICT (key) DO UPDATE SET
+                lat = excluded.lat,
+                lon = excluded.lon,
+                aqi = excluded.aqi,
+                category = excluded.category,
+                polled_at = excluded.polled_at,
+                revisions = revisions + (excluded.aqi IS NOT aqi OR excluded.category IS NOT category)
+            WHERE excluded.polled_at > polled_observations.polled_at
+            """,
+            rows,
+        )
+    return conn.total_changes - before
+
+def nearby_observations(conn, lat, lon, degrees=0.35, hours=24):
+    # Worst reading per hour across stations in a box around (lat, lon), for
+    # the most recent `hours` hours the store has for that area
+    pollutant_columns = [POLLUTANT_COLUMNS[pollutant] for pollutant in POLLUTANTS]
+    return conn.execute(
+        f"""
+        SELECT observed_at, MAX(aqi), {", ".join(f"MAX({column})" for column in pollutant_columns)}
+        FROM observations
+        WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?
+        GROUP BY observed_at
+        ORDER BY observed_at DESC
+        LIMIT ?
+        """,
+        (lat - degrees, lat + degrees, lon - degrees, lon + degrees, hours),
+    ).fetchall()[::-1]
+
+def nearby_observations_between(conn, lat, lon, start, end, degrees=0.35):
+    # Same per-hour worst readings for start <= observed_at < end, where the
+    # bounds are "YYYY-MM-DD" or "YYYY-MM-DD HH:00" UTC strings
+    pollutant_columns = [POLLUTANT_COLUMNS[pollutant] for pollutant in POLLUTANTS]
+    return conn.execute(
+        f"""
+        SELECT observed_at, MAX(aqi), {", ".join(f"MAX({column})" for column in pollutant_columns)}
+        FROM observations
+        WHERE observed_at >= ? AND observed_at < ?
+          AND lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?
+        GROUP BY observed_at
+        ORDER BY observed_at
+        """,
+        (start, end, lat - degrees, lat + degrees, lon - degrees, lon + degrees),
+    ).fetchall()
+
+def worst_nearby(stations, locations, degrees=0.35):
+    # stations: (lat, lon, value) readings, value None when missing. Returns
+    # (location, worst value) for each location with a reading in the same
+    # box as nearby_observations, in the order given.
+    import numpy as np
+
+    stations = [station for station in stations if station[2] is not None]
+    if not stations or not locations:
+        return []
+    station_lat, station_lon, station_value = (np.array(column, dtype=float) for column in zip(*stations))
+    zip_lat = np.array([location["lat"] for location in locations])
+    zip_lon = np.array([location["lon"] for location in locations])
+    near = ((np.abs(zip_lat[:, None] - station_lat) <= degrees)
+            & (np.abs(zip_lon[:, None] - station_lon) <= degrees))
+    worst = np.where(near, station_value, -np.inf).max(axis=1)
+    return [(location, float(value)) for location, value in zip(locations, worst) if value > -np.inf]
+
+def observation_count(conn):
+    return conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
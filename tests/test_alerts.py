@@ -0,0 +1,33 @@
+# Subscriptions persist in SQLite and alerts reach a JSONL sink as plain
+# JSON, once per dedup window even across a restart
+import json
+
+import numpy as np
+
+from alerts import AlertWatcher, JsonlSink, add_subscription, list_subscriptions, remove_subscription
+
+def test_alerts_persist_and_dedup_across_restart(tmp_path):
+    path = str(tmp_path / "alerts.sqlite3")
+    log = tmp_path / "alerts.jsonl"
+    subscription_id = add_subscription("80202", 100, "ops@example.org", path=path)
+    add_subscription("80202", 180, path=path)
+
+    watcher = AlertWatcher(path, JsonlSink(str(log)))
+    alerts = watcher.evaluate([("80202", np.int64(150))], "2026-10-19 08:00")
+    assert [alert["subscription"] for alert in alerts] == [subscription_id]
+    written = [json.loads(line) for line in log.read_text().splitlines()]
+    assert written[0]["aqi"] == 150 and written[0]["contact"] == "ops@example.org"
+    assert list_subscriptions(path)[0][4] is not None
+
+    # A new process sees last_sent and stays quiet within the window
+    assert AlertWatcher(path, JsonlSink(str(log))).evaluate([("80202", 160)]) == []
+    # Subscription changes are picked up without a restart
+    assert remove_subscription(subscription_id, path)
+    assert watcher.evaluate([("80202", 200)])[0]["threshold"] == 180.0
+
+def test_no_database_until_someone_subscribes(tmp_path):
+    path = tmp_path / "alerts.sqlite3"
+    watcher = AlertWatcher(str(path), sink=lambda alerts: None)
+    watcher.add([("80202", 300)])
+    assert watcher.evaluate_stations([(39.75, -104.99, 300)]) == []
+    assert not path.exists()
@@ -0,0 +1,81 @@
+# A smoke plume over neighbouring ZIPs is one regional event that keeps its id
+# while it drifts; a single spiking sensor far from it stays a local anomaly
+from anomalies import WARMUP, SmokeDetector
+
+HOUR = 3600.0
+# Front Range ZIPs a few km apart, east of Denver, and others far away
+PLUME_ZIPS = {f"80{200 + i:03d}": (39.70 + 0.05 * (i % 4), -105.00 + 0.08 * (i // 4)) for i in range(12)}
+SPIKE_ZIP = ("81501", 39.07, -108.55)  # Grand Junction, ~300 km west
+QUIET_ZIP = ("81001", 38.27, -104.61)  # Pueblo, ~160 km south
+
+def batch(hour, plume_level=None, spike_level=None):
+    rows = []
+    for i, (zip_code, (lat, lon)) in enumerate(sorted(PLUME_ZIPS.items())):
+        # A steady background with a little deterministic hour-to-hour noise
+        value = 30 + (hour * 7 + i * 3) % 5
+        # The plume drifts east: the western columns clear as it moves
+        if plume_level is not None and lon >= -105.00 + 0.08 * ((hour - WARMUP * 2) // 2):
+            value = plume_level
+        rows.append((zip_code, lat, lon, value))
+    rows.append((*SPIKE_ZIP, spike_level if spike_level is not None else 32))
+    rows.append((*QUIET_ZIP, 28 + hour % 3))
+    return rows
+
+def test_plume_is_one_event_and_spike_stays_local():
+    detector = SmokeDetector()
+    for hour in range(WARMUP * 2):
+        anomalies, events = detector.update(batch(hour), hour * HOUR)
+        assert anomalies == [] and events == []
+
+    event_ids = set()
+    spike_flagged = False
+    for hour in range(WARMUP * 2, WARMUP * 2 + 5):
+        spike = 210 if hour == WARMUP * 2 + 2 else None
+        anomalies, events = detector.update(batch(hour, plume_level=185, spike_level=spike), hour * HOUR)
+        flagged = {anomaly["zip"] for anomaly in anomalies}
+
+        assert flagged - {SPIKE_ZIP[0]} <= set(PLUME_ZIPS)
+        assert QUIET_ZIP[0] not in flagged
+        assert len(events) == 1
+        assert len(events[0]["zips"]) >= 2
+        assert SPIKE_ZIP[0] not in events[0]["zips"]
+        event_ids.add(events[0]["id"])
+        if spike is not None:
+            assert SPIKE_ZIP[0] in flagged
+            spike_flagged = True
+
+    assert spike_flagged
+    assert len(event_ids) == 1
+    [event] = detector.active_events()
+    assert event["hours"] == 5
+    assert event["peak"] == 185
+
+def test_event_closes_once_the_plume_has_gone():
+    detector = SmokeDetector(gap_seconds=2 * HOUR)
+    for hour in range(WARMUP * 2):
+        detector.update(batch(hour), hour * HOUR)
+    hour = WARMUP * 2
+    _, events = detector.update(batch(hour, plume_level=185), hour * HOUR)
+    assert len(events) == 1
+    for hour in range(WARMUP * 2 + 1, WARMUP * 2 + 5):
+        detector.update(batch(hour), hour * HOUR)
+    assert detector.active_events() == []
+    assert [event["id"] for event in detector.closed] == [events[0]["id"]]
+
+def test_ingest_fed_state_is_shared_and_hours_count_once(tmp_path):
+    from anomalies import stored_events, update_from_stations
+
+    path = str(tmp_path / "smoke_state.pkl")
+    # Stations around Denver and Boulder, then a plume over both
+    stations = [(39.74, -104.99), (39.68, -104.94), (40.01, -105.27), (39.92, -105.07)]
+    for hour in range(WARMUP * 2):
+        readings = [(lat, lon, 30 + (hour + i) % 4) for i, (lat, lon) in enumerate(stations)]
+        assert update_from_stations(readings, hour * HOUR, path) == []
+    plume = [(lat, lon, 190) for lat, lon in stations]
+    assert update_from_stations(plume, WARMUP * 2 * HOUR, path)
+    # A re-ingested hour is skipped rather than folded in again
+    assert update_from_stations(plume, WARMUP * 2 * HOUR, path) is None
+
+    events = stored_events(path, now=WARMUP * 2 * HOUR)
+    assert len(events) == 1 and "80202" in events[0]["zips"]
+    assert stored_events(path, now=(WARMUP * 2 + 4) * HOUR) == []
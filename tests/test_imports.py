@@ -0,0 +1,42 @@
+# Cold start: importing what app.py imports must not pull in the heavy
+# libraries that are only needed once something is drawn or fetched, and the
+# app modules must import within IMPORT_BUDGET_MS
+import ast
+import os
+import subprocess
+import sys
+
+from config import IMPORT_BUDGET_MS
+from profile_imports import DEFAULT_MODULES, profile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "numpy", "pydeck", "pyarrow", "requests", "dotenv", "matplotlib"]
+
+def app_imports():
+    with open(os.path.join(ROOT, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules.append(node.module)
+    return modules
+
+def test_app_imports_keep_heavy_modules_lazy():
+    modules = app_imports()
+    assert "data_loader" in modules and "visualizations" in modules
+    # A fresh interpreter, so nothing is already in sys.modules
+    code = "\n".join(
+        ["import sys"]
+        + [f"import {name}" for name in modules]
+        + [f"print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"]
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == []
+
+def test_cold_start_import_time_within_budget():
+    # Median of several fresh interpreters, as profile_imports.py --budget does
+    _, total_us = profile(DEFAULT_MODULES, repeat=5)
+    assert total_us / 1000 <= IMPORT_BUDGET_MS, f"cold start {total_us / 1000:.0f} ms"
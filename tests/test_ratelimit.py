@@ -0,0 +1,60 @@
+# With a shared bucket, an interactive caller waiting in one process holds
+# back background spending in every process
+import asyncio
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+import ratelimit
+from ratelimit import BACKGROUND, INTERACTIVE, TokenBucket
+
+def _wait_interactive(path, started):
+    # Registers as an interactive waiter for a token that can't come, then
+    # dies without unregistering
+    ratelimit.WAITER_SECONDS = 0.5
+    bucket = TokenBucket("airnow", capacity=10, refill_per_second=0.01, path=path)
+    assert bucket.try_acquire(INTERACTIVE, amount=100, waiter="crashed") > 0
+    started.set()
+
+def waiter_rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM waiters").fetchone()[0]
+
+def test_background_yields_to_waiters_in_other_processes(tmp_path):
+    path = str(tmp_path / "quota.sqlite3")
+    bucket = TokenBucket("airnow", capacity=10, refill_per_second=0.01, path=path)
+    started = multiprocessing.Event()
+    process = multiprocessing.Process(target=_wait_interactive, args=(path, started))
+    process.start()
+    assert started.wait(30)
+    process.join(timeout=30)
+
+    # Tokens are there, but another process has an interactive caller waiting
+    assert bucket.try_acquire(BACKGROUND) > 0
+    # Its row expires, so a crashed process can't hold background work forever
+    time.sleep(0.6)
+    assert bucket.try_acquire(BACKGROUND) == 0
+    assert waiter_rows(path) == 0
+
+def test_acquire_runs_sqlite_off_the_loop_and_unregisters(tmp_path):
+    path = str(tmp_path / "quota.sqlite3")
+    bucket = TokenBucket("airnow", capacity=1, refill_per_second=10, path=path)
+    threads = set()
+    try_acquire = bucket.try_acquire
+
+    def recording(*args):
+        threads.add(threading.current_thread().name)
+        return try_acquire(*args)
+
+    bucket.try_acquire = recording
+
+    async def two_tokens():
+        await bucket.acquire(INTERACTIVE)
+        # The second one waits ~0.1 s for a refill
+        await bucket.acquire(INTERACTIVE, timeout=5)
+        return threading.current_thread().name
+
+    loop_thread = asyncio.run(two_tokens())
+    assert threads and loop_thread not in threads
+    assert waiter_rows(path) == 0
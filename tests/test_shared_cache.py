@@ -0,0 +1,80 @@
+# Several processes asking for the same missing key share one computation
+import multiprocessing
+import os
+import sqlite3
+import time
+
+import pytest
+
+from shared_cache import SharedCache
+
+WORKERS = 6
+
+def _worker(path, start, computes, results):
+    cache = SharedCache(path)
+
+    def compute():
+        with computes.get_lock():
+            computes.value += 1
+        time.sleep(0.3)  # a slow upstream fetch
+        return {"pid": os.getpid(), "at": time.time()}
+
+    start.wait()
+    results.put(cache.get_or_compute("observations", 60, compute))
+
+def _take_lease_and_die(path):
+    # A holder that crashes mid-refresh never gets to release its lease
+    SharedCache(path, lease_seconds=0.5)._take_lease("observations")
+    os._exit(1)
+
+def lease_until(path, key):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT lease_until FROM entries WHERE key = ?", (key,)).fetchone()[0]
+
+def test_one_process_computes_and_all_read_its_value(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    start = multiprocessing.Event()
+    computes = multiprocessing.Value("i", 0)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(path, start, computes, results))
+        for _ in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    start.set()
+    values = [results.get(timeout=30) for _ in processes]
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    assert computes.value == 1
+    assert all(value == values[0] for value in values)
+
+def test_failed_compute_releases_the_lease(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SharedCache(path)
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("observations", 60, fail)
+    assert lease_until(path, "observations") == 0
+    # The next caller computes straight away instead of waiting out the lease
+    started = time.monotonic()
+    assert cache.get_or_compute("observations", 60, lambda: "fresh") == "fresh"
+    assert time.monotonic() - started < 0.5
+
+def test_crashed_holder_lease_expires(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SharedCache(path)
+    holder = multiprocessing.Process(target=_take_lease_and_die, args=(path,))
+    holder.start()
+    holder.join(timeout=30)
+    assert holder.exitcode == 1
+    assert lease_until(path, "observations") > time.time()
+
+    cache = SharedCache(path)
+    assert cache.get_or_compute("observations", 60, lambda: "fresh") == "fresh"
+    assert lease_until(path, "observations") == 0
@@ -0,0 +1,474 @@
+# tiles.py
+#
+# Local vector tile service for the AQI map. Station points and an
+# inverse-distance-weighted AQI surface are rendered into Mapbox Vector Tiles
+# keyed by observation hour and pollutant, kept in a size-limited on-disk LRU cache and
+# served over HTTP, so the browser only fetches (and re-uses) visible tiles
+# instead of receiving every point on each rerun.
+#
+# App processes publish each dataset as a file under TILE_DATASET_DIR; one
+# server per host renders from those files, so with several Streamlit workers
+# any of them can serve tiles for a key another one published. The first
+# worker to bind TILE_PORT runs it, or it runs on its own:
+#
+#   python tiles.py serve [--host 127.0.0.1] [--port 8502]
+#
+#   /tiles/{key}/{layer}/{z}/{x}/{y}.pbf      key is the observation hour plus what
+#                                             the map is colored by; layer is
+#                                             "points" or "surface"
+#   /polygons/{level}/{version}.geojson       ZIP boundaries for the choropleth
+#                                             (see polygons.py)
+import errno
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import (
+    COLORADO_BOUNDS, TILE_CACHE_DIR, TILE_CACHE_MAX_BYTES, TILE_DATASET_DIR, TILE_HOST, TILE_MAX_ZOOM, TILE_PORT,
+)
+from spatial import lonlat_to_tile
+
+EXTENT = 4096
+LAYERS = ("points", "surface")
+# Cells per tile side for the interpolated surface
+SURFACE_GRID = 16
+# Stations further than this (in world units, ~50 km) don't influence a cell
+SURFACE_RADIUS = 0.0016
+PRERENDER_ZOOMS = range(5, 9)
+# Two hours of every map coloring (overall AQI plus each pollutant)
+KEEP_DATASETS = 10
+DATASET_KEY = re.compile(r"^[0-9]+-[A-Za-z0-9.]+$")
+# What the renderers read from each point
+DATASET_FIELDS = ("lat", "lon", "AQI", "zip", "city")
+HEALTH_BODY = b"aq-tiles ok"
+# How long a tile_server_ready() probe of another process's server is trusted
+PROBE_SECONDS = 30
+
+_datasets = {}
+_lock = threading.Lock()
+_server = None
+_cache = None
+
+# --- Mapbox Vector Tile encoding (protobuf, spec v2) ---
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+def _bytes_field(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+def _packed(number, values):
+    return _bytes_field(number, b"".join(_varint(value) for value in values))
+
+def _encode_value(value):
+    if isinstance(value, str):
+        return _bytes_field(1, value.encode("utf-8"))
+    if isinstance(value, float):
+        return _field(3, 1) + struct.pack("<d", value)
+    return _field(6, 0) + _varint(_zigzag(int(value)))
+
+def _command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+def point_geometry(x, y):
+    return [_command(1, 1), _zigzag(x), _zigzag(y)]
+
+def square_geometry(x0, y0, x1, y1):
+    # Clockwise in tile (y-down) coordinates, i.e. an exterior ring
+    return [
+        _command(1, 1), _zigzag(x0), _zigzag(y0),
+        _command(2, 3), _zigzag(x1 - x0), 0, 0, _zigzag(y1 - y0), _zigzag(x0 - x1), 0,
+        _command(7, 1),
+    ]
+
+def encode_layer(name, features):
+    # features: [(geometry_type, geometry_ints, properties), ...]
+    keys, values = {}, {}
+    encoded = []
+    for feature_id, (geometry_type, geometry, properties) in enumerate(features, start=1):
+        tags = []
+        for key, value in properties.items():
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        encoded.append(_bytes_field(2,
+            _field(1, 0) + _varint(feature_id)
+            + _packed(2, tags)
+            + _field(3, 0) + _varint(geometry_type)
+            + _packed(4, geometry)
+        ))
+
+    layer = _field(15, 0) + _varint(2) + _bytes_field(1, name.encode("utf-8")) + b"".join(encoded)
+    layer += b"".join(_bytes_field(3, key.encode("utf-8")) for key in keys)
+    layer += b"".join(_bytes_field(4, _encode_value(value)) for _, value in values)
+    layer += _field(5, 0) + _varint(EXTENT)
+    return _bytes_field(3, layer)
+
+# --- Rendering ---
+
+class Dataset:
+    def __init__(self, points):
+        import numpy as np
+
+        self.points = points
+        coords = [lonlat_to_tile(point["lon"], point["lat"], 0) for point in points]
+        # World coordinates in [0, 1)
+        self.wx = np.array([x for x, _ in coords])
+        self.wy = np.array([y for _, y in coords])
+        self.aqi = np.array([point["AQI"] for point in points], dtype=float)
+
+    def in_box(self, x0, y0, x1, y1):
+        import numpy as np
+
+        return np.nonzero((self.wx >= x0) & (self.wx < x1) & (self.wy >= y0) & (self.wy < y1))[0]
+
+def render_points(dataset, z, x, y):
+    from visualizations import get_aqi_colors_rgb
+
+    n = 2 ** z
+    # A small buffer keeps circles on tile edges from being clipped
+    buffer = 0.05
+    indices = dataset.in_box((x - buffer) / n, (y - buffer) / n, (x + 1 + buffer) / n, (y + 1 + buffer) / n)
+    colors = get_aqi_colors_rgb(dataset.aqi[indices])
+    features = []
+    for i, color in zip(indices, colors):
+        point = dataset.points[i]
+        px = int((dataset.wx[i] * n - x) * EXTENT)
+        py = int((dataset.wy[i] * n - y) * EXTENT)
+        features.append((1, point_geometry(px, py), {
+            "zip": point["zip"],
+            "city": point["city"],
+            "AQI": int(point["AQI"]),
+            "r": color[0], "g": color[1], "b": color[2],
+        }))
+    return encode_layer("points", features)
+
+def render_surface(dataset, z, x, y):
+    import numpy as np
+    from visualizations import get_aqi_colors_rgb
+
+    n = 2 ** z
+    indices = dataset.in_box(
+        x / n - SURFACE_RADIUS, y / n - SURFACE_RADIUS,
+        (x + 1) / n + SURFACE_RADIUS, (y + 1) / n + SURFACE_RADIUS,
+    )
+    if len(indices) == 0:
+        return encode_layer("surface", [])
+
+    # Cell centres in world coordinates, then IDW over nearby stations (power 2)
+    steps = (np.arange(SURFACE_GRID) + 0.5) / SURFACE_GRID
+    cx = ((x + steps) / n)[None, :].repeat(SURFACE_GRID, axis=0).ravel()
+    cy = ((y + steps) / n)[:, None].repeat(SURFACE_GRID, axis=1).ravel()
+    dx = cx[:, None] - dataset.wx[indices][None, :]
+    dy = cy[:, None] - dataset.wy[indices][None, :]
+    dist_sq = dx * dx + dy * dy
+    weights = np.where(dist_sq < SURFACE_RADIUS ** 2, 1.0 / np.maximum(dist_sq, 1e-12), 0.0)
+    totals = weights.sum(axis=1)
+    covered = totals > 0
+    values = np.zeros(len(cx))
+    values[covered] = (weights[covered] @ dataset.aqi[indices]) / totals[covered]
+    colors = get_aqi_colors_rgb(values)
+
+    cell = EXTENT // SURFACE_GRID
+    features = []
+    for k in np.nonzero(covered)[0]:
+        row, col = divmod(int(k), SURFACE_GRID)
+        color = colors[k]
+        features.append((3, square_geometry(col * cell, row * cell, (col + 1) * cell, (row + 1) * cell), {
+            "AQI": round(float(values[k]), 1),
+            "r": color[0], "g": color[1], "b": color[2],
+        }))
+    return encode_layer("surface", features)
+
+RENDERERS = {"points": render_points, "surface": render_surface}
+
+# --- On-disk LRU cache ---
+
+class TileCache:
+    def __init__(self, root=TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # path -> (last use, size); seeded from whatever survived a restart
+        self.entries = {}
+        os.makedirs(root, exist_ok=True)
+        for directory, _, files in os.walk(root):
+            for name in files:
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                self.entries[path] = (stat.st_mtime, stat.st_size)
+        self.total = sum(size for _, size in self.entries.values())
+
+    def path(self, key, layer, z, x, y):
+        return os.path.join(self.root, key, layer, str(z), str(x), f"{y}.pbf")
+
+    def get(self, path):
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        with self.lock:
+            # Under the lock, so _evict can't delete the file in between; if
+            # another process removed it, the body we read is still good
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                return body
+            self.entries[path] = (now, len(body))
+        return body
+
+    def put(self, path, body):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        with self.lock:
+            _, old_size = self.entries.get(path, (0, 0))
+            self.entries[path] = (time.time(), len(body))
+            self.total += len(body) - old_size
+            if self.total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used tiles until we're 10% under the limit
+        target = self.max_bytes * 0.9
+        for path, (_, size) in sorted(self.entries.items(), key=lambda item: item[1][0]):
+            if self.total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self.entries[path]
+            self.total -= size
+
+def get_cache():
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = TileCache()
+        return _cache
+
+def dataset_path(key):
+    return os.path.join(TILE_DATASET_DIR, f"{key}.json")
+
+def load_dataset(key):
+    # Datasets are files, so whichever process serves tiles can render ones
+    # published by any worker; each is parsed once per serving process
+    with _lock:
+        dataset = _datasets.get(key)
+        if dataset is not None:
+            return dataset
+    try:
+        with open(dataset_path(key), encoding="utf-8") as f:
+            points = json.load(f)
+    except FileNotFoundError:
+        return None
+    with _lock:
+        if key in _datasets:
+            return _datasets[key]
+        dataset = _datasets[key] = Dataset(points)
+        # Dicts keep insertion order, so the oldest datasets come first
+        for old_key in list(_datasets)[:-KEEP_DATASETS]:
+            del _datasets[old_key]
+    # Warm the statewide tiles while the browser asks for the first ones
+    threading.Thread(target=prerender, args=(key,), daemon=True).start()
+    return dataset
+
+def get_tile(key, layer, z, x, y):
+    cache = get_cache()
+    path = cache.path(key, layer, z, x, y)
+    body = cache.get(path)
+    if body is None:
+        dataset = load_dataset(key)
+        if dataset is None:
+            return None
+        body = RENDERERS[layer](dataset, z, x, y)
+        cache.put(path, body)
+    return body
+
+def prerender(key, zooms=PRERENDER_ZOOMS, bounds=COLORADO_BOUNDS):
+    west, south, east, north = bounds
+    for z in zooms:
+        x0, y0 = lonlat_to_tile(west, north, z)
+        x1, y1 = lonlat_to_tile(east, south, z)
+        for x in range(int(x0), int(x1) + 1):
+            for y in range(int(y0), int(y1) + 1):
+                for layer in LAYERS:
+                    get_tile(key, layer, z, x, y)
+
+def publish(key, points):
+    # Writes the points for "{hour}-{coloring}" where the tile server finds
+    # them. Every worker publishes the same hour, so the first one wins.
+    if not DATASET_KEY.match(key):
+        raise ValueError(f"invalid tile dataset key: {key!r}")
+    path = dataset_path(key)
+    if os.path.exists(path):
+        return
+    os.makedirs(TILE_DATASET_DIR, exist_ok=True)
+    # Sensor values can be numpy scalars, which json can't write
+    rows = [{field: getattr(point[field], "item", lambda: point[field])() for field in DATASET_FIELDS}
+            for point in points]
+    fd, tmp_path = tempfile.mkstemp(dir=TILE_DATASET_DIR, prefix=".dataset-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(rows, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    # Keep the newest few; tiles already rendered for older ones stay in the
+    # tile cache until evicted
+    published = sorted(
+        (entry for entry in os.scandir(TILE_DATASET_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in published[:-KEEP_DATASETS]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+class TileHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, "text/plain", HEALTH_BODY, "no-store")
+            return
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "polygons":
+            self._send_polygons(parts[1], parts[2])
+            return
+        try:
+            if len(parts) != 6 or parts[0] != "tiles" or parts[2] not in LAYERS or not parts[5].endswith(".pbf"):
+                raise ValueError
+            # The key becomes a cache directory name, so only accept what publish() does
+            if not DATASET_KEY.match(parts[1]):
+                raise ValueError
+            key, layer = parts[1], parts[2]
+            z, x, y = int(parts[3]), int(parts[4]), int(parts[5][:-4])
+        except ValueError:
+            self.send_error(404)
+            return
+        # Every tile is rendered and cached on demand, so only ask for real ones
+        if not 0 <= z <= TILE_MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+            self.send_error(400)
+            return
+
+        body = get_tile(key, layer, z, x, y)
+        if body is None:
+            self.send_error(404)
+            return
+        # Tiles for a given key never change, so the browser can keep them
+        self._send(200, "application/vnd.mapbox-vector-tile", body, "public, max-age=3600, immutable")
+
+    def _send_polygons(self, level, name):
+        # /polygons/{level}/{version}.geojson: ZIP geometry for the choropleth
+        from polygons import available_levels, level_geojson, level_version
+
+        if level not in available_levels() or not name.endswith(".geojson"):
+            self.send_error(404)
+            return
+        version = level_version(level)
+        body = level_geojson(level, version)
+        # A versioned URL never changes; an outdated one gets the rebuilt level
+        cache_control = "public, max-age=31536000, immutable" if name[:-8] == version else "no-cache"
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            self._send(200, "application/geo+json", body, cache_control,
+                       {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+        else:
+            import gzip
+
+            self._send(200, "application/geo+json", gzip.decompress(body), cache_control, {"Vary": "Accept-Encoding"})
+
+    def _send(self, status, content_type, body, cache_control, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_tile_server(port=TILE_PORT, host=TILE_HOST):
+    # Returns None when the port is taken, e.g. by another worker's server or
+    # `python tiles.py serve`; that server reads the same dataset files
+    global _server
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), TileHandler)
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE:
+                    print("Error starting tile server:", e)
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+_probe = {"at": 0.0, "ok": False}
+
+def tile_server_ready(port=TILE_PORT, host=TILE_HOST):
+    # True if this process serves tiles or a tile server already answers on
+    # the port. The probe result is reused for a while, so reruns stay cheap.
+    if start_tile_server(port, host) is not None:
+        return True
+    if time.monotonic() - _probe["at"] > PROBE_SECONDS:
+        import http.client
+
+        ok = False
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1" if host in ("", "0.0.0.0") else host, port, timeout=1)
+            conn.request("GET", "/health")
+            response = conn.getresponse()
+            ok = response.status == 200 and response.read() == HEALTH_BODY
+            conn.close()
+        except OSError:
+            pass
+        _probe.update(at=time.monotonic(), ok=ok)
+    return _probe["ok"]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Vector tile server for the AQI map")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default=TILE_HOST)
+    parser.add_argument("--port", type=int, default=TILE_PORT)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), TileHandler)
+    server.daemon_threads = True
+    print(f"Tiles served on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
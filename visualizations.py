@@ -1,29 +1,54 @@
 import streamlit as st
-import pydeck as pdk
-import pandas as pd
-import plotly.graph_objects as go
 import base64
+import json
+from bisect import bisect_left
+from config import MAP_CENTER, TILE_MAX_ZOOM, TILE_URL
+from metrics import instrument, record_payload
 
-def create_aqi_map(data):
+# pydeck, pandas and plotly are imported inside the functions that use them so
+# importing this module stays cheap on cold start.
+
+@instrument("create_aqi_map")
+def create_aqi_map(data, view=None, events=None):
     if not data:
         st.warning("No air quality data to display.")
         return
 
-    df = pd.DataFrame(data)
-    
-    # Enhanced color mapping based on AQI values - matching IQAir standards
-    df["color"] = df["AQI"].apply(lambda x: get_aqi_color_rgb(x))
-    df["radius"] = df["AQI"].apply(lambda x: 4000 + x * 200)
+    deck = build_aqi_deck(data, view, events=events)
+    record_payload("create_aqi_map", lambda: len(deck.to_json()))
+    st.pydeck_chart(deck)
+    show_aqi_legend()
 
-    st.pydeck_chart(pdk.Deck(
-        map_style="mapbox://styles/mapbox/light-v9",
+def build_aqi_deck(data, view=None, map_style="mapbox://styles/mapbox/light-v9", events=None):
+    import pydeck as pdk
+
+    df = prepare_map_frame(data)
+    latitude, longitude, zoom = view or (*MAP_CENTER, 6)
+
+    layers = []
+    if events:
+        # Rings around detected smoke events (anomalies.py), under the stations
+        layers.append(pdk.Layer(
+            "ScatterplotLayer",
+            data=[{"lat": event["lat"], "lon": event["lon"], "radius": event_radius_m(event)} for event in events],
+            get_position='[lon, lat]',
+            get_radius="radius",
+            get_line_color=[120, 72, 40],
+            get_fill_color=[120, 72, 40, 40],
+            line_width_min_pixels=2,
+            stroked=True,
+            filled=True,
+        ))
+
+    return pdk.Deck(
+        map_style=map_style,
         initial_view_state=pdk.ViewState(
-            latitude=39.55,
-            longitude=-105.78,
-            zoom=6,
+            latitude=latitude,
+            longitude=longitude,
+            zoom=zoom,
             pitch=0,
         ),
-        layers=[
+        layers=layers + [
             pdk.Layer(
                 "ScatterplotLayer",
                 data=df,
@@ -37,10 +62,157 @@ def create_aqi_map(data):
             ),
         ],
         tooltip={"text": "City: {city}\nZIP: {zip}\nAQI: {AQI}\nPollutant: {Pollutant}"}
-    ))
-    
-    # Add color legend for AQI values
-    st.markdown("""
+    )
+
+def event_radius_m(event):
+    # Grows with the number of stations involved, within 25-120 km
+    return 1000 * min(120, 25 + 10 * event["stations"])
+
+@instrument("create_aqi_choropleth")
+def create_aqi_choropleth(data, view=None):
+    from polygons import available_levels, level_for_zoom, level_version, load_level
+    from tiles import tile_server_ready
+
+    if not data:
+        st.warning("No air quality data to display.")
+        return
+    if not available_levels():
+        st.info("ZIP boundaries have not been built yet (python polygons.py build ZCTA.geojson); showing stations instead.")
+        create_aqi_map(data, view)
+        return
+
+    import pydeck as pdk
+
+    latitude, longitude, zoom = view or (*MAP_CENTER, 6)
+    level = level_for_zoom(zoom)
+    version = level_version(level)
+    shapes = load_level(level, version)
+    by_zip = {record["zip"]: record for record in data}
+    aqi_values = [by_zip[zip_code]["AQI"] if zip_code in by_zip else None for zip_code, _ in shapes]
+
+    if tile_server_ready():
+        # The geometry is a static, versioned URL the browser fetches once and
+        # keeps; each refresh only sends one color code per ZIP, looked up by
+        # the feature's index, plus a dot per station ZIP for the tooltip
+        palette = [list(color) for color in AQI_COLORS_RGB] + [list(NO_DATA_RGB)]
+        codes = "".join(
+            str(len(AQI_COLORS_RGB)) if aqi is None else str(bisect_left(AQI_BREAKPOINTS, aqi)) for aqi in aqi_values
+        )
+        layers = [
+            pdk.Layer(
+                "GeoJsonLayer",
+                id=f"zcta-{level}",
+                data=f"{TILE_URL}/polygons/{level}/{version}.geojson",
+                get_fill_color=f"{json.dumps(palette, separators=(',', ':'))}['{codes}'[properties.i]]",
+                update_triggers={"get_fill_color": [codes]},
+                get_line_color=[255, 255, 255],
+                line_width_min_pixels=1,
+                opacity=0.6,
+                stroked=True,
+                filled=True,
+            ),
+            pdk.Layer(
+                "ScatterplotLayer",
+                data=[{key: record[key] for key in ("zip", "city", "AQI", "lat", "lon")} for record in data],
+                get_position="[lon, lat]",
+                get_fill_color=[75, 85, 99],
+                get_radius=400,
+                radius_min_pixels=3,
+                pickable=True,
+            ),
+        ]
+    else:
+        # No tile server to fetch the geometry from, so it goes inline
+        colors = get_aqi_colors_rgb([value if value is not None else 0 for value in aqi_values])
+        rows = []
+        for (zip_code, polygons), aqi, color in zip(shapes, aqi_values, colors):
+            record = by_zip.get(zip_code, {})
+            for polygon in polygons:
+                rows.append({
+                    "zip": zip_code,
+                    "city": record.get("city", ""),
+                    "AQI": aqi if aqi is not None else "n/a",
+                    "polygon": polygon,
+                    "color": color if aqi is not None else NO_DATA_RGB,
+                })
+        layers = [
+            pdk.Layer(
+                "PolygonLayer",
+                data=rows,
+                get_polygon="polygon",
+                get_fill_color="color",
+                get_line_color=[255, 255, 255],
+                line_width_min_pixels=1,
+                pickable=True,
+                opacity=0.6,
+                stroked=True,
+                filled=True,
+            ),
+        ]
+
+    deck = pdk.Deck(
+        map_style="mapbox://styles/mapbox/light-v9",
+        initial_view_state=pdk.ViewState(
+            latitude=latitude,
+            longitude=longitude,
+            zoom=zoom,
+            pitch=0,
+        ),
+        layers=layers,
+        tooltip={"text": "City: {city}\nZIP: {zip}\nAQI: {AQI}"}
+    )
+    record_payload("create_aqi_choropleth", lambda: len(deck.to_json()))
+    st.pydeck_chart(deck)
+    show_aqi_legend()
+
+@instrument("create_aqi_tile_map")
+def create_aqi_tile_map(key, view=None):
+    import pydeck as pdk
+
+    latitude, longitude, zoom = view or (*MAP_CENTER, 6)
+    # The browser fetches only the visible tiles from the local tile service
+    # and re-uses cached ones, so reruns send no point data at all
+    tile_url = f"{TILE_URL}/tiles/{key}/{{layer}}/{{{{z}}}}/{{{{x}}}}/{{{{y}}}}.pbf"
+
+    deck = pdk.Deck(
+        map_style="mapbox://styles/mapbox/light-v9",
+        initial_view_state=pdk.ViewState(
+            latitude=latitude,
+            longitude=longitude,
+            zoom=zoom,
+            pitch=0,
+        ),
+        layers=[
+            pdk.Layer(
+                "MVTLayer",
+                data=tile_url.format(layer="surface"),
+                max_zoom=TILE_MAX_ZOOM,
+                binary=False,
+                get_fill_color="[properties.r, properties.g, properties.b]",
+                stroked=False,
+                opacity=0.35,
+            ),
+            pdk.Layer(
+                "MVTLayer",
+                data=tile_url.format(layer="points"),
+                max_zoom=TILE_MAX_ZOOM,
+                binary=False,
+                point_type="circle",
+                get_fill_color="[properties.r, properties.g, properties.b]",
+                get_line_color=[255, 255, 255],
+                point_radius_min_pixels=5,
+                line_width_min_pixels=1,
+                pickable=True,
+                opacity=0.8,
+            ),
+        ],
+        tooltip={"text": "City: {city}\nZIP: {zip}\nAQI: {AQI}"}
+    )
+    record_payload("create_aqi_tile_map", lambda: len(deck.to_json()))
+    st.pydeck_chart(deck)
+    show_aqi_legend()
+
+AQI_LEGEND_HTML = """
     <div style="display: flex; justify-content: center; margin-top: 10px; flex-wrap: wrap;">
         <div style="display: flex; align-items: center; margin: 0 10px;">
             <div style="width: 15px; height: 15px; background-color: #a8e05f; border-radius: 3px; margin-right: 5px;"></div>
@@ -67,7 +239,47 @@ def create_aqi_map(data):
             <span style="font-size: 12px;">Hazardous</span>
         </div>
     </div>
-    """, unsafe_allow_html=True)
+    """
+
+def show_aqi_legend():
+    # Add color legend for AQI values
+    st.markdown(AQI_LEGEND_HTML, unsafe_allow_html=True)
+
+def prepare_map_frame(data):
+    import pandas as pd
+
+    df = pd.DataFrame(data)
+
+    # Enhanced color mapping based on AQI values - matching IQAir standards
+    df["color"] = get_aqi_colors_rgb(df["AQI"])
+    df["radius"] = 4000 + df["AQI"] * 200
+    if "source" in df:
+        # Low-cost sensors (sensors.py) are dense, so they get smaller dots
+        sensor = df["source"] == "sensor"
+        df.loc[sensor, "radius"] = 1500 + df.loc[sensor, "AQI"] * 40
+    return df
+
+# Upper AQI bound of each category; anything above the last one is Hazardous
+AQI_BREAKPOINTS = [50, 100, 150, 200, 300]
+AQI_COLORS_RGB = (
+    (168, 224, 95),
+    (253, 215, 75),
+    (254, 155, 87),
+    (254, 106, 105),
+    (169, 122, 188),
+    (168, 115, 131),
+)
+# ZIP areas without a reading
+NO_DATA_RGB = (209, 213, 219)
+
+def get_aqi_colors_rgb(values):
+    # Vectorized get_aqi_color_rgb for a whole AQI column
+    import numpy as np
+
+    index = np.searchsorted(AQI_BREAKPOINTS, np.asarray(values), side="left")
+    # Rows share the palette's tuples instead of materializing one list per
+    # point; tuples, so a caller can't recolor every row (or the palette)
+    return [AQI_COLORS_RGB[i] for i in index.tolist()]
 
 def get_aqi_category(aqi):
     if aqi <= 50:
@@ -131,7 +343,138 @@ def get_flag_image():
     encoded_flag = base64.b64encode(flag_svg.encode('utf-8')).decode('utf-8')
     return f"data:image/svg+xml;base64,{encoded_flag}"
 
-def show_aqi_rankings(data):
+# Custom CSS for professional styling - enhanced to match IQAir
+RANKING_CSS = """
+<style>
+.ranking-card {
+    background-color: white;
+    border-radius: 10px;
+    padding: 20px;
+    box-shadow: 0 4px 8px rgba(0,0,0,0.08);
+    margin-bottom: 20px;
+}
+
+.ranking-title {
+    font-size: 18px;
+    font-weight: 600;
+    color: #1e3a8a;
+    margin-bottom: 5px;
+}
+
+.ranking-subtitle {
+    font-size: 14px;
+    color: #6b7280;
+    margin-bottom: 15px;
+}
+
+.aqi-badge {
+    display: inline-block;
+    padding: 4px 10px;
+    border-radius: 4px;
+    font-weight: 600;
+    text-align: center;
+    min-width: 40px;
+    color: #1f2937;
+}
+
+.flag-icon {
+    width: 20px;
+    height: 14px;
+    margin-right: 8px;
+    vertical-align: middle;
+}
+
+.ranking-row {
+    display: flex;
+    justify-content: space-between;
+    padding: 10px 0;
+    border-bottom: 1px solid #f3f4f6;
+    align-items: center;
+}
+
+.ranking-row:hover {
+    background-color: #f9fafb;
+}
+
+.ranking-number {
+    width: 30px;
+    text-align: center;
+    font-weight: 500;
+    color: #1f2937; /* Ensuring numbers are dark and visible */
+}
+
+.ranking-city {
+    flex-grow: 1;
+    display: flex;
+    align-items: center;
+    font-weight: 500;
+    color: #1f2937; /* Ensuring city names are dark and visible */
+}
+
+.ranking-aqi {
+    padding-left: 10px;
+}
+
+.smoke-tag {
+    margin-left: 8px;
+    padding: 1px 6px;
+    border-radius: 4px;
+    font-size: 11px;
+    font-weight: 600;
+    color: #fff;
+    background-color: #78482a;
+}
+</style>
+"""
+
+def build_ranking_html(ranked, title, subtitle, flag_img, flagged=()):
+    rows = []
+    for i, (city, zip_code, aqi) in enumerate(zip(ranked["city"], ranked["zip"], ranked["AQI"])):
+        aqi_color = get_aqi_color(aqi)
+        category, _ = get_aqi_category(aqi)
+        smoke = '<span class="smoke-tag" title="Part of a detected smoke event">Smoke</span>' if zip_code in flagged else ""
+
+        # Create a row with flag icon and colored AQI badge
+        rows.append(
+            f'<div class="ranking-row">'
+            f'<div class="ranking-number">{i+1}</div>'
+            f'<div class="ranking-city"><img src="{flag_img}" class="flag-icon" alt="US Flag">{city} ({zip_code}){smoke}</div>'
+            f'<div class="ranking-aqi"><span class="aqi-badge" style="background-color: {aqi_color};" title="{category}">{aqi}</span></div>'
+            f'</div>'
+        )
+
+    return (
+        f'<div class="ranking-card">'
+        f'<div class="ranking-title">{title}</div>'
+        f'<div class="ranking-subtitle">{subtitle}</div>'
+        f'{"".join(rows)}'
+        f'</div>'
+    )
+
+def build_rankings_html(df, n=10, flagged=()):
+    # (most polluted card, cleanest card) for a map data frame; ZIPs in
+    # `flagged` get a smoke tag
+    flag_img = get_flag_image()
+    polluted_html = build_ranking_html(
+        df.nlargest(n, "AQI"),
+        "Live most polluted city ranking",
+        "Real-time Colorado most polluted city ranking",
+        flag_img,
+        flagged,
+    )
+    cleanest_html = build_ranking_html(
+        df.nsmallest(n, "AQI"),
+        "Live cleanest city ranking",
+        "Real-time Colorado cleanest city ranking",
+        flag_img,
+        flagged,
+    )
+    return polluted_html, cleanest_html
+
+@instrument("show_aqi_rankings")
+def show_aqi_rankings(data, flagged=()):
+    import pandas as pd
+
     try:
         df = pd.DataFrame(data)
 
@@ -139,153 +482,40 @@ def show_aqi_rankings(data):
             st.info("No data available for rankings.")
             return
 
-        most_polluted = df.sort_values(by="AQI", ascending=False).head(10).reset_index(drop=True)
-        cleanest = df.sort_values(by="AQI", ascending=True).head(10).reset_index(drop=True)
-        
-        # Custom CSS for professional styling - enhanced to match IQAir
-        st.markdown("""
-        <style>
-        .ranking-card {
-            background-color: white;
-            border-radius: 10px;
-            padding: 20px;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.08);
-            margin-bottom: 20px;
-        }
-        
-        .ranking-title {
-            font-size: 18px;
-            font-weight: 600;
-            color: #1e3a8a;
-            margin-bottom: 5px;
-        }
-        
-        .ranking-subtitle {
-            font-size: 14px;
-            color: #6b7280;
-            margin-bottom: 15px;
-        }
-        
-        .aqi-badge {
-            display: inline-block;
-            padding: 4px 10px;
-            border-radius: 4px;
-            font-weight: 600;
-            text-align: center;
-            min-width: 40px;
-            color: #1f2937;
-        }
-        
-        .flag-icon {
-            width: 20px;
-            height: 14px;
-            margin-right: 8px;
-            vertical-align: middle;
-        }
-        
-        .ranking-row {
-            display: flex;
-            justify-content: space-between;
-            padding: 10px 0;
-            border-bottom: 1px solid #f3f4f6;
-            align-items: center;
-        }
-        
-        .ranking-row:hover {
-            background-color: #f9fafb;
-        }
-        
-        .ranking-number {
-            width: 30px;
-            text-align: center;
-            font-weight: 500;
-            color: #1f2937; /* Ensuring numbers are dark and visible */
-        }
-        
-        .ranking-city {
-            flex-grow: 1;
-            display: flex;
-            align-items: center;
-            font-weight: 500;
-            color: #1f2937; /* Ensuring city names are dark and visible */
-        }
-        
-        .ranking-aqi {
-            padding-left: 10px;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
-        # Get flag image
-        flag_img = get_flag_image()
+        st.markdown(RANKING_CSS, unsafe_allow_html=True)
         
+        # One markdown element per card keeps the rows inside the card and the
+        # number of websocket deltas constant regardless of list length
+        polluted_html, cleanest_html = build_rankings_html(df, flagged=flagged)
+        record_payload("show_aqi_rankings", lambda: len(polluted_html) + len(cleanest_html))
+
         # Use Streamlit columns for layout
         col1, col2 = st.columns(2)
         
         with col1:
-            st.markdown('<div class="ranking-card">', unsafe_allow_html=True)
-            st.markdown('<div class="ranking-title">Live most polluted city ranking</div>', unsafe_allow_html=True)
-            st.markdown('<div class="ranking-subtitle">Real-time Colorado most polluted city ranking</div>', unsafe_allow_html=True)
-            
-            # Create a clean dataframe for display
-            for i, row in most_polluted.iterrows():
-                aqi = row['AQI']
-                aqi_color = get_aqi_color(aqi)
-                category, _ = get_aqi_category(aqi)
-                
-                # Create a row with flag icon and colored AQI badge
-                st.markdown(f"""
-                <div class="ranking-row">
-                    <div class="ranking-number">{i+1}</div>
-                    <div class="ranking-city">
-                        <img src="{flag_img}" class="flag-icon" alt="US Flag">
-                        {row['city']} ({row['zip']})
-                    </div>
-                    <div class="ranking-aqi">
-                        <span class="aqi-badge" style="background-color: {aqi_color};" title="{category}">{aqi}</span>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            st.markdown('</div>', unsafe_allow_html=True)
+            st.markdown(polluted_html, unsafe_allow_html=True)
         
         with col2:
-            st.markdown('<div class="ranking-card">', unsafe_allow_html=True)
-            st.markdown('<div class="ranking-title">Live cleanest city ranking</div>', unsafe_allow_html=True)
-            st.markdown('<div class="ranking-subtitle">Real-time Colorado cleanest city ranking</div>', unsafe_allow_html=True)
-            
-            # Create a clean dataframe for display
-            for i, row in cleanest.iterrows():
-                aqi = row['AQI']
-                aqi_color = get_aqi_color(aqi)
-                category, _ = get_aqi_category(aqi)
-                
-                # Create a row with flag icon and colored AQI badge
-                st.markdown(f"""
-                <div class="ranking-row">
-                    <div class="ranking-number">{i+1}</div>
-                    <div class="ranking-city">
-                        <img src="{flag_img}" class="flag-icon" alt="US Flag">
-                        {row['city']} ({row['zip']})
-                    </div>
-                    <div class="ranking-aqi">
-                        <span class="aqi-badge" style="background-color: {aqi_color};" title="{category}">{aqi}</span>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            st.markdown('</div>', unsafe_allow_html=True)
+            st.markdown(cleanest_html, unsafe_allow_html=True)
         
     except Exception as e:
         st.error(f"Error displaying rankings: {e}")
         import traceback
         st.text(traceback.format_exc())
 
-def plot_pollution_trend(data, pollutant):
-    if data.empty:
+@instrument("plot_pollution_trend")
+def plot_pollution_trend(data, pollutant, forecast=None):
+    if data.empty and forecast is None:
         st.info("No air quality trend data available for this ZIP and pollutant.")
         return
 
+    fig = build_trend_figure(data, pollutant, forecast)
+    record_payload("plot_pollution_trend", lambda: len(fig.to_json()))
+    st.plotly_chart(fig, use_container_width=True)
+
+def build_trend_figure(data, pollutant, forecast=None):
+    import plotly.graph_objects as go
+
     fig = go.Figure()
 
     fig.add_trace(go.Scatter(
@@ -297,6 +527,34 @@ def plot_pollution_trend(data, pollutant):
         marker=dict(size=8, color="#1976d2", line=dict(width=1, color="#ffffff"))
     ))
 
+    if forecast is not None:
+        # Uncertainty band first (upper, then lower filled up to it), then the forecast line
+        fig.add_trace(go.Scatter(
+            x=forecast["Time"],
+            y=forecast["Upper"],
+            mode="lines",
+            line=dict(width=0),
+            hoverinfo="skip",
+            showlegend=False
+        ))
+        fig.add_trace(go.Scatter(
+            x=forecast["Time"],
+            y=forecast["Lower"],
+            mode="lines",
+            line=dict(width=0),
+            fill="tonexty",
+            fillcolor="rgba(245, 124, 0, 0.18)",
+            name="80% range",
+            hoverinfo="skip"
+        ))
+        fig.add_trace(go.Scatter(
+            x=forecast["Time"],
+            y=forecast["Forecast"].round(1),
+            mode="lines",
+            name="Forecast",
+            line=dict(color="#f57c00", width=2, dash="dash")
+        ))
+
     fig.update_layout(
         height=350,
         title=f"{pollutant} Trend Over Time",
@@ -321,13 +579,95 @@ def plot_pollution_trend(data, pollutant):
         hovermode="x unified"
     )
 
+    return fig
+
+# Distinct line colors for up to 20 compared ZIPs (Plotly's D3 + Light24 heads)
+COMPARE_COLORS = [
+    "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf",
+    "#fd3216", "#00fe35", "#6a76fc", "#fed4c4", "#fe00ce", "#0df9ff", "#f6f926", "#ff9616", "#479b55", "#eea6fb",
+]
+SMALL_MULTIPLE_COLUMNS = 4
+
+@instrument("plot_comparison")
+def plot_comparison(frame, pollutant, labels=None, small_multiples=False):
+    if frame.empty:
+        st.info("No air quality data available for the selected ZIP codes.")
+        return
+
+    fig = build_comparison_figure(frame, pollutant, labels, small_multiples)
+    record_payload("plot_comparison", lambda: len(fig.to_json()))
     st.plotly_chart(fig, use_container_width=True)
 
-def plot_asthma_vs_pollution(air_data, asthma_data):
+def build_comparison_figure(frame, pollutant, labels=None, small_multiples=False):
+    # frame: time index x one column per ZIP (compare.comparison_frame). All
+    # traces are built first and added in one call.
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    labels = labels or {}
+    zips = list(frame.columns)
+    traces = [
+        go.Scatter(
+            x=frame.index,
+            y=frame[zip_code],
+            mode="lines",
+            name=labels.get(zip_code, zip_code),
+            line=dict(color=COMPARE_COLORS[i % len(COMPARE_COLORS)], width=2),
+            connectgaps=False,
+            showlegend=not small_multiples,
+        )
+        for i, zip_code in enumerate(zips)
+    ]
+
+    if small_multiples:
+        rows = -(-len(zips) // SMALL_MULTIPLE_COLUMNS)
+        fig = make_subplots(
+            rows=rows,
+            cols=SMALL_MULTIPLE_COLUMNS,
+            shared_xaxes=True,
+            shared_yaxes=True,
+            subplot_titles=[labels.get(zip_code, zip_code) for zip_code in zips],
+            vertical_spacing=0.08 if rows > 1 else 0.0,
+            horizontal_spacing=0.03,
+        )
+        fig.add_traces(
+            traces,
+            rows=[i // SMALL_MULTIPLE_COLUMNS + 1 for i in range(len(zips))],
+            cols=[i % SMALL_MULTIPLE_COLUMNS + 1 for i in range(len(zips))],
+        )
+        fig.update_annotations(font_size=12)
+        height = 60 + 170 * rows
+    else:
+        fig = go.Figure(data=traces)
+        height = 420
+
+    fig.update_layout(
+        height=height,
+        title=f"{pollutant} by ZIP Code",
+        margin=dict(l=20, r=20, t=60, b=20),
+        paper_bgcolor="white",
+        plot_bgcolor="#f8fafc",
+        font=dict(family="Inter, sans-serif", size=13, color="#333"),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        hovermode="x unified" if not small_multiples else "closest",
+    )
+    fig.update_xaxes(gridcolor="#e5e7eb", showgrid=True, zeroline=False)
+    fig.update_yaxes(gridcolor="#e5e7eb", showgrid=True, zeroline=False)
+    return fig
+
+@instrument("plot_asthma_vs_pollution")
+def plot_asthma_vs_pollution(air_data, asthma_data, pollutant="PM2.5"):
     if air_data.empty or asthma_data.empty:
         st.info("Not enough data to compare asthma and pollution.")
         return
 
+    fig = build_asthma_figure(air_data, asthma_data, pollutant)
+    record_payload("plot_asthma_vs_pollution", lambda: len(fig.to_json()))
+    st.plotly_chart(fig, use_container_width=True)
+
+def build_asthma_figure(air_data, asthma_data, pollutant="PM2.5"):
+    import plotly.graph_objects as go
+
     asthma_rate = asthma_data['Asthma Rate'].iloc[0]
 
     fig = go.Figure()
@@ -336,7 +676,7 @@ def plot_asthma_vs_pollution(air_data, asthma_data):
         x=air_data["Date"],
         y=air_data["Value"],
         mode="lines+markers",
-        name="PM2.5 Level",
+        name=f"{pollutant} Level",
         line=dict(color="#1976d2", width=3),
         marker=dict(size=8, color="#1976d2", line=dict(width=1, color="#ffffff"))
     ))
@@ -351,7 +691,7 @@ def plot_asthma_vs_pollution(air_data, asthma_data):
 
     fig.update_layout(
         height=350,
-        title="PM2.5 Levels vs. Local Asthma Rate",
+        title=f"{pollutant} Levels vs. Local Asthma Rate",
         margin=dict(l=20, r=20, t=40, b=20),
         paper_bgcolor="white",
         plot_bgcolor="#f8fafc",
@@ -373,4 +713,4 @@ def plot_asthma_vs_pollution(air_data, asthma_data):
         hovermode="x unified"
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    return fig